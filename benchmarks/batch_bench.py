@@ -0,0 +1,196 @@
+"""
+batch_bench.py - Benchmark filtrów strony ofert: lista Item vs kolumnowy ItemBatch.
+WERSJA: 4.2 - 96 ofert na stronę × 500 zapytań, okno + watermark + cena + zakolejkowane id, ms/skan + p50/p99 na stronę
+
+Uruchom:
+  python benchmarks/batch_bench.py                               # 500 zapytań × 96 ofert, 5 skanów
+  python benchmarks/batch_bench.py --queries 1000 --per-page 50 --new-per-page 5
+  python benchmarks/batch_bench.py --compare benchmarks/results/batch-20260101-120000.json
+
+Strony to syntetyczny JSON w kształcie odpowiedzi katalogu (zdjęcia,
+sprzedawca, cena, rozmiar). Na każdej stronie `--new-per-page` ofert jest
+nowszych niż watermark zapytania, część starsza niż okno nowości, kilka id
+już w kolejce — jak w ustalonym rytmie skanów. Ścieżka `items` odtwarza
+dotychczasową pętlę z core._fetch_single_query_multi_url (Item dla każdej
+oferty), `batch` to ItemBatch + maski. Oba warianty muszą zwrócić te same
+oferty.
+Wynik ląduje w benchmarks/results/batch-<data>.json.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import git_commit
+from src.pyVinted.items import Item
+from src.pyVinted.items import batch as batch_module
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+_WORDS = ["kurtka", "bluza", "spodnie", "czapka", "buty", "płaszcz", "vintage", "oversize", "nowa", "nike", "zara"]
+_BRANDS = ["Nike", "Adidas", "Zara", "H&M", "Carhartt", "Stone Island", "Levi's", "Reserved"]
+_SIZES = ["XS", "S", "M", "L", "XL", "38", "40", "42", "44"]
+WINDOW_MINUTES = 5
+MAX_TOTAL = 150.0
+
+
+def make_pages(queries, per_page, new_per_page, rng, now):
+    """(strona JSON, watermark) na zapytanie; id rosną z czasem wystawienia jak w Vinted."""
+    pages, queued = [], []
+    next_id = 5_000_000_000
+    for _ in range(queries):
+        watermark = now - 60
+        page = []
+        for n in range(per_page):
+            # najpierw nowe (po watermarku), potem starsze w oknie, potem spoza okna
+            if n < new_per_page:
+                ts = watermark + rng.randint(1, 59)
+            elif n < per_page // 3:
+                ts = watermark - rng.randint(1, 200)
+            else:
+                ts = now - WINDOW_MINUTES * 60 - rng.randint(1, 86_400)
+            next_id += 1
+            photos = [{"id": next_id * 10 + k, "url": f"https://images1.vinted.net/t/{next_id}_{k}.jpeg",
+                       "full_size_url": f"https://images1.vinted.net/f/{next_id}_{k}.jpeg",
+                       "high_resolution": {"timestamp": ts}} for k in range(rng.randint(1, 5))]
+            page.append({
+                "id": next_id,
+                "title": " ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 5))).capitalize(),
+                "brand_title": rng.choice(_BRANDS),
+                "size_title": rng.choice(_SIZES),
+                "status": rng.choice(["Nowy z metką", "Bardzo dobry", "Dobry"]),
+                "price": {"amount": f"{rng.lognormvariate(4, 0.7):.2f}", "currency_code": "PLN"},
+                "url": f"https://www.vinted.pl/items/{next_id}-oferta",
+                "photo": photos[0], "photos": photos, "created_at_ts": ts, "is_hidden": 0,
+                "user": {"id": rng.randint(1, 10_000_000), "login": f"user{rng.randint(1, 99_999)}",
+                         "country_iso_code": "PL", "feedback_count": 0},
+            })
+            if n < new_per_page and rng.random() < 0.2:
+                queued.append(str(next_id))
+        page.sort(key=lambda d: -d["created_at_ts"])
+        pages.append((page, watermark))
+    return pages, set(queued[-300:])
+
+
+def legacy_path(page, watermark, queued, high_cents):
+    """Dotychczasowa ścieżka: Item dla każdej oferty, filtry w pętli Pythona."""
+    items = [Item(d, domain="pl") for d in page]
+    new_items = [it for it in items if it.is_new_item(minutes=WINDOW_MINUTES)]
+    survivors = []
+    for item in reversed(new_items):
+        if watermark and item.raw_timestamp <= watermark:
+            continue
+        if str(item.id) in queued:
+            continue
+        total = item.total_amount()
+        if total is None or total > MAX_TOTAL:
+            continue
+        survivors.append(item.id)
+    return survivors
+
+
+def batch_path(page, watermark, queued, high_cents):
+    batch = batch_module.ItemBatch.from_json(page, "pl")
+    keep = batch.both(batch.fresh(WINDOW_MINUTES), batch.after(watermark), batch.unseen(queued),
+                      batch.price_between(high_cents=high_cents))
+    survivors = []
+    for item in reversed(batch.items(keep)):
+        total = item.total_amount()
+        if total is None or total > MAX_TOTAL:
+            continue
+        survivors.append(item.id)
+    return survivors
+
+
+def _measure(fn, pages, queued, scans):
+    high_cents = math.ceil(Item.price_for_total(MAX_TOTAL) * 100) + 1
+    samples, scan_ms, survivors = [], [], []
+    for _ in range(scans):
+        started = time.perf_counter()
+        survivors = []
+        for page, watermark in pages:
+            t0 = time.perf_counter_ns()
+            survivors.append(fn(page, watermark, queued, high_cents))
+            samples.append((time.perf_counter_ns() - t0) / 1000)
+        scan_ms.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    pick = lambda p: samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+    return {
+        "scan_ms": round(sorted(scan_ms)[len(scan_ms) // 2], 2),
+        "pages_per_s": round(len(pages) * 1000 / sorted(scan_ms)[len(scan_ms) // 2], 1),
+        "p50_us": round(pick(0.50), 1),
+        "p99_us": round(pick(0.99), 1),
+        "survivors": sum(len(s) for s in survivors),
+    }, survivors
+
+
+def compare(previous_path, results):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)["results"]
+    print(f"\nPorównanie z {previous_path}:")
+    for name, r in results.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        print(f"  {name:<13} skan {old['scan_ms']:>9.2f} → {r['scan_ms']:>9.2f} ms ({r['scan_ms'] / old['scan_ms']:.2f}×)"
+              f"   p50 {old['p50_us']:>8.1f} → {r['p50_us']:>8.1f} µs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark filtrów strony ofert: Item vs ItemBatch")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--per-page", type=int, default=96)
+    parser.add_argument("--new-per-page", type=int, default=2, help="ofert nowszych niż watermark na stronę")
+    parser.add_argument("--scans", type=int, default=5, help="powtórzeń pełnego skanu (mediana)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="plik JSON wyniku (domyślnie benchmarks/results/batch-<data>.json)")
+    parser.add_argument("--compare", help="wcześniejszy wynik JSON do porównania")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    pages, queued = make_pages(args.queries, args.per_page, args.new_per_page, rng, int(time.time()))
+    print(f"🧪 {args.queries} zapytań × {args.per_page} ofert, {args.new_per_page} nowe na stronę, "
+          f"{len(queued)} id w kolejce")
+
+    results, outputs = {}, {}
+    results["items"], outputs["items"] = _measure(legacy_path, pages, queued, args.scans)
+    results["batch"], outputs["batch"] = _measure(batch_path, pages, queued, args.scans)
+    mismatches = [name for name, out in outputs.items() if out != outputs["items"]]
+
+    for name, r in results.items():
+        print(f"  {name:<13} skan {r['scan_ms']:>9.2f} ms   {r['pages_per_s']:>9.1f} stron/s   "
+              f"p50 {r['p50_us']:>8.1f} µs   p99 {r['p99_us']:>8.1f} µs   ocalałych {r['survivors']}")
+    base = results["items"]["scan_ms"]
+    print("  przyspieszenie skanu: " + ", ".join(f"{name} {base / r['scan_ms']:.1f}×"
+                                                for name, r in results.items() if name != "items"))
+    if mismatches:
+        print(f"❌ Inne oferty niż ścieżka items: {', '.join(mismatches)}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "mismatches": mismatches,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"batch-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Zapisano {output}")
+    if args.compare:
+        compare(args.compare, results)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+common.py - Wspólne pomocnicze funkcje benchmarków (metadane przebiegu, bazy w katalogu tymczasowym).
+WERSJA: 4.2 - git_commit() do raportów JSON + point_db_at() dla benchmarków na prawdziwych bazach
+"""
+import os
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit():
+    """Skrócony hash HEAD do raportu (None poza repozytorium)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def point_db_at(directory):
+    """Przekierowuje wszystkie ścieżki modułu database na katalog benchmarku."""
+    import src.database as db
+    db.DATA_DIR = directory
+    db.RAM_RESIDENT = []
+    db.DB_PATH = os.path.join(directory, db.DB_FILES["hot"])
+    db.LOG_DB_PATH = os.path.join(directory, db.DB_FILES["logs"])
+    db.ANALYTICS_DB_PATH = os.path.join(directory, db.DB_FILES["analytics"])
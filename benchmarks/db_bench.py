@@ -0,0 +1,257 @@
+"""
+db_bench.py - Benchmark warstwy bazy (src/database.py) w skali produkcyjnej.
+WERSJA: 4.2 - Syntetyczne bazy w katalogu tymczasowym, ops/s + p50/p99, wynik JSON
+
+Uruchom:
+  python benchmarks/db_bench.py                                   # szybki przebieg
+  python benchmarks/db_bench.py --items 1000000 --tracks 100000 --queries 500
+  python benchmarks/db_bench.py --compare benchmarks/results/db-20260101-120000.json
+
+Bazy są budowane od zera w katalogu tymczasowym (--dir, by użyć np. /dev/shm
+albo karty SD), więc pliki w data/ nie są dotykane. Wynik ląduje w
+benchmarks/results/db-<data>.json — --compare pokazuje zmianę względem
+wcześniejszego przebiegu.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import src.database as db
+from common import git_commit, point_db_at
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+_BRANDS = ["Nike", "Adidas", "Zara", "Stone Island", "Carhartt", "The North Face", "Levi's", "H&M",
+           "Ralph Lauren", "Tommy Hilfiger", "New Balance", "Puma", "Reserved", "Mango", "Arc'teryx"]
+_WORDS = ["kurtka", "bluza", "spodnie", "czapka", "koszula", "sukienka", "buty", "płaszcz",
+          "czarna", "zielona", "żółta", "vintage", "oversize", "bawełna", "wełna", "nowa"]
+_SIZES = ["XS", "S", "M", "L", "XL", "38", "40", "42", "44"]
+
+
+def _title(rng, i):
+    return f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)} {rng.choice(_WORDS)} {i}"
+
+
+def _batches(total, size=50_000):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def build(scale, rng):
+    """Syntetyczne dane wstawiane hurtowo (executemany w jednej transakcji na paczkę)."""
+    db.init_db()
+    now = int(time.time())
+    conn = db.get_connection()
+    conn.executemany("INSERT OR IGNORE INTO brands (name) VALUES (?)", [(b,) for b in _BRANDS])
+    conn.executemany("INSERT OR IGNORE INTO currencies (code) VALUES (?)", [("PLN",), ("EUR",)])
+    for q in range(1, scale["queries"] + 1):
+        conn.execute("""INSERT INTO queries (id, name, discord_webhook_url, discord_channel_name, embed_color)
+            VALUES (?, ?, ?, ?, '5763719')""", (q, f"query-{q}", f"https://discord.com/api/webhooks/{q}/x", f"kanal-{q}"))
+        conn.executemany("INSERT INTO query_urls (query_id, url) VALUES (?, ?)",
+                         [(q, f"https://www.vinted.pl/catalog?search_text=q{q}&page={u}") for u in range(3)])
+    conn.executemany("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+                     [("scan_interval", "8"), ("items_per_query", "10"), ("new_item_window", "5")])
+    conn.commit()
+    for start, end in _batches(scale["items"]):
+        rows = [(i, 1 + i % scale["queries"], now - (scale["items"] - i) * 5, rng.randint(500, 90000),
+                 1 + i % 2, 1 + i % len(_BRANDS), 1 + i % 50_000, _title(rng, i), rng.choice(_SIZES),
+                 "Dobry", f"https://images.vinted.net/{i}.jpg", f"https://www.vinted.pl/items/{i}",
+                 f"user{i % 50_000}", now) for i in range(start + 1, end + 1)]
+        conn.executemany("""INSERT INTO item_data (vinted_id, query_id, timestamp, price_cents, currency_id,
+            brand_id, user_id, title, size, status, photo_url, item_url, username, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+        conn.executemany("INSERT INTO seen_items (vinted_id, seen_at) VALUES (?, ?)", [(r[0], now) for r in rows])
+        conn.commit()
+    conn.close()
+
+    conn = db.get_analytics_connection()
+    for start, end in _batches(scale["tracks"]):
+        rows = []
+        for i in range(start + 1, end + 1):
+            price = rng.randint(1000, 50000)
+            rows.append((db._generate_item_hash(f"track {i}", "Nike", "M"), i, f"track {i}", "Nike", "M",
+                         price, price, price, "PLN", f"https://www.vinted.pl/items/{i}", 1 + i % 50_000))
+        conn.executemany("""INSERT INTO price_tracking (item_hash, vinted_id, title, brand, size, first_price_cents,
+            last_price_cents, lowest_price_cents, currency, item_url, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows)
+        conn.commit()
+    conn.close()
+
+    conn = db.get_log_connection()
+    conn.executemany("INSERT INTO logs (level, source, message) VALUES (?, ?, ?)",
+                     [(rng.choice(["INFO", "SUCCESS", "WARNING"]), "bench", f"wpis {i}") for i in range(scale["logs"])])
+    conn.commit()
+    conn.close()
+    for connect, _ in db._DATABASES.values():
+        conn = connect()
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+
+def _measure(fn, ops, setup=None):
+    """Wywołuje fn(i) ops razy (setup(i) przed każdym, poza pomiarem); latencje w mikrosekundach."""
+    fn(-1)  # rozgrzewka (ładowanie indeksu cen, snapshotu, cache stron)
+    samples = []
+    for i in range(ops):
+        if setup:
+            setup(i)
+        t0 = time.perf_counter_ns()
+        fn(i)
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    elapsed = sum(samples) / 1e6
+    samples.sort()
+    pick = lambda p: samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+    return {
+        "ops": ops,
+        "ops_per_s": round(ops / elapsed, 1) if elapsed else None,
+        "p50_us": round(pick(0.50), 1),
+        "p99_us": round(pick(0.99), 1),
+        "mean_us": round(sum(samples) / len(samples), 1),
+        "max_us": round(samples[-1], 1),
+    }
+
+
+def _panel(sql, params=()):
+    """Jak trasa panelu: nowe połączenie na żądanie (z ATTACH), jedno zapytanie."""
+    def run(_):
+        conn = db.get_panel_connection()
+        conn.execute(sql, params).fetchall()
+        conn.close()
+    return run
+
+
+def run_benchmarks(scale, ops, rng):
+    n_items = scale["items"]
+    next_id = [n_items + 1_000_000]
+    now = int(time.time())
+
+    def add_item(_):
+        next_id[0] += 1
+        db.add_item(next_id[0], _title(rng, next_id[0]), rng.choice(_BRANDS), "123,45", "PLN", "M", "Dobry",
+                    "https://images.vinted.net/x.jpg", "https://www.vinted.pl/items/x", 1, now, 42, "bench")
+
+    def check_price_drop(i):
+        track = rng.randint(1, max(1, scale["tracks"]))
+        db.check_price_drop(track, f"track {track}", "Nike", str(rng.choice([100.0, 99.0, 250.5])), "PLN", "M",
+                            "https://www.vinted.pl/items/x", "", 1, "bench")
+
+    def panel_search(_):
+        conn = db.get_panel_connection()
+        db.search_items(rng.choice(["stone island", "kurtka czarna", "user12", "vintage"]), limit=100, conn=conn)
+        conn.close()
+
+    def panel_logs(_):
+        conn = db.get_panel_connection()
+        db.get_logs_page(limit=100, conn=conn)
+        conn.close()
+
+    def queue_price_changes(i):
+        for _ in range(50):
+            check_price_drop(i)
+
+    # nazwa → (funkcja, liczba operacji, przygotowanie poza pomiarem)
+    benches = [
+        ("item_exists_hit", lambda _: db.item_exists(rng.randint(1, n_items))),
+        ("item_exists_miss", lambda _: db.item_exists(rng.randint(n_items + 1, n_items * 2 + 1))),
+        ("add_item", add_item),
+        ("check_price_drop", check_price_drop),
+        ("flush_price_tracking_x50", lambda _: db.flush_price_tracking(), max(1, ops // 50), queue_price_changes),
+        ("get_all_queries", lambda _: db.get_all_queries(), max(1, ops // 10)),
+        ("get_queries_snapshot", lambda _: db.get_queries_snapshot()),
+        ("add_log", lambda i: db.add_log("INFO", "bench", f"benchmark {i}")),
+        ("get_config", lambda _: db.get_config("scan_interval", "8")),
+        ("panel_items_page", _panel("SELECT * FROM items ORDER BY timestamp DESC, id DESC LIMIT 100")),
+        ("panel_items_search", panel_search),
+        ("panel_logs_page", panel_logs),
+        ("panel_price_tracking", _panel(
+            "SELECT * FROM price_tracking WHERE active = 1 ORDER BY updated_at DESC LIMIT 100")),
+        ("panel_stats", lambda _: db.get_stats()),
+    ]
+    results = {}
+    for name, fn, *extra in benches:
+        count = extra[0] if extra else ops
+        setup = extra[1] if len(extra) > 1 else None
+        results[name] = _measure(fn, count, setup)
+        r = results[name]
+        print(f"  {name:<24} {r['ops_per_s']:>10.1f} ops/s   p50 {r['p50_us']:>9.1f} µs   p99 {r['p99_us']:>9.1f} µs")
+    return results
+
+
+def compare(previous_path, results):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)["results"]
+    print(f"\nPorównanie z {previous_path}:")
+    for name, r in results.items():
+        old = previous.get(name)
+        if not old or not old.get("p50_us"):
+            continue
+        print(f"  {name:<24} p50 {old['p50_us']:>9.1f} → {r['p50_us']:>9.1f} µs ({r['p50_us'] / old['p50_us']:.2f}×)"
+              f"   ops/s {old['ops_per_s']:>10.1f} → {r['ops_per_s']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark warstwy bazy danych")
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--tracks", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--logs", type=int, default=1_000)
+    parser.add_argument("--ops", type=int, default=2_000, help="operacji na benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir", help="katalog bazowy dla plików tymczasowych (domyślnie systemowy tmp)")
+    parser.add_argument("--output", help="plik JSON wyniku (domyślnie benchmarks/results/db-<data>.json)")
+    parser.add_argument("--compare", help="wcześniejszy wynik JSON do porównania")
+    parser.add_argument("--keep", action="store_true", help="nie usuwaj baz po przebiegu")
+    args = parser.parse_args(argv)
+
+    scale = {"items": args.items, "tracks": args.tracks, "queries": args.queries, "logs": args.logs}
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="vinted-dbbench-", dir=args.dir)
+    point_db_at(workdir)
+    print(f"📦 Budowanie baz w {workdir}: {scale}")
+    started = time.perf_counter()
+    try:
+        build(scale, rng)
+        build_seconds = round(time.perf_counter() - started, 1)
+        sizes = {name: os.path.getsize(os.path.join(workdir, fname)) for name, fname in db.DB_FILES.items()}
+        print(f"   gotowe w {build_seconds}s, rozmiary: { {k: f'{v / 1e6:.1f} MB' for k, v in sizes.items()} }")
+        print(f"⏱️ Pomiar ({args.ops} operacji na benchmark):")
+        results = run_benchmarks(scale, args.ops, rng)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "scale": scale,
+        "ops": args.ops,
+        "build_seconds": build_seconds,
+        "db_bytes": sizes,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"db-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Zapisano {output}")
+    if args.compare:
+        compare(args.compare, results)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+fake_discord.py - Lokalny zamiennik API Discorda do testów obciążeniowych sendera.
+WERSJA: 4.2 - Webhooki + /channels/{id}/messages, buckety X-RateLimit-*, globalny 429, opóźnienia i błędy
+
+Uruchom osobno (a bota z DISCORD_API_BASE=http://127.0.0.1:8099/api):
+  python benchmarks/fake_discord.py --port 8099 --latency-ms 40 --error-rate 0.01
+
+albo w procesie (benchmarks/sender_bench.py): FakeDiscord(...).start().
+
+Zachowanie jak w Discordzie:
+  - każda trasa (webhook / kanał) ma bucket `--route-limit` żądań na `--route-window` s
+    i odpowiada nagłówkami X-RateLimit-Bucket / Limit / Remaining / Reset / Reset-After;
+  - przekroczenie → 429 z Retry-After i X-RateLimit-Scope: user;
+  - ponad `--global-limit` żądań na sekundę (wszystkie trasy) → 429 z
+    X-RateLimit-Global: true; `--global-429-rate` wstrzykuje losowe globalne 429;
+  - `--latency-ms` / `--jitter-ms` opóźniają odpowiedź, `--error-rate` zwraca 500.
+GET /_stats zwraca liczniki JSON.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ROUTE = re.compile(r"^/api(?:/v\d+)?/(webhooks/(\d+)/[^/?]+|channels/(\d+)/messages)")
+_ITEM_ID = re.compile(r"/items/(\d+)")
+
+
+class FakeDiscord:
+
+    def __init__(self, host="127.0.0.1", port=0, route_limit=5, route_window=2.0, global_limit=50,
+                 latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, global_429_rate=0.0, seed=None):
+        self.route_limit = route_limit
+        self.route_window = route_window
+        self.global_limit = global_limit
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.global_429_rate = global_429_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets = {}          # trasa -> [remaining, reset_at]
+        self._global = [0, 0.0]     # [żądania w bieżącej sekundzie, początek sekundy]
+        self.deliveries = []        # (time.monotonic(), id przedmiotu) dla każdej przyjętej oferty
+        self.stats = {"requests": 0, "messages": 0, "embeds": 0, "route_429": 0, "global_429": 0,
+                      "errors": 0, "bad_requests": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v10"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-discord", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self, route):
+        """(status, nagłówki) — decyzja rate-limitu dla żądania na trasę."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            if now - self._global[1] >= 1.0:
+                self._global = [0, now]
+            self._global[0] += 1
+            if self._global[0] > self.global_limit or self._rng.random() < self.global_429_rate:
+                self.stats["global_429"] += 1
+                retry = max(0.05, 1.0 - (now - self._global[1]))
+                return 429, {"Retry-After": f"{retry:.3f}", "X-RateLimit-Global": "true",
+                             "X-RateLimit-Scope": "global"}
+            state = self._buckets.get(route)
+            if state is None or now >= state[1]:
+                state = self._buckets[route] = [self.route_limit, now + self.route_window]
+            reset_after = state[1] - now
+            headers = {
+                "X-RateLimit-Bucket": f"fake-{abs(hash(route)) % 10 ** 8:08d}",
+                "X-RateLimit-Limit": str(self.route_limit),
+                "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+                "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            }
+            if state[0] <= 0:
+                self.stats["route_429"] += 1
+                headers.update({"X-RateLimit-Remaining": "0", "Retry-After": f"{reset_after:.3f}",
+                                "X-RateLimit-Scope": "user"})
+                return 429, headers
+            state[0] -= 1
+            headers["X-RateLimit-Remaining"] = str(state[0])
+            if self._rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500, headers
+            return 200, headers
+
+    def _record(self, payload):
+        now = time.monotonic()
+        ids = []
+        for embed in payload.get("embeds") or []:
+            match = _ITEM_ID.search(embed.get("url") or "")
+            if match and match.group(1) not in ids:
+                ids.append(match.group(1))
+        with self._lock:
+            self.stats["messages"] += 1
+            self.stats["embeds"] += len(payload.get("embeds") or [])
+            self.deliveries.extend((now, int(i)) for i in ids)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive jak w Discordzie
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, headers=None, body=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for key, val in (headers or {}).items():
+                    self.send_header(key, val)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/_stats":
+                    with fake._lock:
+                        self._reply(200, body=dict(fake.stats, delivered=len(fake.deliveries)))
+                elif self.path.endswith("/users/@me"):
+                    self._reply(200, body={"id": "1", "username": "fake-bot", "discriminator": "0"})
+                else:
+                    self._reply(404, body={"message": "404: Not Found", "code": 0})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                match = _ROUTE.match(self.path)
+                if not match:
+                    self._reply(404, body={"message": "404: Not Found", "code": 0})
+                    return
+                if fake.latency or fake.jitter:
+                    time.sleep(max(0.0, fake.latency + fake._rng.uniform(-fake.jitter, fake.jitter)))
+                status, headers = fake._admit(match.group(1))
+                if status == 429:
+                    retry = float(headers["Retry-After"])
+                    self._reply(429, headers, {"message": "You are being rate limited.", "retry_after": retry,
+                                               "global": headers.get("X-RateLimit-Global") == "true"})
+                    return
+                if status != 200:
+                    self._reply(status, headers, {"message": "500: Internal Server Error", "code": 0})
+                    return
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    with fake._lock:
+                        fake.stats["bad_requests"] += 1
+                    self._reply(400, headers, {"message": "Cannot send an empty message", "code": 50006})
+                    return
+                fake._record(payload)
+                if match.group(2):
+                    # webhook bez ?wait=true odpowiada 204
+                    self._reply(204, headers)
+                else:
+                    self._reply(200, headers, {"id": str(int(time.time() * 1000)), "channel_id": match.group(3)})
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalny zamiennik API Discorda")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--route-limit", type=int, default=5, help="żądań na bucket trasy w oknie")
+    parser.add_argument("--route-window", type=float, default=2.0, help="okno bucketu trasy (s)")
+    parser.add_argument("--global-limit", type=int, default=50, help="żądań na sekundę łącznie")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="odsetek odpowiedzi 500")
+    parser.add_argument("--global-429-rate", type=float, default=0.0, help="odsetek losowych globalnych 429")
+    args = parser.parse_args(argv)
+    fake = FakeDiscord(args.host, args.port, args.route_limit, args.route_window, args.global_limit,
+                       args.latency_ms, args.jitter_ms, args.error_rate, args.global_429_rate)
+    print(f"🧪 Fake Discord na {fake.base_url} — uruchom bota z DISCORD_API_BASE={fake.base_url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+        print(f"📊 {fake.stats}")
+
+
+if __name__ == "__main__":
+    main()
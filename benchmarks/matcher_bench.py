@@ -0,0 +1,175 @@
+"""
+matcher_bench.py - Benchmark lokalnego dopasowania ofert (src/matcher.py) przy tysiącach subskrypcji.
+WERSJA: 4.2 - Indeks odwrócony vs przegląd liniowy, oferty/s + p50/p99, zgodność wyników
+
+Uruchom:
+  python benchmarks/matcher_bench.py                            # 10 000 subskrypcji, 5 000 ofert
+  python benchmarks/matcher_bench.py --subscriptions 50000 --items 20000
+  python benchmarks/matcher_bench.py --compare benchmarks/results/matcher-20260101-120000.json
+
+Subskrypcje to syntetyczne URL-e katalogu (marki, kategorie, rozmiary,
+search_text, przedziały cen — w proporcjach podobnych do prawdziwych
+zapytań), oferty mają rozkład Zipfa po markach i słowach. Przegląd liniowy
+(`Matcher.match_linear`) mierzony jest na próbce `--linear-items` ofert;
+wynik każdej oferty z próbki musi być identyczny z indeksem.
+Wynik ląduje w benchmarks/results/matcher-<data>.json.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import git_commit
+from src.matcher import Matcher
+from src.pyVinted.items.item import Item
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+_BRANDS, _CATALOGS, _SIZES, _VOCAB = 800, 300, 60, 3000
+_CUM_WEIGHTS = {}
+
+
+def _zipf(rng, n):
+    """Indeks 0..n-1 z rozkładem Zipfa 1/(k+10) (popularne marki / słowa częściej, bez skrajnej dominacji)."""
+    if n not in _CUM_WEIGHTS:
+        total, cum = 0.0, []
+        for k in range(n):
+            total += 1 / (k + 10)
+            cum.append(total)
+        _CUM_WEIGHTS[n] = cum
+    return rng.choices(range(n), cum_weights=_CUM_WEIGHTS[n])[0]
+
+
+def make_subscriptions(count, rng) -> list:
+    urls = []
+    for _ in range(count):
+        params = []
+        kind = rng.random()
+        if kind < 0.45:
+            params += [("brand_ids[]", 1 + _zipf(rng, _BRANDS)) for _ in range(rng.choice((1, 1, 2)))]
+        if kind > 0.30 and rng.random() < 0.6:
+            params.append(("catalog[]", 1 + rng.randrange(_CATALOGS)))
+        if rng.random() < 0.25:
+            params += [("size_ids[]", 1 + rng.randrange(_SIZES)) for _ in range(rng.choice((1, 2, 3)))]
+        if kind >= 0.45 or rng.random() < 0.3:
+            params.append(("search_text", " ".join(f"w{_zipf(rng, _VOCAB)}" for _ in range(rng.choice((1, 2, 2, 3))))))
+        if rng.random() < 0.5:
+            low = rng.choice((0, 10, 20, 50, 100))
+            params += [("price_from", low)] if low else []
+            params.append(("price_to", low + rng.choice((20, 50, 100, 300))))
+        if rng.random() < 0.1:
+            params.append(("status[]", rng.randint(1, 5)))
+        params.append(("order", "newest_first"))
+        urls.append("https://www.vinted.pl/catalog?" + urlencode(params))
+    return urls
+
+
+def make_items(count, rng) -> list:
+    items = []
+    for i in range(count):
+        words = " ".join(f"w{_zipf(rng, _VOCAB)}" for _ in range(rng.randint(3, 7)))
+        items.append(Item({
+            "id": i, "title": words, "brand_title": f"brand{i % 97}",
+            "brand_id": 1 + _zipf(rng, _BRANDS), "catalog_id": 1 + rng.randrange(_CATALOGS),
+            "size_id": 1 + rng.randrange(_SIZES), "status_id": rng.randint(1, 5),
+            "price": {"amount": f"{rng.lognormvariate(3.5, 0.9):.2f}", "currency_code": "PLN"},
+            "created_at_ts": 1,
+        }))
+    return items
+
+
+def _measure(fn, items):
+    samples, total = [], 0
+    for item in items:
+        t0 = time.perf_counter_ns()
+        total += len(fn(item))
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    elapsed = sum(samples) / 1e6
+    samples.sort()
+    pick = lambda p: samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+    return {
+        "items": len(items),
+        "items_per_s": round(len(items) / elapsed, 1) if elapsed else None,
+        "p50_us": round(pick(0.50), 1),
+        "p99_us": round(pick(0.99), 1),
+        "mean_us": round(sum(samples) / len(samples), 1),
+        "matches": total,
+    }
+
+
+def compare(previous_path, results):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)["results"]
+    print(f"\nPorównanie z {previous_path}:")
+    for name, r in results.items():
+        old = previous.get(name)
+        if not old or not old.get("p50_us"):
+            continue
+        print(f"  {name:<8} p50 {old['p50_us']:>9.1f} → {r['p50_us']:>9.1f} µs ({r['p50_us'] / old['p50_us']:.2f}×)"
+              f"   oferty/s {old['items_per_s']:>10.1f} → {r['items_per_s']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark lokalnego dopasowania ofert do subskrypcji")
+    parser.add_argument("--subscriptions", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=5_000)
+    parser.add_argument("--linear-items", type=int, default=300, help="próbka ofert dla przeglądu liniowego")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="plik JSON wyniku (domyślnie benchmarks/results/matcher-<data>.json)")
+    parser.add_argument("--compare", help="wcześniejszy wynik JSON do porównania")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    urls = make_subscriptions(args.subscriptions, rng)
+    items = make_items(args.items, rng)
+    started = time.perf_counter()
+    matcher = Matcher()
+    for n, url in enumerate(urls):
+        matcher.add(1 + n // 3, url)
+    build_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"📦 {len(matcher.subscriptions)} subskrypcji w indeksie ({len(matcher._index)} kluczy) w {build_ms} ms")
+
+    results = {"indexed": _measure(matcher.match, items)}
+    sample = items[:args.linear_items]
+    results["linear"] = _measure(matcher.match_linear, sample)
+    mismatches = sum(1 for item in sample if matcher.match(item) != matcher.match_linear(item))
+    metrics = matcher.get_metrics()
+    avg_candidates = round(metrics["matcher_candidates_total"] / max(1, metrics["matcher_items_total"]), 1)
+    for name, r in results.items():
+        print(f"  {name:<8} {r['items_per_s']:>10.1f} ofert/s   p50 {r['p50_us']:>9.1f} µs   p99 {r['p99_us']:>9.1f} µs")
+    print(f"  kandydaci na ofertę: {avg_candidates} z {len(matcher.subscriptions)}, "
+          f"dopasowań na ofertę: {results['indexed']['matches'] / max(1, len(items)):.2f}, "
+          f"przyspieszenie p50: {results['linear']['p50_us'] / max(0.1, results['indexed']['p50_us']):.0f}×")
+    if mismatches:
+        print(f"❌ {mismatches} ofert z innym wynikiem niż przegląd liniowy!")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "build_ms": build_ms,
+        "avg_candidates": avg_candidates,
+        "mismatches": mismatches,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"matcher-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Zapisano {output}")
+    if args.compare:
+        compare(args.compare, results)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+sender_bench.py - Benchmark wysyłki alertów (outbox → tory → Discord) na lokalnym fake_discord.
+WERSJA: 4.2 - Prawdziwy kod sendera, syntetyczne alerty, alerty/s + p50/p99 opóźnienia dostarczenia
+
+Uruchom:
+  python benchmarks/sender_bench.py                                  # 2000 alertów, 20 webhooków
+  python benchmarks/sender_bench.py --alerts 10000 --webhooks 50 --rate 400 --latency-ms 40
+  python benchmarks/sender_bench.py --channels 10 --error-rate 0.02 --global-429-rate 0.01
+  python benchmarks/sender_bench.py --compare benchmarks/results/sender-20260101-120000.json
+
+Bazy powstają w katalogu tymczasowym, DISCORD_API_BASE wskazuje na
+FakeDiscord w tym samym procesie. Alerty trafiają do outboxa w tempie
+`--rate` (0 = wszystkie od razu) i przechodzą przez sender.run() jak w
+main.py. Opóźnienie = od zapisu w outboxie do przyjęcia oferty przez serwer.
+Wynik ląduje w benchmarks/results/sender-<data>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import git_commit, point_db_at
+from fake_discord import FakeDiscord
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+_WORDS = ["kurtka", "bluza", "spodnie", "czapka", "buty", "płaszcz", "vintage", "oversize", "nowa"]
+
+
+def _percentile(samples, p):
+    return samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))] if samples else None
+
+
+def setup_queries(db, webhooks, channels):
+    """Zapytania: najpierw `webhooks` webhooków, potem `channels` kanałów bota."""
+    conn = db.get_connection()
+    queries = []
+    for n in range(1, webhooks + channels + 1):
+        channel_id = str(900_000 + n) if n > webhooks else ""
+        webhook = f"https://discord.com/api/webhooks/{100_000 + n}/bench-token-{n}"
+        conn.execute("""INSERT INTO queries (id, name, discord_webhook_url, discord_channel_name,
+            discord_channel_id, embed_color) VALUES (?, ?, ?, ?, ?, '5763719')""",
+            (n, f"bench-{n}", webhook, f"kanal-{n}", channel_id))
+        queries.append({"id": n, "name": f"bench-{n}", "webhook_url": webhook, "channel_id": channel_id})
+    if channels:
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('discord_bot_token', 'bench-token')")
+    conn.commit()
+    conn.close()
+    db._invalidate_config_cache()
+    return queries
+
+
+def make_entries(queries, count, rng, first_id=10_000_000):
+    from src.pyVinted.items.item import Item
+    now = int(time.time())
+    entries = []
+    for i in range(count):
+        query = rng.choice(queries)
+        item_id = first_id + i
+        item = Item({
+            "id": item_id,
+            "title": f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)} {item_id}",
+            "price": {"amount": f"{rng.randint(10, 500)}.00", "currency_code": "PLN"},
+            "url": f"https://www.vinted.pl/items/{item_id}",
+            "created_at_ts": now,
+            "user": {"id": 1 + i % 1000, "login": f"user{i % 1000}"},
+            "photos": [{"url": f"https://images.vinted.net/{item_id}.jpg"}],
+        })
+        entries.append({"item": item, "query_id": query["id"], "query_name": query["name"],
+                        "webhook_url": query["webhook_url"], "channel_id": query["channel_id"],
+                        "embed_color": "5763719"})
+    return entries
+
+
+async def drive(entries, rate, fake, timeout):
+    """Producent (outbox.enqueue w tempie `rate`) + sender.run() do dostarczenia wszystkich alertów."""
+    from src import outbox, sender
+    enqueued_at = {}
+    stop = asyncio.Event()
+    task = asyncio.create_task(sender.run(stop))
+    started = time.monotonic()
+    chunk = max(1, rate // 20) if rate else len(entries)
+    for i in range(0, len(entries), chunk):
+        part = entries[i:i + chunk]
+        now = time.monotonic()
+        for entry in part:
+            enqueued_at[entry["item"].id] = now
+        await asyncio.to_thread(outbox.enqueue, part)
+        if rate:
+            await asyncio.sleep(max(0.0, started + (i + len(part)) / rate - time.monotonic()))
+    deadline = time.monotonic() + timeout
+    while len(fake.deliveries) < len(entries) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    finished = time.monotonic()
+    metrics = sender.get_metrics()
+    stop.set()
+    await task
+    return enqueued_at, started, finished, metrics
+
+
+def report_for(entries, enqueued_at, started, finished, fake, metrics):
+    first = {}
+    for at, item_id in fake.deliveries:
+        first.setdefault(item_id, at)
+    latencies = sorted((at - enqueued_at[i]) * 1000 for i, at in first.items() if i in enqueued_at)
+    last = max(first.values()) if first else finished
+    elapsed = max(1e-9, last - started)
+    return {
+        "alerts": len(entries),
+        "delivered": len(first),
+        "duplicates": len(fake.deliveries) - len(first),
+        "elapsed_s": round(elapsed, 2),
+        "alerts_per_s": round(len(first) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50), 1) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 0.99), 1) if latencies else None,
+        "max_ms": round(latencies[-1], 1) if latencies else None,
+        "http_messages": fake.stats["messages"],
+        "http_requests": fake.stats["requests"],
+        "route_429": fake.stats["route_429"],
+        "global_429": fake.stats["global_429"],
+        "server_errors": fake.stats["errors"],
+        "ratelimit_waits": metrics.get("discord_ratelimit_waits_total"),
+        "calls_saved": metrics.get("sender_calls_saved_total"),
+    }
+
+
+def compare(previous_path, result):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)["result"]
+    print(f"\nPorównanie z {previous_path}:")
+    for key in ("alerts_per_s", "p50_ms", "p99_ms", "http_requests", "route_429", "global_429"):
+        old, new = previous.get(key), result.get(key)
+        ratio = f" ({new / old:.2f}×)" if old and new is not None else ""
+        print(f"  {key:<14} {old!s:>10} → {new!s:>10}{ratio}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sendera na lokalnym zamienniku Discorda")
+    parser.add_argument("--alerts", type=int, default=2_000)
+    parser.add_argument("--webhooks", type=int, default=20, help="zapytań z osobnym webhookiem")
+    parser.add_argument("--channels", type=int, default=0, help="zapytań wysyłanych przez bota (kanały)")
+    parser.add_argument("--rate", type=int, default=0, help="alertów/s do outboxa (0 = wszystkie naraz)")
+    parser.add_argument("--route-limit", type=int, default=5)
+    parser.add_argument("--route-window", type=float, default=2.0)
+    parser.add_argument("--global-limit", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--global-429-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="maks. czas na dostarczenie (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir", help="katalog bazowy dla plików tymczasowych (domyślnie systemowy tmp)")
+    parser.add_argument("--output", help="plik JSON wyniku (domyślnie benchmarks/results/sender-<data>.json)")
+    parser.add_argument("--compare", help="wcześniejszy wynik JSON do porównania")
+    args = parser.parse_args(argv)
+    if args.webhooks + args.channels < 1:
+        parser.error("potrzebny co najmniej jeden webhook albo kanał")
+
+    fake = FakeDiscord(route_limit=args.route_limit, route_window=args.route_window,
+                       global_limit=args.global_limit, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, global_429_rate=args.global_429_rate, seed=args.seed).start()
+    # przed importem src.config / discord_bot — baza API czytana przy imporcie
+    os.environ["DISCORD_API_BASE"] = fake.base_url
+    import src.database as db
+    import main as _main  # noqa: F401 — core._finish_entry importuje main (i jego setup_logging("INFO"))
+    from src.logger import setup_logging
+    setup_logging("WARNING")
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="vinted-senderbench-", dir=args.dir)
+    point_db_at(workdir)
+    try:
+        db.init_db()
+        queries = setup_queries(db, args.webhooks, args.channels)
+        entries = make_entries(queries, args.alerts, rng)
+        print(f"🧪 {args.alerts} alertów → {args.webhooks} webhooków + {args.channels} kanałów bota "
+              f"({fake.base_url}, opóźnienie {args.latency_ms}±{args.jitter_ms} ms)")
+        enqueued_at, started, finished, metrics = asyncio.run(drive(entries, args.rate, fake, args.timeout))
+        result = report_for(entries, enqueued_at, started, finished, fake, metrics)
+    finally:
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"  dostarczono   {result['delivered']}/{result['alerts']} w {result['elapsed_s']}s "
+          f"→ {result['alerts_per_s']} alertów/s")
+    print(f"  opóźnienie    p50 {result['p50_ms']} ms   p99 {result['p99_ms']} ms   max {result['max_ms']} ms")
+    print(f"  HTTP          {result['http_requests']} żądań, {result['http_messages']} wiadomości, "
+          f"429: {result['route_429']} trasy / {result['global_429']} globalne, 500: {result['server_errors']}")
+    if result["delivered"] < result["alerts"]:
+        print(f"⚠️ Nie dostarczono {result['alerts'] - result['delivered']} alertów w {args.timeout}s")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("dir", "output", "compare")},
+        "result": result,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"sender-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Zapisano {output}")
+    if args.compare:
+        compare(args.compare, result)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@
 #
 #  Uruchom: bash deploy/setup_tmpfs_wal.sh
 #  Wymagane: uruchomić PRZED startem aplikacji
+#
+#  ZALECANE ZAMIAST TEGO: VINTED_DB_MODE=tmpfs (src/ramdisk.py) —
+#  cała baza robocza w RAM + atomowe snapshoty do data/ przez backup API.
+#  Symlinki z tego skryptu nie są potrzebne w trybie tmpfs (snapshot je usuwa).
 # ============================================================
 set -e
 
@@ -17,7 +21,7 @@ warning() { echo -e "${YELLOW}[WARN]${NC} $1"; }
 PROJECT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 DATA_DIR="$PROJECT_DIR/data"
 TMPFS_DIR="/tmp/vinted-db"
-DB_FILE="vinted_notification.db"
+DB_FILES="vinted_notification.db vinted_logs.db vinted_analytics.db"
 
 info "Katalog danych: $DATA_DIR"
 
@@ -35,6 +39,7 @@ fi
 
 # ── 3. Symlink WAL i SHM do tmpfs ──────────────────────────
 # Główna baza zostaje na SD (bezpieczna) — tylko journal w RAM
+for DB_FILE in $DB_FILES; do
 for ext in "wal" "shm"; do
     target="$DATA_DIR/${DB_FILE}-${ext}"
     tmpfs_file="$TMPFS_DIR/${DB_FILE}-${ext}"
@@ -54,9 +59,14 @@ for ext in "wal" "shm"; do
         info "Symlink ${DB_FILE}-${ext} już istnieje ✓"
     fi
 done
+done
 
 # ── 4. Dodaj do crontab (auto-setup po restarcie) ──────────
-CRON_CMD="@reboot mkdir -p $TMPFS_DIR && touch $TMPFS_DIR/${DB_FILE}-wal $TMPFS_DIR/${DB_FILE}-shm"
+TOUCH_FILES=""
+for DB_FILE in $DB_FILES; do
+    TOUCH_FILES="$TOUCH_FILES $TMPFS_DIR/${DB_FILE}-wal $TMPFS_DIR/${DB_FILE}-shm"
+done
+CRON_CMD="@reboot mkdir -p $TMPFS_DIR && touch$TOUCH_FILES"
 if ! crontab -l 2>/dev/null | grep -q "vinted-db"; then
     (crontab -l 2>/dev/null; echo "$CRON_CMD  # vinted-db tmpfs") | crontab -
     info "Dodano crontab @reboot (auto-setup po restarcie)"
@@ -26,12 +26,22 @@ _metrics = {
 _start_time = time.time()
 
 def _format_metrics() -> str:
+    from src.maintenance import get_metrics as maintenance_metrics
+    from src.ramdisk import get_metrics as ramdisk_metrics
+    from src.sender import get_metrics as sender_metrics
+    from src.outbox import get_metrics as outbox_metrics
+    from src.filters import get_metrics as filter_metrics
+    from src.firehose import get_metrics as firehose_metrics
+    from src.price_watch import get_metrics as price_watch_metrics
+    from src.recheck import get_metrics as recheck_metrics
+    from src.core import get_metrics as scan_metrics
     _metrics["uptime_seconds"] = int(time.time() - _start_time)
     lines = []
-    counter_keys = {"scrapes_total", "items_sent_total", "errors_total"}
-    for key, val in _metrics.items():
+    for key, val in {**_metrics, **maintenance_metrics(), **ramdisk_metrics(), **sender_metrics(),
+                     **outbox_metrics(), **filter_metrics(), **firehose_metrics(),
+                     **price_watch_metrics(), **recheck_metrics(), **scan_metrics()}.items():
         prom_name = f"vinted_{key}"
-        prom_type = "counter" if key in counter_keys else "gauge"
+        prom_type = "counter" if key.endswith("_total") else "gauge"
         lines.append(f"# HELP {prom_name} Vinted bot metric: {key}")
         lines.append(f"# TYPE {prom_name} {prom_type}")
         lines.append(f"{prom_name} {val}")
@@ -72,17 +82,23 @@ def _setup_sighup():
     signal.signal(signal.SIGHUP, _on_sighup)
     main_log.info("📡 SIGHUP handler aktywny (kill -HUP %d)", os.getpid())
 
+def _setup_sigterm():
+    """systemctl stop → ta sama ścieżka co Ctrl+C (flush cen + snapshot baz z RAM)."""
+    def _on_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
 async def async_scraper():
     """Async scraper — OPTYMALIZACJA v4.1: Domyślnie 8s zamiast 60s!"""
-    from src.core import scrape_all_queries, scrape_tracked_sellers, warmup
+    from src.core import scrape_all_queries, warmup
     enable_db_logging()
     main_log.info("▶ Scraper uruchomiony (async)")
     warmup()
     while not _stop.is_set():
         try:
             interval = int(db.get_config("scan_interval", "8"))
+            # zapytania i obserwowani sprzedawcy — jeden cykl z terminem (core._run_cycle)
             await asyncio.to_thread(scrape_all_queries)
-            await asyncio.to_thread(scrape_tracked_sellers)
             _metrics["scrapes_total"] += 1
             _sd_notify("WATCHDOG=1")
         except Exception as e:
@@ -97,22 +113,66 @@ async def async_scraper():
     main_log.info("⏹ Scraper zatrzymany")
 
 async def async_sender():
-    """Async sender — konsumuje queue co 0.1s (szybciej!)"""
-    from src.core import process_items_queue
+    """Async sender — tor na webhook / kanał, tempo z nagłówków rate-limit (src/sender.py)"""
+    from src import sender
     enable_db_logging()
-    main_log.info("▶ Sender uruchomiony (async)")
+    main_log.info("▶ Sender uruchomiony (async, tory per kanał)")
     while not _stop.is_set():
         try:
-            await asyncio.to_thread(process_items_queue)
+            await sender.run(_stop)
         except Exception as e:
             _metrics["errors_total"] += 1
             main_log.error(f"Błąd sendera: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(_stop.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+    main_log.info("⏹ Sender zatrzymany")
+
+async def async_maintenance():
+    """Konserwacja baz (checkpoint, optimize, vacuum, retencja) tylko w oknach ciszy."""
+    from src.maintenance import run_if_idle
+    while not _stop.is_set():
         try:
-            await asyncio.wait_for(_stop.wait(), timeout=0.1)
+            await asyncio.wait_for(_stop.wait(), timeout=5)
             break
         except asyncio.TimeoutError:
             pass
-    main_log.info("⏹ Sender zatrzymany")
+        try:
+            await asyncio.to_thread(run_if_idle)
+        except Exception as e:
+            _metrics["errors_total"] += 1
+            main_log.error(f"Błąd maintenance: {e}", exc_info=True)
+
+async def async_recheck():
+    """Ponowne sprawdzanie wysłanych ofert (cena, sprzedane, ukryte) we własnym budżecie żądań."""
+    from src.recheck import run_once
+    while not _stop.is_set():
+        try:
+            await asyncio.wait_for(_stop.wait(), timeout=2)
+            break
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception as e:
+            _metrics["errors_total"] += 1
+            main_log.error(f"Błąd recheck: {e}", exc_info=True)
+
+async def async_snapshots():
+    """Tryb tmpfs: kopia baz z RAM do data/ co snapshot_interval_seconds (okno utraty danych)."""
+    from src.ramdisk import snapshot_all, snapshot_interval
+    while not _stop.is_set():
+        try:
+            await asyncio.wait_for(_stop.wait(), timeout=snapshot_interval())
+            break
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await asyncio.to_thread(snapshot_all)
+        except Exception as e:
+            _metrics["errors_total"] += 1
+            main_log.error(f"Błąd snapshotu: {e}", exc_info=True)
 
 def thread_web():
     import logging
@@ -157,10 +217,15 @@ async def async_main():
     db.init_db()
     enable_db_logging()
     main_log.info("✅ Baza danych gotowa")
+    if db.RAM_RESIDENT:
+        from src.ramdisk import snapshot_interval
+        main_log.info(f"💾 Tryb tmpfs: {', '.join(db.RAM_RESIDENT)} w {db.RAM_DIR}, "
+                      f"snapshot do data/ co {snapshot_interval():.0f}s")
     queries = db.get_all_queries()
     active = sum(1 for q in queries if q["active"])
     main_log.info(f"📋 Zapytania: {len(queries)} total, {active} aktywnych")
     _setup_sighup()
+    _setup_sigterm()
     _sd_notify("READY=1")
     headless = os.environ.get("HEADLESS", "1") == "1"
     if headless:
@@ -171,12 +236,17 @@ async def async_main():
     web_thread.start()
     scraper_task = asyncio.create_task(async_scraper())
     sender_task = asyncio.create_task(async_sender())
+    maintenance_task = asyncio.create_task(async_maintenance())
+    recheck_task = asyncio.create_task(async_recheck())
+    tasks = [scraper_task, sender_task, maintenance_task, recheck_task]
+    if db.RAM_RESIDENT:
+        tasks.append(asyncio.create_task(async_snapshots()))
     main_log.info("  ✅ Scraper + Seller tracking uruchomiony")
     main_log.info("  ✅ Sender uruchomiony")
     main_log.info(f"  📡 PID: {os.getpid()}")
     main_log.info("⚠️  UWAGA: Skanowanie co 5-10s — użyj WARP/proxy!")
     try:
-        await asyncio.gather(scraper_task, sender_task)
+        await asyncio.gather(*tasks)
     except asyncio.CancelledError:
         pass
 
@@ -194,6 +264,13 @@ def main():
             task.cancel()
         loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
         loop.close()
+        from src.core import shutdown_scans
+        shutdown_scans()
+        db.flush_price_tracking()
+        if db.RAM_RESIDENT:
+            from src.ramdisk import snapshot_all
+            saved = snapshot_all(reason="shutdown")
+            main_log.info(f"💾 Snapshot przy zamknięciu: {', '.join(saved) or 'brak'}")
         main_log.info("👋 Do widzenia!")
 
 if __name__ == "__main__":
@@ -3,7 +3,12 @@ config.py - Stałe i konfiguracja Vinted-Notification.
 
 Obsługiwane domeny Vinted (API działa identycznie na wszystkich):
 https://www.vinted.{domain}/api/v2/catalog/items
+
+DISCORD_API_BASE (zmienna środowiskowa) kieruje cały ruch Discorda — webhooki
+zapisane w zapytaniach i wiadomości bota — na inny serwer, np. lokalny
+benchmarks/fake_discord.py przy testach obciążeniowych.
 """
+import os
 import re
 from urllib.parse import urlparse
 
@@ -50,3 +55,17 @@ def normalize_domain(domain: str) -> str:
     """Sprawdza i normalizuje domenę."""
     d = (domain or "pl").lower().strip()
     return d if d in VINTED_DOMAINS else "pl"
+
+
+# Discord API (bot: {base}/channels/…, webhooki: {base}/webhooks/…)
+DISCORD_API_DEFAULT = "https://discord.com/api/v10"
+DISCORD_API_BASE = os.environ.get("DISCORD_API_BASE", DISCORD_API_DEFAULT).rstrip("/")
+
+_DISCORD_URL_PATTERN = re.compile(r"^https://(?:ptb\.|canary\.)?discord(?:app)?\.com/api(?:/v\d+)?(?=/)")
+
+
+def discord_api_url(url: str) -> str:
+    """Adres Discorda przepisany na DISCORD_API_BASE (bez zmian przy domyślnej bazie)."""
+    if DISCORD_API_BASE == DISCORD_API_DEFAULT:
+        return url
+    return _DISCORD_URL_PATTERN.sub(DISCORD_API_BASE, url, count=1)
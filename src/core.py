@@ -1,24 +1,33 @@
 """
 core.py - Logika scrapowania Vinted.
 WERSJA: 4.1 - Deferred enrichment + Fast/Slow path + Multi-session + Per-domain rate limit
+              + lokalne reguły filtrów zapytań przed enrichmentem (src/filters.py)
+              + tryb firehose: jeden strumień newest_first na domenę (src/firehose.py)
+              + obniżki cen znanych ofert z każdej odpowiedzi katalogu (src/price_watch.py)
 """
+import math
 import time
+import threading
 import queue
 import random
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache, partial
 from urllib.parse import urlparse, parse_qs, parse_qsl, urlencode, urlunparse
 import src.database as db
-from src.pyVinted.items.item import Item
-from src.discord_sender import send_item_to_discord, send_price_drop_alert, send_seller_alert
+from src.pyVinted.items import Item, ItemBatch
+from src.discord_sender import (build_item_payload, build_seller_payload,
+                                build_packed_payload, compact_item_embed, MAX_EMBEDS_PER_MESSAGE)
+from src import discord_http
 from src.discord_bot import get_bot
 from src.anti_ban import SessionManager, human_delay, scan_jitter, backoff, rate_limit_tracker
 from src.proxy_manager import proxy_manager
 from src.config import extract_domain_from_url, get_api_base_url
+from src import filters, firehose, maintenance, outbox, price_watch
+from src.matcher import Subscription
 from src.logger import get_logger
 logger = get_logger("core")
 
-items_queue: queue.Queue = queue.Queue(maxsize=100)
 enrich_queue: queue.Queue = queue.Queue(maxsize=200)
 
 from collections import deque as _deque
@@ -192,8 +201,29 @@ async def _deferred_enrich(item, domain: str):
     except Exception as e:
         logger.debug(f"Enrichment failed for {item.id}: {e}")
 
-def _fetch_items(query_url: str, per_page: int = 10):
-    """OPTYMALIZACJA v4.1: per_page=10 zamiast 15"""
+def _enrich_items(items, domain: str):
+    """Oceny sprzedawców (równolegle) dla ofert bez nich w danych katalogu."""
+    users_to_fetch = {it.user_id for it in items if it.user_id and it.feedback_count == 0}
+    if users_to_fetch:
+        async def enrich_batch():
+            tasks = [_deferred_enrich(it, domain) for it in items if it.user_id in users_to_fetch]
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run(enrich_batch())
+
+def _fetch_items(query_url: str, per_page: int = 10, enrich: bool = True):
+    """OPTYMALIZACJA v4.1: per_page=10 zamiast 15. enrich=False — enrichment robi wołający (po filtrach)"""
+    domain = extract_domain_from_url(query_url)
+    items = [Item(it, domain=domain) for it in _fetch_raw(query_url, per_page)]
+    if enrich:
+        _enrich_items(items, domain)
+    return items
+
+def _fetch_batch(query_url: str, per_page: int = 10) -> ItemBatch:
+    """Strona ofert jako kolumny — obiekty Item tworzy dopiero wołający, dla ofert po filtrach."""
+    return ItemBatch.from_json(_fetch_raw(query_url, per_page), extract_domain_from_url(query_url))
+
+def _fetch_raw(query_url: str, per_page: int = 10) -> list:
+    """Surowa lista `items` z API katalogu (z ponowieniami); [] przy błędzie."""
     domain = extract_domain_from_url(query_url)
     api_url = get_api_base_url(domain)
     sm = _get_session_manager(domain)
@@ -234,19 +264,14 @@ def _fetch_items(query_url: str, per_page: int = 10):
                 sm.invalidate()
                 time.sleep(backoff(attempt))
                 continue
-            items = [Item(it, domain=domain) for it in data.get("items", [])]
-            hidden_count = sum(1 for it in items if it.is_hidden)
-            if hidden_count > 0:
-                logger.warning(f"🔒 Znaleziono {hidden_count}/{len(items)} ukrytych ofert!")
-                for it in items:
-                    if it.is_hidden:
-                        db.add_log("INFO", "hidden_found", f"🔒 {it.title} — {it.price} {it.currency}")
-            users_to_fetch = {it.user_id for it in items if it.user_id and it.feedback_count == 0}
-            if users_to_fetch:
-                async def enrich_batch():
-                    tasks = [_deferred_enrich(it, domain) for it in items if it.user_id in users_to_fetch]
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                asyncio.run(enrich_batch())
+            items = data.get("items", [])
+            hidden = [it for it in items if it.get("is_hidden")]
+            if hidden:
+                logger.warning(f"🔒 Znaleziono {len(hidden)}/{len(items)} ukrytych ofert!")
+                for it in hidden:
+                    price = it.get("price") if isinstance(it.get("price"), dict) else {"amount": it.get("price")}
+                    db.add_log("INFO", "hidden_found", f"🔒 {it.get('title', 'Brak tytułu')} — "
+                               f"{price.get('amount', '0')} {price.get('currency_code', 'PLN')}")
             return items
         except Exception as e:
             logger.error(f"Błąd (próba {attempt}/3): {e}")
@@ -273,8 +298,38 @@ def _fetch_seller_items(user_id: int, domain: str = "pl", per_page: int = 10):
         logger.error(f"Błąd fetch seller items: {e}")
         return []
 
+def _fetch_item_detail(vinted_id: int, domain: str = "pl") -> tuple:
+    """Szczegóły jednej oferty (src/recheck.py) → (status HTTP, dict oferty albo None); (0, None) przy błędzie sieci."""
+    sm = _get_session_manager(domain)
+    try:
+        r = sm.get(f"https://www.vinted.{domain}/api/v2/items/{int(vinted_id)}", timeout=10)
+        if r.status_code != 200:
+            return r.status_code, None
+        data = r.json()
+        return 200, data.get("item") if isinstance(data.get("item"), dict) else data
+    except Exception as e:
+        logger.debug(f"Szczegóły oferty {vinted_id}: {e}")
+        return 0, None
+
+def _query_entry(query: dict, item) -> dict:
+    return {
+        "item": item,
+        "query_id": query["id"],
+        "query_name": query["name"],
+        "webhook_url": query["discord_webhook_url"],
+        "channel_id": query.get("discord_channel_id", ""),
+        "embed_color": query["embed_color"],
+        "priority": query.get("priority", 3),
+    }
+
+@lru_cache(maxsize=4096)
+def _url_price_range(url: str) -> tuple:
+    """(price_from, price_to) URL-a w groszach/centach, zaokrąglone na korzyść oferty; None = brak granicy."""
+    sub = Subscription(0, url)
+    return (math.floor(sub.price_from * 100) if sub.price_from is not None else None,
+            math.ceil(sub.price_to * 100) if sub.price_to is not None else None)
+
 def _fetch_single_query_multi_url(query: dict, items_per_query: int, new_item_window: int) -> tuple:
-    query_id = query["id"]
     query_name = query["name"]
     query_urls = query.get("urls", [])
     if not query_urls:
@@ -283,152 +338,434 @@ def _fetch_single_query_multi_url(query: dict, items_per_query: int, new_item_wi
     all_results = []
     total_new = 0
     total_all = 0
+    predicate = filters.for_query(query)
     for url_entry in query_urls:
         url = url_entry["url"] if isinstance(url_entry, dict) else url_entry
         last_ts = url_entry.get("last_item_ts", query.get("last_item_ts", 0)) if isinstance(url_entry, dict) else query.get("last_item_ts", 0)
         try:
-            items = _fetch_items(url, per_page=items_per_query)
-            new_items = [it for it in items if it.is_new_item(minutes=new_item_window)]
-            for item in reversed(new_items):
-                if last_ts and item.raw_timestamp <= last_ts:
+            batch = _fetch_batch(url, per_page=items_per_query)
+            # ceny znanych ofert z tej samej odpowiedzi — obniżki idą osobnym strumieniem
+            price_watch.observe(batch, query, predicate)
+            fresh = batch.fresh(new_item_window)
+            # okno, watermark i zakolejkowane id jako maski — Item powstaje tylko dla ocalałych ofert
+            keep = batch.both(fresh, batch.after(last_ts), batch.unseen(_queued_ids_set))
+            # zakres ceny z URL-a (price_from / price_to) — jak filtr API, gdyby odpowiedź go pominęła
+            low_cents, high_cents = _url_price_range(url)
+            if low_cents is not None or high_cents is not None:
+                keep = batch.both(keep, batch.price_between(low_cents, high_cents))
+            max_total = predicate.rules.get("max_total_price") if predicate else None
+            if max_total is not None:
+                # zapas 1 grosza — granicę dokładnie rozstrzyga predykat
+                affordable = batch.price_between(high_cents=math.ceil(Item.price_for_total(max_total) * 100) + 1)
+                for n in batch.indices(batch.both(keep, batch.inverse(affordable))):
+                    predicate.drop(batch.ids[n], "max_total_price", batch.prices[n])
+                keep = batch.both(keep, affordable)
+            # dedup po seen_items jednym zapytaniem dla całej strony
+            seen = db.existing_items(batch.ids[n] for n in batch.indices(keep))
+            if seen:
+                keep = batch.both(keep, batch.unseen(seen))
+            candidates = []
+            for item in reversed(batch.items(keep)):
+                # reguły lokalne przed enrichmentem — odrzucone oferty nie kosztują zapytań o sprzedawcę
+                if predicate and not predicate(item):
                     continue
-                if _is_already_queued(item.id) or db.item_exists(str(item.id)):
+                candidates.append(item)
+            _enrich_items(candidates, extract_domain_from_url(url))
+            for item in candidates:
+                if predicate and predicate.uses_rating and not predicate(item, enriched=True):
                     continue
                 _mark_queued(item.id)
-                all_results.append({
-                    "item": item,
-                    "query_id": query_id,
-                    "query_name": query_name,
-                    "webhook_url": query["discord_webhook_url"],
-                    "channel_id": query.get("discord_channel_id", ""),
-                    "embed_color": query["embed_color"],
-                })
-            total_new += len(new_items)
-            total_all += len(items)
+                all_results.append(_query_entry(query, item))
+            total_new += batch.count(fresh)
+            total_all += len(batch)
         except Exception as e:
             logger.error(f"Błąd [{query_name}] URL: {url[:50]}... : {e}")
             db.add_log("ERROR", "scraper", f"Błąd [{query_name}] URL {url[:50]}: {str(e)}")
     return (query_name, total_new, total_all, all_results)
 
+_catalog_tree_tried: dict = {}
+_CATALOG_TREE_RETRY = 3600
+
+def _load_catalog_parents(domain: str):
+    """Drzewo kategorii domeny dla firehose (catalog[] w URL-u to zwykle kategoria nadrzędna oferty)."""
+    if time.time() - _catalog_tree_tried.get(domain, 0) < _CATALOG_TREE_RETRY:
+        return
+    _catalog_tree_tried[domain] = time.time()
+    try:
+        sm = _get_session_manager(domain)
+        r = sm.get(f"https://www.vinted.{domain}/api/v2/catalog/initializers", timeout=10)
+        parents = firehose.parse_catalog_tree(r.json()) if r.status_code == 200 else {}
+        if parents:
+            firehose.set_catalog_parents(domain, parents)
+            logger.info(f"🌳 Drzewo kategorii vinted.{domain}: {len(parents)} kategorii")
+        else:
+            logger.warning(f"Drzewo kategorii vinted.{domain} niedostępne (HTTP {r.status_code}) — URL-e z catalog[] odpytywane osobno")
+    except Exception as e:
+        logger.warning(f"Drzewo kategorii vinted.{domain}: {e}")
+
+def _scrape_firehose(domain: str, queries: list, new_item_window: int) -> tuple:
+    """Jedna strona najnowszych ofert domeny → dopasowanie lokalne do wszystkich zapytań (src/firehose.py)."""
+    name = f"firehose vinted.{domain}"
+    batch = _fetch_batch(firehose.feed_url(domain), per_page=firehose.per_page())
+    by_id = {q["id"]: q for q in queries}
+
+    def drop_route(item):
+        subs = [s for s in firehose.match(domain, item, count=False) if s.query_id in by_id]
+        subs.sort(key=lambda s: -by_id[s.query_id].get("priority", 3))
+        return [(by_id[s.query_id], filters.for_query(by_id[s.query_id])) for s in subs]
+    # obniżki znanych ofert strumienia — jak price_watch.observe przy odpytywaniu URL-i
+    price_watch.observe_feed(batch, drop_route)
+    items = batch.items()
+    fresh = firehose.observe(domain, items)
+    new_items = [it for it in fresh if it.is_new_item(minutes=new_item_window)]
+    matched = []
+    seen = db.existing_items(it.id for it in new_items)
+    for item in reversed(new_items):
+        if _is_already_queued(item.id) or int(item.id) in seen:
+            continue
+        # jedna oferta = jeden alert, jak przy odpytywaniu — wygrywa zapytanie o najwyższym priorytecie
+        subs = [s for s in firehose.match(domain, item) if s.query_id in by_id]
+        subs.sort(key=lambda s: -by_id[s.query_id].get("priority", 3))
+        passing = []
+        for sub in subs:
+            query = by_id[sub.query_id]
+            last_ts = next((u.get("last_item_ts", 0) for u in query.get("urls", [])
+                            if isinstance(u, dict) and u["url"] == sub.url), query.get("last_item_ts", 0))
+            if last_ts and item.raw_timestamp <= last_ts:
+                continue
+            predicate = filters.for_query(query)
+            if predicate and not predicate(item):
+                continue
+            passing.append((query, predicate))
+        if passing:
+            matched.append((item, passing))
+    _enrich_items([item for item, _ in matched], domain)
+    results = []
+    for item, passing in matched:
+        for query, predicate in passing:
+            if predicate and predicate.uses_rating and not predicate(item, enriched=True):
+                continue
+            _mark_queued(item.id)
+            results.append(_query_entry(query, item))
+            break
+    return (name, len(new_items), len(items), results)
+
 def scrape_all_queries():
+    maintenance.scan_started()
+    try:
+        _scrape_all_queries()
+    finally:
+        maintenance.scan_finished()
+
+def _scrape_all_queries():
     _cleanup_stale_sessions()
-    queries = db.get_all_queries(active_only=True)
-    if not queries:
+    queries = db.get_queries_snapshot(active_only=True)
+    sellers = db.get_tracked_sellers(active_only=True)
+    if not queries and not sellers:
         logger.debug("Brak aktywnych zapytań")
         return
     items_per_query = int(db.get_config("items_per_query", "10"))
     new_item_window = int(db.get_config("new_item_window", "5"))
     proxy_stats = proxy_manager.get_stats()
     proxy_info = f"{proxy_stats['total_proxies']} proxy" if proxy_stats["has_proxy"] else "direct"
-    logger.info(f"Skan {len(queries)} zapytań | okno {new_item_window}min | {proxy_info}")
-    max_workers = min(len(queries), 6)
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = {
-            ex.submit(_fetch_single_query_multi_url, q, items_per_query, new_item_window): q
-            for q in queries
-        }
-        for future in as_completed(futures):
-            try:
-                query_name, n_new, n_all, results = future.result()
-                if n_new > 0:
-                    logger.info(f"[{query_name}] {n_new}/{n_all} nowych")
-                for r in results:
-                    items_queue.put(r)
-            except Exception as e:
-                logger.error(f"Błąd future: {e}")
+    domains = firehose.enabled_domains()
+    for domain in domains:
+        if firehose.needs_catalog_tree(domain):
+            _load_catalog_parents(domain)
+    covered = firehose.plan(queries, domains)
+    polled = []
+    for q in queries:
+        urls = [u for u in q.get("urls", []) if (q["id"], u["url"] if isinstance(u, dict) else u) not in covered]
+        if urls or not q.get("urls"):
+            polled.append({**q, "urls": urls} if covered else q)
+    firehose_info = f" | firehose {','.join(domains)} ({len(covered)} URL-i)" if domains else ""
+    seller_info = f" | {len(sellers)} sprzedawców" if sellers else ""
+    logger.info(f"Skan {len(queries)} zapytań{seller_info} | okno {new_item_window}min | {proxy_info}{firehose_info}")
+    jobs = [(("query", q["id"]), q["name"], _fetch_single_query_multi_url, (q, items_per_query, new_item_window))
+            for q in polled]
+    jobs += [(("firehose", d), f"firehose vinted.{d}", _scrape_firehose, (d, queries, new_item_window))
+             for d in domains]
+    seller_domain = db.get_config("default_domain", "pl")
+    jobs += [(("seller", s["user_id"]), f"SELLER:{s['username']}", _scrape_seller, (s, seller_domain))
+             for s in sellers]
+    _run_cycle(jobs, _scan_deadline())
 
-def scrape_tracked_sellers():
-    sellers = db.get_tracked_sellers(active_only=True)
-    if not sellers:
+# ── TERMIN CYKLU SKANU ─────────────────────────────────────────────
+# Cykl (zapytania, strumienie firehose, obserwowani sprzedawcy) czeka na
+# zadania najwyżej `scan_deadline_seconds` (config, domyślnie 30 s). Zadanie, które nie zdążyło (ponowienia z backoffem, 429), dokańcza
+# się w tle — wynik trafia do outboxa z callbacku, a do czasu zakończenia
+# zapytanie nie jest zlecane ponownie. Przekroczenia liczone są per zapytanie
+# (get_overruns, metryki scan_query_<id>_overruns_total); zadania, które nie
+# zdążyły nawet wystartować, to zaległość puli (scan_backlog_total), nie wina URL-a.
+# Jako trwający skan (maintenance.scan_running) liczy się tylko sam cykl —
+# zadania przeniesione po terminie nie blokują konserwacji ani recheck.
+
+_SCAN_WORKERS = 6
+_DEFAULT_SCAN_DEADLINE = 30
+_scan_pool = None
+_carried: dict = {}     # klucz zadania → future z poprzedniego cyklu (jeszcze w toku)
+_carried_lock = threading.Lock()   # przeniesienie po terminie vs callback zakończenia
+_overruns: dict = {}    # klucz zadania → liczba przekroczeń terminu
+_scan_stats = {
+    "scan_cycles_total": 0,
+    "scan_overruns_total": 0,
+    "scan_backlog_total": 0,
+    "scan_carried_completed_total": 0,
+    "scan_skipped_total": 0,
+    "scan_last_cycle_ms": 0,
+}
+
+def _scan_deadline() -> float:
+    try:
+        return max(1.0, float(db.get_config("scan_deadline_seconds", str(_DEFAULT_SCAN_DEADLINE))))
+    except ValueError:
+        return float(_DEFAULT_SCAN_DEADLINE)
+
+def _get_scan_pool() -> ThreadPoolExecutor:
+    global _scan_pool
+    if _scan_pool is None:
+        _scan_pool = ThreadPoolExecutor(max_workers=_SCAN_WORKERS, thread_name_prefix="scan")
+    return _scan_pool
+
+def _deliver(key, future):
+    """Wynik zadania do outboxa zaraz po zakończeniu — także po terminie cyklu."""
+    with _carried_lock:
+        if _carried.get(key) is future:
+            _carried.pop(key, None)
+            _scan_stats["scan_carried_completed_total"] += 1
+    if future.cancelled():
         return
-    logger.info(f"👤 Skanowanie {len(sellers)} sprzedawców...")
-    domain = db.get_config("default_domain", "pl")
-    for seller in sellers:
-        try:
-            user_id = int(seller['user_id'])
-            items = _fetch_seller_items(user_id, domain, per_page=10)
-            for item in items:
-                if _is_already_queued(item.id) or db.item_exists(str(item.id)):
-                    continue
-                _mark_queued(item.id)
-                items_queue.put({
-                    "item": item,
-                    "query_id": 0,
-                    "query_name": f"SELLER:{seller['username']}",
-                    "webhook_url": seller['discord_webhook_url'] or db.get_config("default_webhook", ""),
-                    "channel_id": "",
-                    "embed_color": "0xFFD700",
-                    "is_seller_item": True,
-                })
-            db.update_seller_last_check(str(user_id))
-            time.sleep(0.5)
-        except Exception as e:
-            logger.error(f"Błąd skanowania sprzedawcy {seller['username']}: {e}")
+    try:
+        query_name, n_new, n_all, results = future.result()
+        if n_new > 0:
+            logger.info(f"[{query_name}] {n_new}/{n_all} nowych")
+        if results:
+            maintenance.note_activity()
+            outbox.enqueue(results)
+    except Exception as e:
+        logger.error(f"Błąd future: {e}")
 
-def process_items_queue():
-    """OPTYMALIZACJA v4.1: Fast-path (alert) → Slow-path (enrichment)"""
+def _run_cycle(jobs, deadline: float):
+    """Zleca zadania [(klucz, nazwa, funkcja, argumenty)] i czeka na nie najwyżej `deadline` sekund."""
+    started = time.monotonic()
+    futures = {}
+    for key, name, fn, args in jobs:
+        running = _carried.get(key)
+        if running is not None and not running.done():
+            _scan_stats["scan_skipped_total"] += 1
+            continue
+        _carried.pop(key, None)
+        future = _get_scan_pool().submit(fn, *args)
+        futures[future] = (key, name)
+        future.add_done_callback(partial(_deliver, key))
+    _, pending = wait(futures, timeout=max(0.0, deadline - (time.monotonic() - started)))
+    slow, carried = [], 0
+    for future in pending:
+        key, name = futures[future]
+        with _carried_lock:
+            # zakończone tuż po wait() — wynik już dostarczył _deliver, to nie przekroczenie
+            if future.done():
+                continue
+            _carried[key] = future
+        carried += 1
+        if future.running():
+            _overruns[key] = _overruns.get(key, 0) + 1
+            _scan_stats["scan_overruns_total"] += 1
+            slow.append(name)
+        else:
+            _scan_stats["scan_backlog_total"] += 1
+    _scan_stats["scan_cycles_total"] += 1
+    _scan_stats["scan_last_cycle_ms"] = int((time.monotonic() - started) * 1000)
+    if carried:
+        logger.warning(f"⏱️ Termin cyklu ({deadline:.0f}s) minął — dokończenie w tle: {carried}"
+                       + (f"; wolne: {', '.join(slow)}" if slow else ""))
+
+def get_overruns(query_id) -> int:
+    """Ile razy zapytanie przekroczyło termin cyklu (od startu procesu)."""
+    return _overruns.get(("query", query_id), 0)
+
+def shutdown_scans():
+    """Zamknięcie: zadania czekające w puli są anulowane, trwające kończą się same."""
+    if _scan_pool is not None:
+        _scan_pool.shutdown(wait=False, cancel_futures=True)
+
+def get_metrics() -> dict:
+    metrics = dict(_scan_stats)
+    metrics["scan_carried"] = sum(1 for f in list(_carried.values()) if not f.done())
+    for (kind, ident), count in list(_overruns.items()):
+        name = f"query_{ident}" if kind == "query" else f"{kind}_{str(ident).replace('.', '_')}"
+        metrics[f"scan_{name}_overruns_total"] = count
+    return metrics
+
+def _scrape_seller(seller, domain: str) -> tuple:
+    """Zadanie cyklu skanu: nowe oferty obserwowanego sprzedawcy → (nazwa, nowe, wszystkie, wpisy)."""
+    name = f"SELLER:{seller['username']}"
+    user_id = int(seller['user_id'])
+    items = _fetch_seller_items(user_id, domain, per_page=10)
+    seen = db.existing_items([item.id for item in items])
+    entries = []
+    for item in items:
+        if _is_already_queued(item.id) or int(item.id) in seen:
+            continue
+        _mark_queued(item.id)
+        entries.append({
+            "item": item,
+            "query_id": 0,
+            "query_name": name,
+            "webhook_url": seller['discord_webhook_url'] or db.get_config("default_webhook", ""),
+            "channel_id": "",
+            "embed_color": "0xFFD700",
+            "is_seller_item": True,
+        })
+    db.update_seller_last_check(str(user_id))
+    return (name, len(entries), len(items), entries)
+
+def _message(url, payload, bot_token=None, entries=()):
+    """Wiadomość do wysłania: `entries` to wpisy, które dostarcza (puste dla obniżek)."""
+    return {"url": url, "payload": payload, "bot_token": bot_token, "entries": list(entries)}
+
+def _prepare_entry(entry) -> bool:
+    """Fast-path: dedup + pierwsza cena oferty w indeksie cen. True = nowa oferta do wysłania.
+
+    Obniżki znanych ofert wykrywa i wysyła src/price_watch.py — tu cena trafia
+    do indeksu tylko raz, przy pierwszym alercie.
+    """
+    item = entry["item"]
+    maintenance.note_activity()
+    vinted_id_str = str(item.id)
+    if db.item_exists(vinted_id_str):
+        db.update_query_last_ts(entry["query_id"], item.raw_timestamp)
+        return False
+    db.check_price_drop(vinted_id_str, item.title, item.brand_title, item.price, item.currency,
+                        item.size_title, item.url, item.photo, item.user_id, item.user_login)
+    return True
+
+def _item_message(entry) -> dict:
+    item = entry["item"]
+    channel_id = entry.get("channel_id", "")
+    embed_color = entry["embed_color"]
+    bot = get_bot()
+    if entry.get("is_seller_item", False):
+        return _message(entry["webhook_url"], build_seller_payload(item), entries=[entry])
+    if bot.enabled and channel_id:
+        payload = bot.build_item_payload(item, int(embed_color) if embed_color else 0x57F287)
+        return _message(bot.messages_url(channel_id), payload, bot.token, [entry])
+    return _message(entry["webhook_url"], build_item_payload(item, entry["query_name"], embed_color),
+                    entries=[entry])
+
+def _packed_message(entries) -> dict:
+    """Kilka ofert na tę samą trasę jedną wiadomością (zwarte embedy)."""
+    embeds = [compact_item_embed(e["item"], e["embed_color"], seller=e.get("is_seller_item", False), index=n)
+              for n, e in enumerate(entries, 1)]
+    first = entries[0]
+    bot = get_bot()
+    if not first.get("is_seller_item") and bot.enabled and first.get("channel_id"):
+        payload = bot.build_packed_payload([e["item"] for e in entries], embeds)
+        return _message(bot.messages_url(first["channel_id"]), payload, bot.token, entries)
+    return _message(first["webhook_url"], build_packed_payload(embeds), entries=entries)
+
+def _finish_entry(entry, success, start_time):
+    """Slow-path: zapis do bazy, liczniki i logi po wysyłce."""
     try:
         from main import _metrics
     except ImportError:
         _metrics = None
-    while not items_queue.empty():
-        try:
-            entry = items_queue.get_nowait()
-        except queue.Empty:
-            break
-        item = entry["item"]
-        query_id = entry["query_id"]
-        query_name = entry["query_name"]
-        webhook_url = entry["webhook_url"]
-        channel_id = entry.get("channel_id", "")
-        embed_color = entry["embed_color"]
-        is_seller_item = entry.get("is_seller_item", False)
-        start_time = time.time()
+    item = entry["item"]
+    query_id = entry["query_id"]
+    query_name = entry["query_name"]
+    if not success:
+        db.add_log("ERROR", "sender", f"❌ Błąd wysyłki: {item.title}")
+        return
+    db.add_item(vinted_id=str(item.id), title=item.title, brand=item.brand_title,
+        price=str(item.price), currency=item.currency, size=item.size_title or "",
+        status=item.status or "", photo_url=item.photo or "", item_url=item.url,
+        query_id=query_id, timestamp=item.raw_timestamp,
+        user_id=str(item.user_id) if item.user_id else None,
+        username=item.user_login)
+    if _metrics:
+        _metrics["items_sent_total"] += 1
+    if item.is_hidden:
+        logger.warning(f"🔒 WYSŁANO UKRYTĄ OFERTĘ: {item.title}")
+        db.add_log("WARNING", "hidden_sent", f"🔒 {item.title} — wymaga weryfikacji!")
+    hidden_tag = " [UKRYTY]" if item.is_hidden else ""
+    db.update_query_last_ts(query_id, item.raw_timestamp)
+    db.increment_query_items_found(query_id)
+    db.add_log("SUCCESS", "sender", f"✅{hidden_tag} {item.title} → #{query_name}")
+    logger.info(f"✅{hidden_tag} {item.title} ({item.price} {item.currency})")
+    logger.debug(f"Queue processing: {time.time() - start_time:.3f}s")
+
+def plan_batch(entries) -> list:
+    """Fast-path serii wpisów na jedną trasę → lista wiadomości do wysłania.
+
+    Nowe oferty idą jedną wiadomością (po MAX_EMBEDS_PER_MESSAGE), pojedyncza
+    oferta w pełnym układzie.
+    """
+    outgoing, fresh, fresh_ids = [], [], set()
+    for entry in entries:
         try:
-            vinted_id_str = str(item.id)
-            is_new, price_dropped, drop_amount, old_price = db.check_price_drop(
-                vinted_id_str, item.title, item.brand_title,
-                item.price, item.currency, item.size_title,
-                item.url, item.photo, item.user_id, item.user_login
-            )
-            if db.item_exists(vinted_id_str):
-                if price_dropped:
-                    logger.info(f"💰 PRICE DROP: {item.title} -{drop_amount:.2f}{item.currency}")
-                    send_price_drop_alert(item, webhook_url, drop_amount, old_price)
-                    db.add_log("SUCCESS", "price_drop", f"💰 {item.title} -{drop_amount:.2f}{item.currency}")
-                db.update_query_last_ts(query_id, item.raw_timestamp)
-                continue
-            bot = get_bot()
-            success = False
-            if is_seller_item:
-                success = send_seller_alert(item, webhook_url)
-            elif bot.enabled and channel_id:
-                success = bot.send_item(item=item, channel_id=channel_id, query_name=query_name,
-                    embed_color=int(embed_color) if embed_color else 0x57F287, webhook_url=webhook_url)
-            else:
-                success = send_item_to_discord(item=item, webhook_url=webhook_url,
-                    query_name=query_name, embed_color=embed_color)
-            if success:
-                db.add_item(vinted_id=vinted_id_str, title=item.title, brand=item.brand_title,
-                    price=str(item.price), currency=item.currency, size=item.size_title or "",
-                    status=item.status or "", photo_url=item.photo or "", item_url=item.url,
-                    query_id=query_id, timestamp=item.raw_timestamp,
-                    user_id=str(item.user_id) if item.user_id else None,
-                    username=item.user_login)
-                if _metrics:
-                    _metrics["items_sent_total"] += 1
-                if item.is_hidden:
-                    logger.warning(f"🔒 WYSŁANO UKRYTĄ OFERTĘ: {item.title}")
-                    db.add_log("WARNING", "hidden_sent", f"🔒 {item.title} — wymaga weryfikacji!")
-                hidden_tag = " [UKRYTY]" if item.is_hidden else ""
-                db.update_query_last_ts(query_id, item.raw_timestamp)
-                db.increment_query_items_found(query_id)
-                db.add_log("SUCCESS", "sender", f"✅{hidden_tag} {item.title} → #{query_name}")
-                logger.info(f"✅{hidden_tag} {item.title} ({item.price} {item.currency})")
-                processing_time = time.time() - start_time
-                logger.debug(f"Queue processing: {processing_time:.3f}s")
-            else:
-                db.add_log("ERROR", "sender", f"❌ Błąd wysyłki: {item.title}")
+            # ten sam przedmiot z dwóch wyszukiwań w jednej serii — jak przy item_exists
+            if _prepare_entry(entry) and entry["item"].id not in fresh_ids:
+                fresh.append(entry)
+                fresh_ids.add(entry["item"].id)
         except Exception as e:
-            logger.error(f"Błąd przetwarzania {item.id}: {e}", exc_info=True)
-        time.sleep(0.1)
+            logger.error(f"Błąd przetwarzania {entry['item'].id}: {e}", exc_info=True)
+    # wpisy sprzedawców mają inny układ — nie mieszamy ich z ofertami z wyszukiwań
+    groups = [[e for e in fresh if not e.get("is_seller_item")], [e for e in fresh if e.get("is_seller_item")]]
+    for group in groups:
+        for i in range(0, len(group), MAX_EMBEDS_PER_MESSAGE):
+            chunk = group[i:i + MAX_EMBEDS_PER_MESSAGE]
+            try:
+                outgoing.append(_item_message(chunk[0]) if len(chunk) == 1 else _packed_message(chunk))
+            except Exception as e:
+                logger.error(f"Błąd budowania wiadomości ({len(chunk)} ofert): {e}", exc_info=True)
+    return outgoing
+
+def finish_batch(messages, results, start_time) -> tuple:
+    """Slow-path po wysyłce. Zwraca (oferty w wiadomościach, wywołania HTTP, wpisy z nieudaną wysyłką).
+
+    Różnica dwóch pierwszych to zaoszczędzone wywołania.
+    """
+    alerted = calls = 0
+    failed = []
+    for message, result in zip(messages, results):
+        if not message["entries"]:
+            continue
+        calls += 1
+        alerted += len(message["entries"])
+        if result is None:
+            failed.extend(message["entries"])
+        for entry in message["entries"]:
+            try:
+                _finish_entry(entry, result is not None, start_time)
+            except Exception as e:
+                logger.error(f"Błąd przetwarzania {entry['item'].id}: {e}", exc_info=True)
+    return alerted, calls, failed
+
+def settle_outbox(entries, failed):
+    """Wynik serii do outboxa: nieudane → ponowienie, reszta (wysłane / duplikaty) → sent."""
+    failed_ids = {id(e) for e in failed}
+    outbox.complete([e["_outbox_id"] for e in entries if "_outbox_id" in e and id(e) not in failed_ids],
+                    [(e["_outbox_id"], "wysyłka nieudana") for e in failed if "_outbox_id" in e])
+
+def process_batch(entries) -> tuple:
+    """Blokująca wersja toru: plan → wysyłka → zapis (patrz src/sender.py)."""
+    start_time = time.time()
+    messages = plan_batch(entries)
+    results = [discord_http.request_sync("POST", m["url"], m["payload"], bot_token=m["bot_token"])
+               for m in messages]
+    alerted, calls, failed = finish_batch(messages, results, start_time)
+    settle_outbox(entries, failed)
+    return alerted, calls, failed
+
+def process_entry(entry):
+    """OPTYMALIZACJA v4.1: Fast-path (alert) → Slow-path (enrichment). Jeden wpis z outboxa."""
+    process_batch([entry])
+
+def process_items_queue():
+    """Sekwencyjne opróżnienie outboxa (narzędzia / tryb bez torów — patrz src/sender.py)"""
+    while True:
+        entries = outbox.claim(50)
+        if not entries:
+            break
+        for entry in entries:
+            process_entry(entry)
@@ -1,28 +1,121 @@
 """
 database.py - SQLite database layer.
-WERSJA: 4.1 - Seller tracking + Price drop + Fast scan support
+WERSJA: 4.2 - Migracje schematu + indeksy hot-path + snapshot konfiguracji + indeks i historia cen
+             + podział na bazy hot / logs / analytics + tryb tmpfs (bazy robocze w RAM)
+             + kompaktowy schemat (id INTEGER, ceny w groszach, słowniki marek/walut)
+             + FTS5 ofert i stronicowanie kursorem (panel)
 """
 import sqlite3
+import hashlib
 import os
+import re
+import statistics
 import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
 from src.logger import get_logger
 logger = get_logger("database")
 
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "vinted_notification.db")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# Trzy pliki, każdy z własnym WAL, writerem (lock) i polityką checkpointów:
+#   hot       — dedup items, zapytania, config (ścieżka scrapera)
+#   logs      — wysoka rotacja, utrata ostatnich wpisów po crashu jest akceptowalna
+#   analytics — price_tracking + historia cen, długie odczyty panelu
+DB_FILES = {
+    "hot": "vinted_notification.db",
+    "logs": "vinted_logs.db",
+    "analytics": "vinted_analytics.db",
+}
+# VINTED_DB_MODE=tmpfs — bazy z VINTED_DB_RAM_FILES pracują w RAM (VINTED_DB_RAM_DIR),
+# a do data/ trafiają tylko snapshoty (src/ramdisk.py). Domyślnie: disk.
+DB_MODE = os.environ.get("VINTED_DB_MODE", "disk").strip().lower()
+RAM_DIR = os.environ.get("VINTED_DB_RAM_DIR", "/dev/shm/vinted-db")
+RAM_RESIDENT = (
+    [n.strip() for n in os.environ.get("VINTED_DB_RAM_FILES", "hot,logs").split(",") if n.strip() in DB_FILES]
+    if DB_MODE == "tmpfs" else []
+)
+
+def _work_path(name):
+    return os.path.join(RAM_DIR if name in RAM_RESIDENT else DATA_DIR, DB_FILES[name])
+
+DB_PATH = _work_path("hot")
+LOG_DB_PATH = _work_path("logs")
+ANALYTICS_DB_PATH = _work_path("analytics")
 _lock = threading.Lock()
+_log_lock = threading.Lock()
+_analytics_lock = threading.Lock()
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH, timeout=30)
+# Checkpointy robi maintenance w oknach bezczynności (TRUNCATE);
+# wal_autocheckpoint to tylko bezpiecznik, gdy okna ciszy długo nie ma.
+_budget = threading.local()
+
+class BudgetExceeded(Exception):
+    """Zapytanie przerwane przez time_budget (SQLITE_INTERRUPT z progress handlera)."""
+
+@contextmanager
+def time_budget(seconds):
+    """Połączenia otwarte w tym bloku (ten wątek) przerywają zapytania po przekroczeniu limitu (BudgetExceeded)."""
+    _budget.deadline = time.monotonic() + seconds
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if getattr(e, "sqlite_errorcode", None) == sqlite3.SQLITE_INTERRUPT:
+            raise BudgetExceeded(f"przekroczony budżet {seconds:.1f}s") from e
+        raise
+    finally:
+        _budget.deadline = None
+
+def _connect(path, synchronous="NORMAL", autocheckpoint=4000):
+    conn = sqlite3.connect(path, timeout=30)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA synchronous={synchronous};")
     conn.execute("PRAGMA cache_size=1000;")
-    conn.execute("PRAGMA wal_autocheckpoint=1000;")
+    conn.execute(f"PRAGMA wal_autocheckpoint={autocheckpoint};")
+    deadline = getattr(_budget, "deadline", None)
+    if deadline is not None:
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    return conn
+
+def get_connection():
+    return _connect(DB_PATH)
+
+def get_log_connection():
+    return _connect(LOG_DB_PATH, synchronous="OFF", autocheckpoint=8000)
+
+def get_analytics_connection():
+    return _connect(ANALYTICS_DB_PATH, autocheckpoint=8000)
+
+# nazwa → (połączenie, writer lock)
+_DATABASES = {
+    "hot": (get_connection, _lock),
+    "logs": (get_log_connection, _log_lock),
+    "analytics": (get_analytics_connection, _analytics_lock),
+}
+
+def get_panel_connection():
+    """Połączenie dla panelu: baza hot + dołączone logs i analytics (nazwy tabel są unikalne)."""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("ATTACH DATABASE ? AS logdb", (LOG_DB_PATH,))
+    conn.execute("ATTACH DATABASE ? AS analytics", (ANALYTICS_DB_PATH,))
     return conn
 
 def init_db():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if RAM_RESIDENT:
+        from src.ramdisk import restore_all
+        restore_all()
+    for name, connect, lock, migrations in (
+        ("logs", get_log_connection, _log_lock, _LOG_MIGRATIONS),
+        ("analytics", get_analytics_connection, _analytics_lock, _ANALYTICS_MIGRATIONS),
+    ):
+        with lock:
+            conn = connect()
+            _apply_migrations(conn, migrations, name)
+            conn.close()
+    
     with _lock:
         conn = get_connection()
         c = conn.cursor()
@@ -77,7 +170,338 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )""")
         
-        c.execute("""CREATE TABLE IF NOT EXISTS price_tracking (
+        c.execute("""CREATE TABLE IF NOT EXISTS config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )""")
+        
+        conn.commit()
+        _move_legacy_tables(conn)
+        _create_legacy_tables(conn)
+        _apply_migrations(conn, _MIGRATIONS, "hot")
+        conn.close()
+
+    for name, (connect, lock) in _DATABASES.items():
+        with lock:
+            conn = connect()
+            try:
+                _ensure_incremental_vacuum(conn, name)
+            finally:
+                conn.close()
+    
+    for problem in check_query_plans():
+        logger.warning(f"Query plan: {problem}")
+    logger.info("✅ Baza danych zainicjalizowana (v4.2: hot + logs + analytics)")
+
+# Konwersja na auto_vacuum=INCREMENTAL wymaga pełnego VACUUM — raz, przy starcie i bez budżetu
+# czasu, tylko dla małych plików (większe: ręczny VACUUM, ostrzeżenie w logu)
+_VACUUM_CONVERT_MAX_BYTES = 32 * 1024 * 1024
+
+def _ensure_incremental_vacuum(conn, name):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    size = os.path.getsize(path) if path and os.path.exists(path) else 0
+    if size > _VACUUM_CONVERT_MAX_BYTES:
+        logger.warning(f"🧹 [{name}] auto_vacuum bez INCREMENTAL ({size // 2**20} MB) — konwersja wymaga "
+                       f"ręcznego VACUUM przy zatrzymanej aplikacji")
+        return
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    logger.info(f"🧹 [{name}] przełączono na auto_vacuum=INCREMENTAL")
+
+# ── MIGRACJE SCHEMATU ──────────────────────────────────────────────
+# Każda migracja to (wersja, opis, lista SQL lub funkcja(cursor)).
+# Wersje rosną monotonicznie; zastosowane wpisy trafiają do schema_version.
+
+def _column_exists(c, table, column):
+    return any(row[1] == column for row in c.execute(f"PRAGMA table_info({table})"))
+
+def _m1_item_user_columns(c):
+    for column in ("user_id", "username"):
+        if not _column_exists(c, "items", column):
+            c.execute(f"ALTER TABLE items ADD COLUMN {column} TEXT")
+
+# Kolumny, których zmiana NIE unieważnia snapshotu (liczniki/watermarki scrapera)
+_SETTINGS_TRIGGERS = {
+    "queries": "name, discord_webhook_url, discord_channel_name, discord_channel_id, embed_color, active",
+    "query_urls": "query_id, url",
+    "config": "key, value",
+}
+
+def _m3_settings_version(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS settings_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )""")
+    c.execute("INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 0)")
+    bump = "BEGIN UPDATE settings_version SET version = version + 1 WHERE id = 1; END"
+    for table, columns in _SETTINGS_TRIGGERS.items():
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_ins AFTER INSERT ON {table} {bump}")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_del AFTER DELETE ON {table} {bump}")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_upd AFTER UPDATE OF {columns} ON {table} {bump}")
+
+def _price_cents(price):
+    """'45,50' / '45.5' / 45.5 → 4550 (grosze). Nieczytelna cena → 0."""
+    try:
+        return int(round(float(str(price).replace(',', '.').replace(' ', '')) * 100))
+    except (ValueError, TypeError):
+        return 0
+
+# Kompaktowy schemat ofert: item_data (vinted_id INTEGER = rowid, ceny w groszach,
+# marka/waluta jako id z tabel słownikowych) + widok `items` o dawnym kształcie
+# dla panelu i archiwum. seen_items to dedup po samym id (zastępuje archived_items).
+_ITEMS_VIEW = """CREATE VIEW IF NOT EXISTS items AS
+    SELECT d.vinted_id AS id, CAST(d.vinted_id AS TEXT) AS vinted_id, d.title, b.name AS brand,
+        printf('%.2f', d.price_cents / 100.0) AS price, cur.code AS currency, d.size, d.status,
+        d.photo_url, d.item_url, d.query_id, d.timestamp, d.is_hidden,
+        CAST(d.user_id AS TEXT) AS user_id, d.username,
+        datetime(d.created_at, 'unixepoch') AS created_at
+    FROM item_data d
+    LEFT JOIN brands b ON b.id = d.brand_id
+    LEFT JOIN currencies cur ON cur.id = d.currency_id"""
+
+def _m7_compact_items(c):
+    c.connection.create_function("price_cents", 1, _price_cents, deterministic=True)
+    c.execute("""CREATE TABLE IF NOT EXISTS currencies (
+        id INTEGER PRIMARY KEY,
+        code TEXT UNIQUE NOT NULL
+    )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS brands (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS item_data (
+        vinted_id INTEGER PRIMARY KEY,
+        query_id INTEGER,
+        timestamp INTEGER,
+        price_cents INTEGER NOT NULL DEFAULT 0,
+        currency_id INTEGER REFERENCES currencies(id),
+        brand_id INTEGER REFERENCES brands(id),
+        user_id INTEGER,
+        is_hidden INTEGER NOT NULL DEFAULT 0,
+        title TEXT,
+        size TEXT,
+        status TEXT,
+        photo_url TEXT,
+        item_url TEXT,
+        username TEXT,
+        created_at INTEGER
+    )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS seen_items (
+        vinted_id INTEGER PRIMARY KEY,
+        seen_at INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+    c.execute("""INSERT OR IGNORE INTO currencies (code)
+        SELECT DISTINCT currency FROM items WHERE currency IS NOT NULL AND currency != ''""")
+    c.execute("""INSERT OR IGNORE INTO brands (name)
+        SELECT DISTINCT brand FROM items WHERE brand IS NOT NULL AND brand != ''""")
+    c.execute("""INSERT OR IGNORE INTO item_data
+        (vinted_id, query_id, timestamp, price_cents, currency_id, brand_id, user_id, is_hidden,
+         title, size, status, photo_url, item_url, username, created_at)
+        SELECT CAST(i.vinted_id AS INTEGER), i.query_id, i.timestamp, price_cents(i.price),
+            cur.id, b.id, CAST(i.user_id AS INTEGER), COALESCE(i.is_hidden, 0),
+            i.title, i.size, i.status, i.photo_url, i.item_url, i.username,
+            CAST(strftime('%s', i.created_at) AS INTEGER)
+        FROM items i
+        LEFT JOIN currencies cur ON cur.code = i.currency
+        LEFT JOIN brands b ON b.name = i.brand
+        WHERE i.vinted_id GLOB '[0-9]*'""")
+    c.execute("""INSERT OR IGNORE INTO seen_items (vinted_id, seen_at)
+        SELECT vinted_id, COALESCE(created_at, timestamp, CAST(strftime('%s', 'now') AS INTEGER)) FROM item_data""")
+    c.execute("""INSERT OR IGNORE INTO seen_items (vinted_id, seen_at)
+        SELECT CAST(vinted_id AS INTEGER), archived_at FROM archived_items WHERE vinted_id GLOB '[0-9]*'""")
+    c.execute("DROP TABLE items")
+    c.execute("DROP TABLE archived_items")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_item_data_timestamp ON item_data(timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_item_data_query_ts ON item_data(query_id, timestamp)")
+    c.execute(_ITEMS_VIEW)
+
+# Pełnotekstowe wyszukiwanie ofert (panel /items). Tabela bezzawartościowa (content=''):
+# rowid = vinted_id, teksty żyją tylko w item_data — usunięcie wymaga komendy 'delete'
+# z oryginalnymi wartościami, stąd triggery.
+_ITEM_SEARCH_COLUMNS = "d.title, (SELECT name FROM brands WHERE id = d.brand_id), d.username"
+
+def _m8_item_search(c):
+    c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(
+        title, brand, username,
+        content = '', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""")
+    c.execute(f"""INSERT INTO item_search (rowid, title, brand, username)
+        SELECT d.vinted_id, {_ITEM_SEARCH_COLUMNS} FROM item_data d""")
+    insert = (f"INSERT INTO item_search (rowid, title, brand, username) "
+              f"SELECT d.vinted_id, {_ITEM_SEARCH_COLUMNS} FROM item_data d WHERE d.vinted_id = new.vinted_id;")
+    delete = ("INSERT INTO item_search (item_search, rowid, title, brand, username) VALUES ('delete', "
+              "old.vinted_id, old.title, (SELECT name FROM brands WHERE id = old.brand_id), old.username);")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_item_search_ins AFTER INSERT ON item_data BEGIN {insert} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_item_search_del AFTER DELETE ON item_data BEGIN {delete} END")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_item_search_upd AFTER UPDATE OF title, brand_id, username
+        ON item_data BEGIN {delete} {insert} END""")
+
+def _m10_alert_priority(c):
+    if not _column_exists(c, "queries", "priority"):
+        c.execute("ALTER TABLE queries ADD COLUMN priority INTEGER NOT NULL DEFAULT 3")
+    # zmiana priorytetu też unieważnia snapshot zapytań
+    c.execute("DROP TRIGGER IF EXISTS trg_queries_upd")
+    c.execute(f"""CREATE TRIGGER trg_queries_upd AFTER UPDATE OF {_SETTINGS_TRIGGERS["queries"]}, priority
+        ON queries BEGIN UPDATE settings_version SET version = version + 1 WHERE id = 1; END""")
+    if not _column_exists(c, "outbox", "due_at"):
+        c.execute("ALTER TABLE outbox ADD COLUMN due_at REAL NOT NULL DEFAULT 0")
+        c.execute("ALTER TABLE outbox ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+        c.execute("UPDATE outbox SET due_at = created_at")
+    c.execute("DROP INDEX IF EXISTS idx_outbox_state")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(state, due_at)")
+
+def _m11_filter_rules(c):
+    if not _column_exists(c, "queries", "filter_rules"):
+        c.execute("ALTER TABLE queries ADD COLUMN filter_rules TEXT NOT NULL DEFAULT ''")
+    # reguły filtrów są w snapshocie zapytań — ich zmiana też go unieważnia
+    c.execute("DROP TRIGGER IF EXISTS trg_queries_upd")
+    c.execute(f"""CREATE TRIGGER trg_queries_upd AFTER UPDATE OF {_SETTINGS_TRIGGERS["queries"]}, priority,
+        filter_rules ON queries BEGIN UPDATE settings_version SET version = version + 1 WHERE id = 1; END""")
+
+# Stan ogłoszenia z ponownych sprawdzeń (src/recheck.py): active / hidden / sold / deleted
+_ITEMS_VIEW_V12 = """CREATE VIEW IF NOT EXISTS items AS
+    SELECT d.vinted_id AS id, CAST(d.vinted_id AS TEXT) AS vinted_id, d.title, b.name AS brand,
+        printf('%.2f', d.price_cents / 100.0) AS price, cur.code AS currency, d.size, d.status,
+        d.photo_url, d.item_url, d.query_id, d.timestamp, d.is_hidden, d.listing_state,
+        CAST(d.user_id AS TEXT) AS user_id, d.username,
+        datetime(d.created_at, 'unixepoch') AS created_at
+    FROM item_data d
+    LEFT JOIN brands b ON b.id = d.brand_id
+    LEFT JOIN currencies cur ON cur.id = d.currency_id"""
+
+def _m12_listing_state(c):
+    if not _column_exists(c, "item_data", "listing_state"):
+        c.execute("ALTER TABLE item_data ADD COLUMN listing_state TEXT NOT NULL DEFAULT 'active'")
+        c.execute("ALTER TABLE item_data ADD COLUMN rechecked_at INTEGER NOT NULL DEFAULT 0")
+    c.execute("DROP VIEW IF EXISTS items")
+    c.execute(_ITEMS_VIEW_V12)
+
+_MIGRATIONS = [
+    (1, "items.user_id + items.username", _m1_item_user_columns),
+    (2, "Indeksy hot-path (scraper + panel)", [
+        # Covering: get_all_queries i licznik URL-i na liście zapytań
+        "CREATE INDEX IF NOT EXISTS idx_query_urls_query ON query_urls(query_id, url, last_item_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_queries_active ON queries(active, id)",
+        "CREATE INDEX IF NOT EXISTS idx_items_timestamp ON items(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_items_query_ts ON items(query_id, timestamp)",
+        # Covering: przycinanie logów w add_log (ORDER BY timestamp → id)
+        "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_level_ts ON logs(level, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_active_updated ON price_tracking(active, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tracked_sellers_active ON tracked_sellers(active, id)",
+    ]),
+    (3, "settings_version + triggery zmian zapytań/konfiguracji", _m3_settings_version),
+    (4, "price_history (surowe zmiany) + price_history_daily (min/max dzienne)", [
+        """CREATE TABLE IF NOT EXISTS price_history (
+            track_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            price_cents INTEGER NOT NULL,
+            PRIMARY KEY (track_id, ts)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS price_history_daily (
+            track_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            min_cents INTEGER NOT NULL,
+            max_cents INTEGER NOT NULL,
+            PRIMARY KEY (track_id, day)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_brand ON price_tracking(brand)",
+    ]),
+    (5, "archived_items (dedup po archiwizacji) + indeks retencji price_tracking", [
+        """CREATE TABLE IF NOT EXISTS archived_items (
+            vinted_id TEXT PRIMARY KEY,
+            archived_at INTEGER NOT NULL
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_updated ON price_tracking(updated_at)",
+    ]),
+    (6, "Podział bazy: logs → vinted_logs.db, ceny → vinted_analytics.db", [
+        "DROP TABLE IF EXISTS logs",
+        "DROP TABLE IF EXISTS price_history",
+        "DROP TABLE IF EXISTS price_history_daily",
+        "DROP TABLE IF EXISTS price_tracking",
+    ]),
+    (7, "Kompaktowy schemat: item_data + seen_items + brands/currencies, widok items", _m7_compact_items),
+    (8, "FTS5 item_search (tytuł, marka, sprzedawca) + triggery", _m8_item_search),
+    (9, "outbox — trwała kolejka alertów (src/outbox.py)", [
+        """CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY,
+            vinted_id INTEGER NOT NULL,
+            query_id INTEGER NOT NULL,
+            entry TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            last_error TEXT
+        )""",
+        # jeden wpis na (oferta, zapytanie) — ponowne znalezienie po restarcie nie dubluje alertu
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_item_query ON outbox(vinted_id, query_id)",
+        "CREATE INDEX IF NOT EXISTS idx_outbox_state ON outbox(state, next_attempt_at)",
+    ]),
+    (10, "Priorytet alertów: queries.priority + outbox.due_at (EDF)", _m10_alert_priority),
+    (11, "Lokalne reguły filtrów: queries.filter_rules (src/filters.py)", _m11_filter_rules),
+    (12, "Stan ogłoszeń: item_data.listing_state + rechecked_at (src/recheck.py)", _m12_listing_state),
+]
+
+_LOG_MIGRATIONS = [
+    (1, "logs + indeksy", [
+        """CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            level TEXT,
+            source TEXT,
+            message TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # Covering: przycinanie logów w add_log (ORDER BY timestamp → id)
+        "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_level_ts ON logs(level, timestamp)",
+    ]),
+]
+
+# Stary układ price_tracking (ceny TEXT) → kolumny w groszach; też dla _move_legacy_tables
+_PRICE_TRACKING_FROM_TEXT = """SELECT id, item_hash, CAST(vinted_id AS INTEGER), title, brand, size,
+        price_cents(first_price), price_cents(last_price), price_cents(lowest_price),
+        currency, item_url, photo_url, CAST(user_id AS INTEGER), username,
+        price_drops, last_check, active, created_at, updated_at
+    FROM {source}"""
+
+def _m2_price_tracking_cents(c):
+    """price_tracking z cenami w groszach (INTEGER) i liczbowymi id — przebudowa z zachowaniem id tracków."""
+    c.connection.create_function("price_cents", 1, _price_cents, deterministic=True)
+    c.execute("""CREATE TABLE price_tracking_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_hash TEXT UNIQUE NOT NULL,
+        vinted_id INTEGER,
+        title TEXT,
+        brand TEXT,
+        size TEXT,
+        first_price_cents INTEGER NOT NULL DEFAULT 0,
+        last_price_cents INTEGER NOT NULL DEFAULT 0,
+        lowest_price_cents INTEGER NOT NULL DEFAULT 0,
+        currency TEXT,
+        item_url TEXT,
+        photo_url TEXT,
+        user_id INTEGER,
+        username TEXT,
+        price_drops INTEGER DEFAULT 0,
+        last_check INTEGER DEFAULT 0,
+        active INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    c.execute("INSERT INTO price_tracking_new " + _PRICE_TRACKING_FROM_TEXT.format(source="price_tracking"))
+    c.execute("DROP TABLE price_tracking")
+    c.execute("ALTER TABLE price_tracking_new RENAME TO price_tracking")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_price_tracking_active_updated ON price_tracking(active, updated_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_price_tracking_brand ON price_tracking(brand)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_price_tracking_updated ON price_tracking(updated_at)")
+
+_ANALYTICS_MIGRATIONS = [
+    (1, "price_tracking + price_history + price_history_daily", [
+        """CREATE TABLE IF NOT EXISTS price_tracking (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             item_hash TEXT UNIQUE NOT NULL,
             vinted_id TEXT,
@@ -97,61 +521,234 @@ def init_db():
             active INTEGER DEFAULT 1,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )""")
-        
-        c.execute("""CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            level TEXT,
-            source TEXT,
-            message TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )""")
-        
-        c.execute("""CREATE TABLE IF NOT EXISTS config (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )""")
-        
-        try:
-            c.execute("ALTER TABLE items ADD COLUMN user_id TEXT")
-        except: pass
-        try:
-            c.execute("ALTER TABLE items ADD COLUMN username TEXT")
-        except: pass
-        
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_active_updated ON price_tracking(active, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_brand ON price_tracking(brand)",
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_updated ON price_tracking(updated_at)",
+        # price_history: każda zmiana ceny; price_history_daily: min/max po zwinięciu (day = ts // 86400)
+        """CREATE TABLE IF NOT EXISTS price_history (
+            track_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            price_cents INTEGER NOT NULL,
+            PRIMARY KEY (track_id, ts)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS price_history_daily (
+            track_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            min_cents INTEGER NOT NULL,
+            max_cents INTEGER NOT NULL,
+            PRIMARY KEY (track_id, day)
+        ) WITHOUT ROWID""",
+    ]),
+    (2, "price_tracking: ceny w groszach (INTEGER)", _m2_price_tracking_cents),
+    (3, "price_tracking: indeks po vinted_id (dezaktywacja sprzedanych)", [
+        "CREATE INDEX IF NOT EXISTS idx_price_tracking_vid ON price_tracking(vinted_id)",
+    ]),
+]
+
+# Tabele przenoszone z bazy hot przy pierwszym starcie po podziale: alias → (plik, tabele)
+_SPLIT_TABLES = {
+    "logdb": (lambda: LOG_DB_PATH, ["logs"]),
+    "analytics": (lambda: ANALYTICS_DB_PATH, ["price_tracking", "price_history", "price_history_daily"]),
+}
+
+# Tabele układu jednoplikowego, na których operują migracje 2–5 bazy hot. Nowa baza dostaje
+# je puste, żeby przejść tę samą ścieżkę co istniejące instalacje — migracja 6 je usuwa.
+_LEGACY_HOT_TABLES = [
+    """CREATE TABLE IF NOT EXISTS price_tracking (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_hash TEXT UNIQUE NOT NULL,
+        vinted_id TEXT,
+        title TEXT,
+        brand TEXT,
+        size TEXT,
+        first_price TEXT,
+        last_price TEXT,
+        lowest_price TEXT,
+        currency TEXT,
+        item_url TEXT,
+        photo_url TEXT,
+        user_id TEXT,
+        username TEXT,
+        price_drops INTEGER DEFAULT 0,
+        last_check INTEGER DEFAULT 0,
+        active INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        level TEXT,
+        source TEXT,
+        message TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+def _create_legacy_tables(conn):
+    """Przed migracją 6 (podział bazy) — puste tabele dla migracji 2–5."""
+    _create_schema_version(conn)
+    if _schema_version(conn) < 6:
+        for sql in _LEGACY_HOT_TABLES:
+            conn.execute(sql)
+    conn.commit()
+
+def _move_legacy_tables(conn):
+    """Kopiuje dane ze starego, jednoplikowego układu (idempotentne — INSERT OR IGNORE po PK)."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for alias, (path, tables) in _SPLIT_TABLES.items():
+        legacy = [t for t in tables if t in existing]
+        if not legacy:
+            continue
+        conn.execute("ATTACH DATABASE ? AS " + alias, (path(),))
+        conn.create_function("price_cents", 1, _price_cents, deterministic=True)
         try:
-            c.execute("DELETE FROM logs WHERE timestamp < datetime('now', '-7 days')")
+            for table in legacy:
+                select = (_PRICE_TRACKING_FROM_TEXT.format(source="main.price_tracking")
+                          if table == "price_tracking" else f"SELECT * FROM main.{table}")
+                moved = conn.execute(f"INSERT OR IGNORE INTO {alias}.{table} {select}").rowcount
+                logger.info(f"Podział bazy: {table} → {os.path.basename(path())} ({moved} wierszy)")
             conn.commit()
-            logger.info("✅ Wyczyszczono stare logi")
-        except Exception as e:
-            logger.warning(f"Czyszczenie logów nieudane: {e}")
-        
+        finally:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+def _apply_migrations(conn, migrations, name):
+    applied = _run_migrations(conn, migrations)
+    if applied:
+        conn.execute("ANALYZE")
         conn.commit()
-        conn.close()
-        logger.info("✅ Baza danych zainicjalizowana (v4.1)")
+        logger.info(f"✅ Migracje [{name}]: {applied} (wersja {_schema_version(conn)})")
+
+def _schema_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def _create_schema_version(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.commit()
+
+def _run_migrations(conn, migrations):
+    """Stosuje brakujące migracje, każdą w osobnej transakcji. Zwraca liczbę zastosowanych."""
+    _create_schema_version(conn)
+    current = _schema_version(conn)
+    applied = 0
+    for version, description, step in migrations:
+        if version <= current:
+            continue
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN")
+            if callable(step):
+                step(c)
+            else:
+                for sql in step:
+                    c.execute(sql)
+            c.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Migracja {version} ({description}) nieudana")
+            raise
+        logger.info(f"Migracja {version}: {description}")
+        applied += 1
+    return applied
+
+# Zapytania z gorącej ścieżki → (baza, SQL, parametry, indeks, którego muszą używać).
+# check_query_plans() wyłapuje regresje (np. po zmianie schematu) przez EXPLAIN QUERY PLAN.
+_HOT_QUERY_PLANS = [
+    ("hot", "SELECT url, last_item_ts FROM query_urls WHERE query_id = ?", (1,), "idx_query_urls_query"),
+    ("hot", "SELECT COUNT(*) FROM query_urls WHERE query_id = ?", (1,), "idx_query_urls_query"),
+    ("hot", "SELECT * FROM queries WHERE active = 1 ORDER BY id", (), "idx_queries_active"),
+    ("hot", "SELECT 1 FROM seen_items WHERE vinted_id = ?", (1,), "PRIMARY KEY"),
+    ("hot", "SELECT vinted_id FROM seen_items WHERE vinted_id IN (?, ?, ?)", (1, 2, 3), "PRIMARY KEY"),
+    ("hot", "SELECT * FROM items ORDER BY timestamp DESC LIMIT ?", (100,), "idx_item_data_timestamp"),
+    ("hot", "SELECT * FROM items WHERE query_id = ? ORDER BY timestamp DESC LIMIT ?", (1, 100), "idx_item_data_query_ts"),
+    ("hot", "SELECT * FROM tracked_sellers WHERE active = 1 ORDER BY id", (), "idx_tracked_sellers_active"),
+    ("hot", "SELECT * FROM items WHERE timestamp <= ? AND (timestamp < ? OR id < ?) "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?", (1, 1, 1, 100), "idx_item_data_timestamp"),
+    ("hot", "SELECT * FROM items WHERE query_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?", (1, 100),
+     "idx_item_data_query_ts"),
+    ("hot", "SELECT rowid FROM item_search WHERE item_search MATCH ?", ('"x"*',), "VIRTUAL TABLE INDEX"),
+    ("hot", "SELECT id, entry, due_at FROM outbox WHERE state = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY due_at LIMIT ?", (0, 100), "idx_outbox_due"),
+    ("hot", "SELECT vinted_id, query_id, timestamp, price_cents, user_id, item_url, listing_state FROM item_data "
+            "WHERE timestamp >= ? AND listing_state IN ('active', 'hidden') ORDER BY timestamp DESC LIMIT ?",
+     (0, 5000), "idx_item_data_timestamp"),
+    ("logs", "SELECT * FROM logs ORDER BY timestamp DESC LIMIT ?", (100,), "idx_logs_timestamp"),
+    ("logs", "SELECT id FROM logs ORDER BY timestamp DESC LIMIT -1 OFFSET 1000", (), "idx_logs_timestamp"),
+    ("logs", "SELECT * FROM logs WHERE level = ? ORDER BY timestamp DESC LIMIT ?", ("ERROR", 100), "idx_logs_level_ts"),
+    ("logs", "SELECT * FROM logs WHERE id < ? ORDER BY id DESC LIMIT ?", (1000, 100), "INTEGER PRIMARY KEY"),
+    ("analytics", "SELECT * FROM price_tracking WHERE active = 1 ORDER BY updated_at DESC LIMIT 100", (),
+     "idx_price_tracking_active_updated"),
+    ("analytics", "SELECT * FROM price_tracking WHERE item_hash = ? AND active = 1", ("x",),
+     "sqlite_autoindex_price_tracking_1"),
+    ("analytics", "UPDATE price_tracking SET active = 0 WHERE vinted_id = ?", (1,), "idx_price_tracking_vid"),
+]
+
+def _schema_clone(conn):
+    """Pusta kopia schematu w pamięci — plany nie zależą od sqlite_stat1 ani rozmiaru tabel."""
+    clone = sqlite3.connect(":memory:")
+    # tabele-cienie FTS5 (item_search_data…) tworzy samo CREATE VIRTUAL TABLE
+    shadow = {row[1] for row in conn.execute("PRAGMA main.table_list") if row[2] == "shadow"}
+    for name, sql in conn.execute("""SELECT name, sql FROM sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY type = 'table' DESC"""):
+        if name not in shadow:
+            clone.execute(sql)
+    return clone
+
+def check_query_plans():
+    """Zwraca listę zapytań, które nie używają oczekiwanego indeksu (pusta = OK)."""
+    problems = []
+    clones = {}
+    for name, (connect, _) in _DATABASES.items():
+        conn = connect()
+        try:
+            clones[name] = _schema_clone(conn)
+        finally:
+            conn.close()
+    try:
+        for name, sql, params, index in _HOT_QUERY_PLANS:
+            plan = " | ".join(row[3] for row in clones[name].execute(f"EXPLAIN QUERY PLAN {sql}", params))
+            if index not in plan or "TEMP B-TREE" in plan:
+                problems.append(f"[{name}] {sql[:60]}… → {plan}")
+    finally:
+        for clone in clones.values():
+            clone.close()
+    return problems
+
+def _load_queries(conn, active_only=False):
+    """Zapytania + ich URL-e jednym LEFT JOIN-em (zamiast N+1 SELECT-ów)."""
+    where = "WHERE q.active = 1" if active_only else ""
+    rows = conn.execute(f"""SELECT q.*, u.url AS u_url, u.last_item_ts AS u_last_item_ts
+        FROM queries q LEFT JOIN query_urls u ON u.query_id = q.id
+        {where} ORDER BY q.id, u.id""").fetchall()
+    queries = []
+    for row in rows:
+        if not queries or queries[-1]["id"] != row["id"]:
+            query = {k: row[k] for k in row.keys() if not k.startswith("u_")}
+            query["urls"] = []
+            queries.append(query)
+        if row["u_url"] is not None:
+            queries[-1]["urls"].append({"url": row["u_url"], "last_item_ts": row["u_last_item_ts"]})
+    return queries
 
 def get_all_queries(active_only=False):
     conn = get_connection()
-    c = conn.cursor()
-    if active_only:
-        c.execute("SELECT * FROM queries WHERE active = 1 ORDER BY id")
-    else:
-        c.execute("SELECT * FROM queries ORDER BY id")
-    queries = []
-    for row in c.fetchall():
-        query = dict(row)
-        c.execute("SELECT url, last_item_ts FROM query_urls WHERE query_id = ?", (query['id'],))
-        query['urls'] = [{'url': r['url'], 'last_item_ts': r['last_item_ts']} for r in c.fetchall()]
-        queries.append(query)
+    queries = _load_queries(conn, active_only)
     conn.close()
     return queries
 
-def add_query(name, webhook_url, channel_id, embed_color, urls, active=1):
+def add_query(name, webhook_url, channel_id, embed_color, urls, active=1, priority=3, filter_rules=""):
     with _lock:
         conn = get_connection()
         c = conn.cursor()
-        c.execute("""INSERT INTO queries (name, discord_webhook_url, discord_channel_id, embed_color, active)
-            VALUES (?, ?, ?, ?, ?)""", (name, webhook_url, channel_id, embed_color, active))
+        c.execute("""INSERT INTO queries (name, discord_webhook_url, discord_channel_id, embed_color, active, priority,
+            filter_rules) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (name, webhook_url, channel_id, embed_color, active, priority, filter_rules))
         query_id = c.lastrowid
         for url in urls:
             c.execute("INSERT INTO query_urls (query_id, url) VALUES (?, ?)", (query_id, url.strip()))
@@ -159,12 +756,13 @@ def add_query(name, webhook_url, channel_id, embed_color, urls, active=1):
         conn.close()
         return query_id
 
-def update_query(query_id, name, webhook_url, channel_id, embed_color, urls, active):
+def update_query(query_id, name, webhook_url, channel_id, embed_color, urls, active, priority=3, filter_rules=""):
     with _lock:
         conn = get_connection()
         c = conn.cursor()
         c.execute("""UPDATE queries SET name=?, discord_webhook_url=?, discord_channel_id=?, 
-            embed_color=?, active=? WHERE id=?""", (name, webhook_url, channel_id, embed_color, active, query_id))
+            embed_color=?, active=?, priority=?, filter_rules=? WHERE id=?""",
+            (name, webhook_url, channel_id, embed_color, active, priority, filter_rules, query_id))
         c.execute("DELETE FROM query_urls WHERE query_id = ?", (query_id,))
         for url in urls:
             if url.strip():
@@ -197,6 +795,14 @@ def update_query_last_ts(query_id, timestamp):
         c.execute("UPDATE query_urls SET last_item_ts = ? WHERE query_id = ?", (timestamp, query_id))
         conn.commit()
         conn.close()
+    # Watermark nie podbija settings_version — aktualizujemy snapshot w miejscu, pod tym samym
+    # lockiem co przeładowanie (inaczej zapis z wątku skanu trafi w strukturę właśnie podmienianą)
+    with _snapshot_lock:
+        for query in _snapshot["queries"]:
+            if query["id"] == query_id:
+                query["last_item_ts"] = timestamp
+                for url_entry in query["urls"]:
+                    url_entry["last_item_ts"] = timestamp
 
 def increment_query_items_found(query_id):
     with _lock:
@@ -207,28 +813,69 @@ def increment_query_items_found(query_id):
         conn.close()
 
 def item_exists(vinted_id):
+    """Jedno wyszukiwanie po PK w seen_items (obejmuje też oferty przeniesione do data/archive)."""
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT 1 FROM items WHERE vinted_id = ?", (str(vinted_id),))
+    c.execute("SELECT 1 FROM seen_items WHERE vinted_id = ?", (int(vinted_id),))
     exists = c.fetchone() is not None
     conn.close()
     return exists
 
+def existing_items(vinted_ids) -> set:
+    """Które z id są już w seen_items — jedno zapytanie IN (...) na stronę ofert zamiast item_exists per oferta."""
+    ids = [int(v) for v in vinted_ids]
+    if not ids:
+        return set()
+    conn = get_connection()
+    try:
+        found = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            found.update(row[0] for row in conn.execute(
+                f"SELECT vinted_id FROM seen_items WHERE vinted_id IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+    finally:
+        conn.close()
+
+def _intern(c, table, column, value):
+    """Id wartości w tabeli słownikowej (brands / currencies), dodaje brakującą."""
+    if not value:
+        return None
+    c.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (value,))
+    return c.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,)).fetchone()[0]
+
 def add_item(vinted_id, title, brand, price, currency, size, status, photo_url, item_url, query_id, timestamp, user_id=None, username=None):
     with _lock:
         conn = get_connection()
         c = conn.cursor()
         try:
-            c.execute("""INSERT INTO items (vinted_id, title, brand, price, currency, size, status, 
-                photo_url, item_url, query_id, timestamp, user_id, username) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (str(vinted_id), title, brand, price, currency, size, status, photo_url, item_url, query_id, timestamp, user_id, username))
+            now = int(time.time())
+            vid = int(vinted_id)
+            c.execute("""INSERT OR IGNORE INTO item_data (vinted_id, query_id, timestamp, price_cents,
+                currency_id, brand_id, user_id, title, size, status, photo_url, item_url, username, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (vid, query_id, timestamp, _price_cents(price), _intern(c, "currencies", "code", currency),
+                 _intern(c, "brands", "name", brand), int(user_id) if user_id else None,
+                 title, size, status, photo_url, item_url, username, now))
+            c.execute("INSERT OR IGNORE INTO seen_items (vinted_id, seen_at) VALUES (?, ?)", (vid, now))
             conn.commit()
-        except sqlite3.IntegrityError:
-            pass
         finally:
             conn.close()
 
+def get_query_price_medians(sample=200):
+    """Typowa cena (mediana z ostatnich `sample` ofert, w groszach) per zapytanie."""
+    conn = get_connection()
+    try:
+        medians = {}
+        for (query_id,) in conn.execute("SELECT id FROM queries").fetchall():
+            prices = [r[0] for r in conn.execute("""SELECT price_cents FROM item_data
+                WHERE query_id = ? ORDER BY timestamp DESC LIMIT ?""", (query_id, sample)) if r[0] > 0]
+            if prices:
+                medians[query_id] = statistics.median(prices)
+        return medians
+    finally:
+        conn.close()
+
 def get_all_items(limit=100):
     conn = get_connection()
     c = conn.cursor()
@@ -237,6 +884,55 @@ def get_all_items(limit=100):
     conn.close()
     return items
 
+# ── WYSZUKIWANIE I STRONICOWANIE (panel) ───────────────────────────
+# Kursor (keyset) zamiast OFFSET: następna strona zaczyna się za ostatnim
+# (timestamp, id) poprzedniej, więc koszt nie rośnie z numerem strony.
+
+def _fts_query(text):
+    """Tekst z pola wyszukiwania → zapytanie FTS5: każde słowo jako prefiks, wszystkie wymagane."""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", text or ""))
+
+def _parse_cursor(cursor):
+    try:
+        ts, vid = cursor.split(":")
+        return int(ts), int(vid)
+    except (AttributeError, ValueError):
+        return None
+
+def search_items(text="", query_id=None, since=None, cursor=None, limit=100, conn=None):
+    """Oferty od najnowszych (opcjonalnie FTS5). Zwraca (wiersze, kursor następnej strony lub None)."""
+    where, params = [], []
+    match = _fts_query(text)
+    if match:
+        where.append("id IN (SELECT rowid FROM item_search WHERE item_search MATCH ?)")
+        params.append(match)
+    if query_id:
+        where.append("query_id = ?")
+        params.append(query_id)
+    if since:
+        where.append("timestamp >= ?")
+        params.append(since)
+    position = _parse_cursor(cursor)
+    if position:
+        where.append("timestamp <= ? AND (timestamp < ? OR id < ?)")
+        params += [position[0], position[0], position[1]]
+    sql = "SELECT * FROM items"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    own = conn is None
+    if own:
+        conn = get_connection()
+    try:
+        rows = [dict(r) for r in conn.execute(sql, params + [limit + 1])]
+    finally:
+        if own:
+            conn.close()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, f"{rows[-1]['timestamp']}:{rows[-1]['id']}"
+    return rows, None
+
 def get_tracked_sellers(active_only=True):
     conn = get_connection()
     c = conn.cursor()
@@ -290,67 +986,268 @@ def update_seller_last_check(user_id):
         conn.close()
 
 def _generate_item_hash(title, brand, size):
-    import hashlib
     key = f"{title.lower()}|{brand.lower() if brand else ''}|{size.lower() if size else ''}"
     return hashlib.md5(key.encode()).hexdigest()[:16]
 
+# ── INDEKS ŚLEDZENIA CEN (RAM) ─────────────────────────────────────
+# Aktywne tracki trzymane w pamięci; check_price_drop nie dotyka bazy.
+# Tylko rzeczywiste zmiany (nowy track, inna cena, nowe vinted_id) trafiają
+# do _price_pending i są zapisywane paczkami przez wątek w tle.
+_PRICE_FLUSH_INTERVAL = 5.0
+_PRICE_FLUSH_BATCH = 200
+
+class _PriceTrack:
+    """Ceny w groszach (int) — porównania bez parsowania tekstu."""
+    __slots__ = ("vinted_id", "last_price", "lowest_price", "price_drops")
+
+    def __init__(self, vinted_id, last_price, lowest_price, price_drops):
+        self.vinted_id = vinted_id
+        self.last_price = last_price
+        self.lowest_price = lowest_price
+        self.price_drops = price_drops
+
+_price_lock = threading.Lock()
+_price_index = None           # item_hash -> _PriceTrack
+_price_hash_by_vid = {}       # vinted_id (int) -> item_hash (pomija MD5 dla znanych ofert)
+_price_pending = {}           # item_hash -> krotka parametrów UPSERT
+_price_history_pending = []   # (ts, price_cents, item_hash) → price_history
+_price_flush_event = threading.Event()
+_price_flush_thread = None
+
+def _load_price_index():
+    global _price_index, _price_flush_thread
+    conn = get_analytics_connection()
+    rows = conn.execute("""SELECT item_hash, vinted_id, last_price_cents, lowest_price_cents, price_drops
+        FROM price_tracking WHERE active = 1""").fetchall()
+    conn.close()
+    index = {}
+    for row in rows:
+        index[row[0]] = _PriceTrack(row[1], row[2], row[3], row[4] or 0)
+        if row[1]:
+            _price_hash_by_vid[row[1]] = row[0]
+    _price_index = index
+    _price_flush_thread = threading.Thread(target=_price_flush_loop, name="PriceFlush", daemon=True)
+    _price_flush_thread.start()
+    logger.info(f"💰 Indeks cen załadowany: {len(index)} aktywnych tracków")
+
+def _price_flush_loop():
+    while True:
+        _price_flush_event.wait(_PRICE_FLUSH_INTERVAL)
+        _price_flush_event.clear()
+        try:
+            flush_price_tracking()
+        except Exception as e:
+            logger.error(f"Zapis indeksu cen nieudany: {e}")
+
+def flush_price_tracking():
+    """Zapisuje zaległe zmiany cen jedną transakcją. Zwraca liczbę wierszy."""
+    global _price_pending, _price_history_pending
+    with _price_lock:
+        if not _price_pending:
+            return 0
+        pending, _price_pending = _price_pending, {}
+        history, _price_history_pending = _price_history_pending, []
+    with _analytics_lock:
+        conn = get_analytics_connection()
+        try:
+            conn.executemany("""INSERT INTO price_tracking
+                (item_hash, vinted_id, title, brand, size, first_price_cents, last_price_cents, lowest_price_cents,
+                 currency, item_url, photo_url, user_id, username, price_drops, last_check, active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT(item_hash) DO UPDATE SET
+                    vinted_id = excluded.vinted_id, last_price_cents = excluded.last_price_cents,
+                    lowest_price_cents = excluded.lowest_price_cents, price_drops = excluded.price_drops,
+                    item_url = excluded.item_url, photo_url = excluded.photo_url,
+                    last_check = excluded.last_check, active = 1, updated_at = CURRENT_TIMESTAMP""",
+                list(pending.values()))
+            conn.executemany("""INSERT OR REPLACE INTO price_history (track_id, ts, price_cents)
+                SELECT id, ?, ? FROM price_tracking WHERE item_hash = ?""", history)
+            conn.commit()
+        except Exception:
+            with _price_lock:
+                for item_hash, params in pending.items():
+                    _price_pending.setdefault(item_hash, params)
+                _price_history_pending[:0] = history
+            raise
+        finally:
+            conn.close()
+    return len(pending)
+
 def check_price_drop(vinted_id, title, brand, price, currency, size, item_url, photo_url, user_id=None, username=None):
-    item_hash = _generate_item_hash(title, brand, size)
+    """Zwraca (is_new, price_dropped, drop_amount, old_price) — liczone w pamięci, w groszach.
+
+    drop_amount i old_price są zwracane w jednostkach waluty (float) jak dotąd.
+    """
+    if _price_index is None:
+        with _price_lock:
+            if _price_index is None:
+                _load_price_index()
+    vinted_id = int(vinted_id)
+    cents = _price_cents(price)
+    with _price_lock:
+        item_hash = _price_hash_by_vid.get(vinted_id) or _generate_item_hash(title, brand, size)
+        track = _price_index.get(item_hash)
+        if track is None:
+            track = _price_index[item_hash] = _PriceTrack(vinted_id, cents, cents, 0)
+            _price_hash_by_vid[vinted_id] = item_hash
+            result = (True, False, 0, 0)
+            old_cents = None
+        else:
+            old_cents = track.last_price
+            if cents == old_cents and track.vinted_id == vinted_id:
+                return (False, False, 0, old_cents / 100)
+            result = (False, False, 0, old_cents / 100)
+            if 0 < cents < old_cents:
+                track.lowest_price = min(cents, track.lowest_price)
+                track.price_drops += 1
+                result = (False, True, (old_cents - cents) / 100, old_cents / 100)
+            if track.vinted_id != vinted_id:
+                _price_hash_by_vid.pop(track.vinted_id, None)
+                _price_hash_by_vid[vinted_id] = item_hash
+                track.vinted_id = vinted_id
+            track.last_price = cents
+        if cents != old_cents:
+            _price_history_pending.append((int(time.time()), cents, item_hash))
+        queued = _price_pending.get(item_hash)
+        first_cents = queued[5] if queued else cents  # UPSERT i tak nie nadpisuje first_price_cents
+        _price_pending[item_hash] = (
+            item_hash, vinted_id, title, brand, size, first_cents,
+            track.last_price, track.lowest_price, currency, item_url, photo_url,
+            int(user_id) if user_id else None, username, track.price_drops, int(time.time()),
+        )
+        if len(_price_pending) >= _PRICE_FLUSH_BATCH:
+            _price_flush_event.set()
+    return result
+
+def deactivate_price_track(vinted_id):
+    """Oferta sprzedana / usunięta — track przestaje być aktywny (w RAM i w bazie)."""
+    vid = int(vinted_id)
+    if _price_index is not None:
+        with _price_lock:
+            item_hash = _price_hash_by_vid.get(vid)
+        if item_hash:
+            forget_price_tracks([item_hash])
+    with _analytics_lock:
+        conn = get_analytics_connection()
+        try:
+            conn.execute("UPDATE price_tracking SET active = 0, updated_at = CURRENT_TIMESTAMP WHERE vinted_id = ?",
+                         (vid,))
+            conn.commit()
+        finally:
+            conn.close()
+
+def get_discounting_sellers() -> set:
+    """Sprzedawcy (user_id), którzy obniżali już ceny śledzonych ofert."""
+    conn = get_analytics_connection()
+    try:
+        return {row[0] for row in conn.execute("""SELECT DISTINCT user_id FROM price_tracking
+            WHERE active = 1 AND price_drops > 0 AND user_id IS NOT NULL""")}
+    finally:
+        conn.close()
+
+# ── PONOWNE SPRAWDZANIE OFERT (src/recheck.py) ─────────────────────
+
+def get_recheck_candidates(since_ts, limit=5000) -> list:
+    """Wysłane oferty nie starsze niż `since_ts`, wciąż aktywne albo ukryte."""
     conn = get_connection()
-    c = conn.cursor()
-    
     try:
-        price_float = float(price.replace(',', '.').replace(' ', ''))
-    except:
-        price_float = 0
-    
-    c.execute("SELECT * FROM price_tracking WHERE item_hash = ? AND active = 1", (item_hash,))
-    existing = c.fetchone()
-    
-    if not existing:
-        with _lock:
-            c.execute("""INSERT INTO price_tracking 
-                (item_hash, vinted_id, title, brand, size, first_price, last_price, lowest_price, 
-                 currency, item_url, photo_url, user_id, username, last_check, active)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)""",
-                (item_hash, str(vinted_id), title, brand, size, str(price_float), str(price_float), 
-                 str(price_float), currency, item_url, photo_url, str(user_id) if user_id else None, 
-                 username, int(time.time())))
-            conn.commit()
+        return [dict(row) for row in conn.execute("""SELECT vinted_id, query_id, timestamp, price_cents, user_id,
+            item_url, listing_state FROM item_data
+            WHERE timestamp >= ? AND listing_state IN ('active', 'hidden') ORDER BY timestamp DESC LIMIT ?""",
+            (int(since_ts), limit))]
+    finally:
         conn.close()
-        return (True, False, 0, 0)
-    else:
-        old_price = float(existing['last_price'])
-        lowest_price = float(existing['lowest_price'])
-        
-        if price_float > 0 and price_float < old_price:
-            price_drop = old_price - price_float
-            new_lowest = min(price_float, lowest_price)
-            
-            with _lock:
-                c.execute("""UPDATE price_tracking SET 
-                    last_price = ?, lowest_price = ?, price_drops = price_drops + 1, 
-                    last_check = ?, updated_at = CURRENT_TIMESTAMP, vinted_id = ?,
-                    item_url = ?, photo_url = ?
-                    WHERE item_hash = ?""",
-                    (str(price_float), str(new_lowest), int(time.time()), str(vinted_id),
-                     item_url, photo_url, item_hash))
-                conn.commit()
+
+def set_listing_state(vinted_id, state):
+    """Wynik ponownego sprawdzenia; sprzedane / usunięte wypadają też ze śledzenia cen."""
+    with _lock:
+        conn = get_connection()
+        try:
+            conn.execute("""UPDATE item_data SET listing_state = ?, rechecked_at = ?,
+                is_hidden = CASE WHEN ? = 'hidden' THEN 1 ELSE is_hidden END WHERE vinted_id = ?""",
+                (state, int(time.time()), state, int(vinted_id)))
+            conn.commit()
+        finally:
             conn.close()
-            return (False, True, price_drop, old_price)
-        else:
-            with _lock:
-                c.execute("""UPDATE price_tracking SET 
-                    last_price = ?, last_check = ?, updated_at = CURRENT_TIMESTAMP,
-                    vinted_id = ?, item_url = ?, photo_url = ?
-                    WHERE item_hash = ?""",
-                    (str(price_float), int(time.time()), str(vinted_id), item_url, photo_url, item_hash))
-                conn.commit()
+    if state in ("sold", "deleted"):
+        deactivate_price_track(vinted_id)
+
+def forget_price_tracks(item_hashes):
+    """Usuwa tracki z indeksu w RAM (po archiwizacji), żeby flush ich nie przywrócił."""
+    if _price_index is None:
+        return
+    with _price_lock:
+        for item_hash in item_hashes:
+            track = _price_index.pop(item_hash, None)
+            if track is not None:
+                _price_hash_by_vid.pop(track.vinted_id, None)
+            _price_pending.pop(item_hash, None)
+
+# ── HISTORIA CEN ───────────────────────────────────────────────────
+# price_history: każda zmiana ceny (grosze + unix ts) z ostatnich _PRICE_HISTORY_RAW_DAYS dni.
+# Starsze punkty są zwijane do price_history_daily (min/max na dzień, day = ts // 86400).
+_PRICE_HISTORY_RAW_DAYS = 30
+
+def downsample_price_history(keep_days=_PRICE_HISTORY_RAW_DAYS):
+    """Zwija surowe punkty starsze niż keep_days do min/max dziennych. Zwraca liczbę usuniętych."""
+    cutoff = int(time.time()) - keep_days * 86400
+    with _analytics_lock:
+        conn = get_analytics_connection()
+        try:
+            conn.execute("""INSERT INTO price_history_daily (track_id, day, min_cents, max_cents)
+                SELECT track_id, ts / 86400, MIN(price_cents), MAX(price_cents)
+                FROM price_history WHERE ts < ? GROUP BY track_id, ts / 86400
+                ON CONFLICT(track_id, day) DO UPDATE SET
+                    min_cents = MIN(min_cents, excluded.min_cents),
+                    max_cents = MAX(max_cents, excluded.max_cents)""", (cutoff,))
+            deleted = conn.execute("DELETE FROM price_history WHERE ts < ?", (cutoff,)).rowcount
+            conn.commit()
+        finally:
             conn.close()
-            return (False, False, 0, old_price)
+    if deleted:
+        logger.info(f"📉 Historia cen: zwinięto {deleted} punktów starszych niż {keep_days} dni")
+    return deleted
+
+def get_price_history(track_id, since=0, until=None, conn=None):
+    """Punkty (ts, min, max) dla jednego tracka, rosnąco po czasie. Ceny w jednostkach waluty."""
+    until = until or int(time.time())
+    own = conn is None
+    if own:
+        conn = get_analytics_connection()
+    rows = conn.execute("""
+        SELECT day * 86400, min_cents, max_cents FROM price_history_daily
+            WHERE track_id = ? AND day BETWEEN ? AND ?
+        UNION ALL
+        SELECT ts, price_cents, price_cents FROM price_history
+            WHERE track_id = ? AND ts BETWEEN ? AND ?
+        ORDER BY 1""", (track_id, since // 86400, until // 86400, track_id, since, until)).fetchall()
+    if own:
+        conn.close()
+    return [(r[0], r[1] / 100, r[2] / 100) for r in rows]
+
+def get_brand_price_history(brand, since=0, until=None, conn=None):
+    """Dzienne (day_ts, min, max, liczba_przedmiotów) dla marki — przez idx_price_tracking_brand."""
+    until = until or int(time.time())
+    own = conn is None
+    if own:
+        conn = get_analytics_connection()
+    rows = conn.execute("""
+        SELECT day, MIN(lo), MAX(hi), COUNT(DISTINCT track_id) FROM (
+            SELECT d.track_id, d.day AS day, d.min_cents AS lo, d.max_cents AS hi
+                FROM price_tracking t JOIN price_history_daily d ON d.track_id = t.id
+                WHERE t.brand = ? AND d.day BETWEEN ? AND ?
+            UNION ALL
+            SELECT h.track_id, h.ts / 86400, h.price_cents, h.price_cents
+                FROM price_tracking t JOIN price_history h ON h.track_id = t.id
+                WHERE t.brand = ? AND h.ts BETWEEN ? AND ?
+        ) GROUP BY day ORDER BY day""",
+        (brand, since // 86400, until // 86400, brand, since, until)).fetchall()
+    if own:
+        conn.close()
+    return [(r[0] * 86400, r[1] / 100, r[2] / 100, r[3]) for r in rows]
 
 def get_price_tracking_stats():
-    conn = get_connection()
+    conn = get_analytics_connection()
     c = conn.cursor()
     stats = {
         "tracked_items": c.execute("SELECT COUNT(*) FROM price_tracking").fetchone()[0],
@@ -361,22 +1258,79 @@ def get_price_tracking_stats():
     return stats
 
 def add_log(level, source, message):
-    with _lock:
-        conn = get_connection()
+    with _log_lock:
+        conn = get_log_connection()
         c = conn.cursor()
         c.execute("INSERT INTO logs (level, source, message) VALUES (?, ?, ?)", (level, source, message))
-        c.execute("DELETE FROM logs WHERE id IN (SELECT id FROM logs ORDER BY timestamp DESC LIMIT -1 OFFSET 1000)")
         conn.commit()
         conn.close()
 
+def prune_logs(keep=1000):
+    """Przycina logi do `keep` najnowszych (wywoływane przez maintenance, nie przy każdym wpisie)."""
+    with _log_lock:
+        conn = get_log_connection()
+        try:
+            deleted = conn.execute(
+                "DELETE FROM logs WHERE id IN (SELECT id FROM logs ORDER BY timestamp DESC LIMIT -1 OFFSET ?)",
+                (keep,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+    return deleted
+
 def get_all_logs(limit=100):
-    conn = get_connection()
+    conn = get_log_connection()
     c = conn.cursor()
     c.execute("SELECT * FROM logs ORDER BY timestamp DESC LIMIT ?", (limit,))
     logs = [dict(row) for row in c.fetchall()]
     conn.close()
     return logs
 
+def get_logs_page(level=None, text="", before_id=None, limit=100, conn=None):
+    """Logi od najnowszych, kursor = id. Zwraca (wiersze, before_id następnej strony lub None)."""
+    where, params = [], []
+    if level:
+        where.append("level = ?")
+        params.append(level)
+    if text:
+        where.append("message LIKE ? ESCAPE '\\'")
+        params.append("%" + re.sub(r"([%_\\])", r"\\\1", text) + "%")
+    if before_id:
+        where.append("id < ?")
+        params.append(before_id)
+    sql = "SELECT *, timestamp AS created_at FROM logs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    own = conn is None
+    if own:
+        conn = get_log_connection()
+    try:
+        rows = [dict(r) for r in conn.execute(sql, params + [limit + 1])]
+    finally:
+        if own:
+            conn.close()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]["id"]
+    return rows, None
+
+def get_logs_since(since_id, level=None, limit=200, conn=None):
+    """Logi nowsze niż since_id (podgląd na żywo w panelu), od najnowszych."""
+    sql = "SELECT *, timestamp AS created_at FROM logs WHERE id > ?"
+    params = [since_id]
+    if level:
+        sql += " AND level = ?"
+        params.append(level)
+    own = conn is None
+    if own:
+        conn = get_log_connection()
+    try:
+        return [dict(r) for r in conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit])]
+    finally:
+        if own:
+            conn.close()
+
 def enable_db_logging():
     import logging
     from src.logger import DBHandler
@@ -385,39 +1339,71 @@ def enable_db_logging():
     logger_module = logging.getLogger()
     logger_module.addHandler(db_handler)
 
-_config_cache = {}
-_config_cache_time = 0
-_CONFIG_CACHE_TTL = 10
+# ── SNAPSHOT ZAPYTAŃ + KONFIGURACJI ────────────────────────────────
+# Scraper czyta zapytania i config z pamięci. Przeładowanie następuje tylko gdy
+# inne połączenie zmieniło bazę (PRAGMA data_version) ORAZ triggery podbiły
+# settings_version — zapisy items/logs nie powodują przeładowania.
+_SNAPSHOT_CHECK_INTERVAL = 1.0
+_snapshot_lock = threading.Lock()
+_snapshot = {"queries": [], "config": {}, "version": None, "data_version": None, "checked_at": 0.0}
+_watch_conn = None
+
+def _refresh_snapshot(force=False):
+    global _watch_conn
+    if not force and time.monotonic() - _snapshot["checked_at"] < _SNAPSHOT_CHECK_INTERVAL:
+        return
+    with _snapshot_lock:
+        now = time.monotonic()
+        if not force and now - _snapshot["checked_at"] < _SNAPSHOT_CHECK_INTERVAL:
+            return
+        _snapshot["checked_at"] = now
+        try:
+            if _watch_conn is None:
+                _watch_conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+                _watch_conn.row_factory = sqlite3.Row
+            data_version = _watch_conn.execute("PRAGMA data_version").fetchone()[0]
+            if not force and data_version == _snapshot["data_version"]:
+                return
+            _snapshot["data_version"] = data_version
+            version = _watch_conn.execute("SELECT version FROM settings_version WHERE id = 1").fetchone()[0]
+            if not force and version == _snapshot["version"]:
+                return
+            _watch_conn.execute("BEGIN")
+            try:
+                queries = _load_queries(_watch_conn)
+                config = {row["key"]: row["value"] for row in _watch_conn.execute("SELECT key, value FROM config")}
+            finally:
+                _watch_conn.rollback()
+            _snapshot.update(queries=queries, config=config, version=version)
+            logger.debug(f"Snapshot przeładowany (v{version}, {len(queries)} zapytań)")
+        except sqlite3.Error as e:
+            logger.warning(f"Odświeżenie snapshotu nieudane: {e}")
+            _snapshot["data_version"] = None
+            if _watch_conn is not None:
+                _watch_conn.close()
+                _watch_conn = None
+
+def get_queries_snapshot(active_only=True):
+    """Zapytania z pamięci (tylko do odczytu) — bez I/O gdy nic się nie zmieniło."""
+    _refresh_snapshot()
+    queries = _snapshot["queries"]
+    return [q for q in queries if q["active"]] if active_only else queries
 
 def get_config(key, default=""):
-    global _config_cache, _config_cache_time
-    now = time.time()
-    if now - _config_cache_time > _CONFIG_CACHE_TTL:
-        _config_cache = {}
-        _config_cache_time = now
-    if key not in _config_cache:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT value FROM config WHERE key = ?", (key,))
-        row = c.fetchone()
-        conn.close()
-        _config_cache[key] = row[0] if row else default
-    return _config_cache[key]
+    _refresh_snapshot()
+    return _snapshot["config"].get(key, default)
 
 def set_config(key, value):
     with _lock:
-        global _config_cache
         conn = get_connection()
         c = conn.cursor()
         c.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", (key, value))
         conn.commit()
         conn.close()
-        _config_cache.pop(key, None)
+    _snapshot["config"][key] = value
 
 def _invalidate_config_cache():
-    global _config_cache, _config_cache_time
-    _config_cache = {}
-    _config_cache_time = 0
+    _refresh_snapshot(force=True)
 
 def get_stats():
     conn = get_connection()
@@ -425,10 +1411,14 @@ def get_stats():
     stats = {
         "queries": c.execute("SELECT COUNT(*) FROM queries").fetchone()[0],
         "active_queries": c.execute("SELECT COUNT(*) FROM queries WHERE active = 1").fetchone()[0],
-        "items": c.execute("SELECT COUNT(*) FROM items").fetchone()[0],
-        "logs": c.execute("SELECT COUNT(*) FROM logs").fetchone()[0],
+        "items": c.execute("SELECT COUNT(*) FROM item_data").fetchone()[0],
         "tracked_sellers": c.execute("SELECT COUNT(*) FROM tracked_sellers WHERE active = 1").fetchone()[0],
-        "price_tracks": c.execute("SELECT COUNT(*) FROM price_tracking WHERE active = 1").fetchone()[0],
     }
     conn.close()
+    conn = get_log_connection()
+    stats["logs"] = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    conn.close()
+    conn = get_analytics_connection()
+    stats["price_tracks"] = conn.execute("SELECT COUNT(*) FROM price_tracking WHERE active = 1").fetchone()[0]
+    conn.close()
     return stats
@@ -1,15 +1,17 @@
 """
 discord_bot.py - Discord Bot z prawdziwymi przyciskami Link Button.
+WERSJA: 4.2 - Ruch przez wspólny klient src/discord_http (bez własnej sesji)
+              + baza API z DISCORD_API_BASE (src/config.py)
 """
-import time
-import requests
 from datetime import datetime, timezone
 from typing import Optional
+from src import discord_http
+from src.config import DISCORD_API_BASE
 from src.logger import get_logger
 
 logger = get_logger("discord_bot")
 
-DISCORD_API = "https://discord.com/api/v10"
+DISCORD_API = DISCORD_API_BASE
 
 
 class DiscordBot:
@@ -17,13 +19,7 @@ class DiscordBot:
     def __init__(self, token: Optional[str] = None):
         self.token    = token
         self.enabled  = bool(token and token.strip())
-        self._session = requests.Session()
         if self.enabled:
-            self._session.headers.update({
-                "Authorization": f"Bot {self.token}",
-                "Content-Type":  "application/json",
-                "User-Agent":    "DiscordBot (VintedNotification, 3.0)",
-            })
             logger.info("Discord Bot API aktywny")
         else:
             logger.info("Discord Bot API wyłączony — używam webhooków")
@@ -43,6 +39,13 @@ class DiscordBot:
             return False
 
     def _send_via_bot(self, item, channel_id: str, query_name: str, embed_color: int) -> bool:
+        return self._post_message(channel_id, self.build_item_payload(item, embed_color))
+
+    @staticmethod
+    def messages_url(channel_id: str) -> str:
+        return f"{DISCORD_API}/channels/{channel_id}/messages"
+
+    def build_item_payload(self, item, embed_color: int) -> dict:
 
         # ── Ocena ────────────────────────────────────────
         if item.feedback_count > 0:
@@ -104,59 +107,31 @@ class DiscordBot:
             ],
         }]
 
-        return self._post_message(channel_id, {"embeds": embeds, "components": components})
+        return {"embeds": embeds, "components": components}
+
+    @staticmethod
+    def build_packed_payload(items: list, embeds: list) -> dict:
+        """Wiadomość zbiorcza: zwarte embedy + przycisk „Kup” dla każdej oferty (5 w rzędzie)."""
+        buttons = [{"type": 2, "style": 5, "label": f"🛒 {n}", "url": item.buy_url}
+                   for n, item in enumerate(items, 1)]
+        components = [{"type": 1, "components": buttons[i:i + 5]} for i in range(0, len(buttons), 5)]
+        return {"embeds": embeds, "components": components}
 
     def _post_message(self, channel_id: str, payload: dict, retries: int = 3) -> bool:
-        url = f"{DISCORD_API}/channels/{channel_id}/messages"
-
-        for attempt in range(1, retries + 1):
-            try:
-                resp = self._session.post(url, json=payload, timeout=15)
-
-                if resp.status_code == 200:
-                    return True
-                if resp.status_code == 429:
-                    wait = float(resp.headers.get("Retry-After", 5))
-                    logger.warning(f"Discord rate limit — czekam {wait:.1f}s")
-                    time.sleep(wait + 0.5)
-                    continue
-                if resp.status_code == 401:
-                    logger.error("Discord Bot: nieprawidłowy token!")
-                    return False
-                if resp.status_code == 403:
-                    logger.error(f"Discord Bot: brak uprawnień do kanału {channel_id}.")
-                    return False
-                if resp.status_code == 404:
-                    logger.error(f"Discord Bot: kanał {channel_id} nie istnieje")
-                    return False
-
-                logger.warning(f"Discord Bot: HTTP {resp.status_code} (próba {attempt}): {resp.text[:200]}")
-
-            except requests.exceptions.Timeout:
-                logger.warning(f"Discord Bot: timeout (próba {attempt})")
-            except Exception as e:
-                logger.error(f"Discord Bot: błąd {e}")
-                return False
-
-            if attempt < retries:
-                time.sleep(2 ** attempt)
-
-        return False
+        resp = discord_http.request_sync("POST", self.messages_url(channel_id), payload,
+                                         bot_token=self.token, retries=retries)
+        return resp is not None
 
     def validate_token(self) -> bool:
         if not self.enabled:
             return False
-        try:
-            r = self._session.get(f"{DISCORD_API}/users/@me", timeout=10)
-            if r.status_code == 200:
-                data = r.json()
-                logger.info(f"Discord Bot zalogowany jako: {data.get('username')}#{data.get('discriminator', '0')}")
-                return True
-            logger.error(f"Discord Bot: walidacja tokena nieudana ({r.status_code})")
-            return False
-        except Exception as e:
-            logger.error(f"Discord Bot: błąd walidacji {e}")
+        resp = discord_http.request_sync("GET", f"{DISCORD_API}/users/@me", bot_token=self.token, retries=1)
+        if resp is None:
+            logger.error("Discord Bot: walidacja tokena nieudana")
             return False
+        data = resp.json()
+        logger.info(f"Discord Bot zalogowany jako: {data.get('username')}#{data.get('discriminator', '0')}")
+        return True
 
 
 _bot_instance: Optional[DiscordBot] = None
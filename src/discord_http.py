@@ -0,0 +1,194 @@
+"""
+discord_http.py - Jeden asynchroniczny klient HTTP dla całego ruchu do Discorda.
+WERSJA: 4.2 - httpx.AsyncClient (keep-alive, HTTP/2 z pakietem h2), fallback requests
+
+Webhooki, wiadomości bota i edycje idą przez `request()`: JSON serializowany
+raz (ponowienia wysyłają te same bajty), czekanie na rate limit i przerwy
+między próbami to `asyncio.sleep`, więc jeden proces trzyma w locie dziesiątki
+POST-ów bez blokowania wątków. Bez httpx (`pip install httpx[http2]`) żądania
+idą przez requests.Session w wątkach — wolniej, ale z tym samym API.
+
+Kod synchroniczny (wątki scrapera, panel, skrypty) używa `request_sync()`:
+gdy pętla głównego klienta działa, żądanie jest do niej przekazywane; w
+przeciwnym razie wykonuje się na krótkotrwałym kliencie.
+
+Adresy discord.com są przepisywane na DISCORD_API_BASE (src/config.py) tuż
+przed wysyłką — kluczem tras i bucketów zostaje oryginalny URL.
+"""
+import asyncio
+import json
+from src.config import discord_api_url
+from src.discord_ratelimit import discord_limits
+from src.logger import get_logger
+logger = get_logger("discord_http")
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 — httpx włącza HTTP/2 tylko z tym pakietem
+    HTTP2 = httpx is not None
+except ImportError:
+    HTTP2 = False
+
+USER_AGENT = "DiscordBot (VintedNotification, 4.2)"
+_TIMEOUT = 10
+# odpowiedzi 429 nie zużywają prób — limitem jest łączny czas czekania na Retry-After
+_MAX_RATE_LIMIT_WAIT = 60.0
+# 429 bez Retry-After (nieznany stan bucketu) — krótka przerwa przed kolejną próbą
+_UNKNOWN_RETRY_AFTER = 1.0
+
+
+def encode_payload(payload) -> bytes:
+    """Zwarty JSON (bez spacji, UTF-8) — liczony raz na wiadomość."""
+    if payload is None or isinstance(payload, bytes):
+        return payload
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class DiscordHTTP:
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        if httpx is not None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                timeout=_TIMEOUT,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120),
+            )
+            self._session = None
+        else:
+            import requests
+            self._client = None
+            self._session = requests.Session()
+            self._session.headers["User-Agent"] = USER_AGENT
+            self._session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=32))
+
+    @property
+    def backend(self) -> str:
+        if self._client is None:
+            return "requests"
+        return "httpx/h2" if HTTP2 else "httpx"
+
+    async def _send(self, method, url, body, headers):
+        if self._client is not None:
+            return await self._client.request(method, url, content=body, headers=headers)
+        return await asyncio.to_thread(self._session.request, method, url, data=body,
+                                       headers=headers, timeout=_TIMEOUT)
+
+    async def request(self, method: str, url: str, payload=None, bot_token: str = None,
+                      retries: int = 3):
+        """Zwraca odpowiedź 2xx albo None (błąd trwały / wyczerpane próby / za długi rate limit).
+
+        `retries` liczy tylko błędy (5xx, timeout); 429 czeka wg Retry-After,
+        łącznie najwyżej `_MAX_RATE_LIMIT_WAIT` sekund.
+        """
+        body = encode_payload(payload)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if bot_token:
+            headers["Authorization"] = f"Bot {bot_token}"
+        who = "Bot" if bot_token else "webhook"
+        target = discord_api_url(url)
+        attempt, limited = 0, 0.0
+        while True:
+            try:
+                await discord_limits.wait_async(url)
+                resp = await self._send(method, target, body, headers)
+                discord_limits.update(url, resp.headers, resp.status_code)
+                if 200 <= resp.status_code < 300:
+                    return resp
+                if resp.status_code == 429:
+                    # discord_limits zna już Retry-After — następne wait_async() odczeka dokładnie tyle
+                    wait = discord_limits.delay(url)
+                    if wait <= 0:
+                        wait = _UNKNOWN_RETRY_AFTER
+                        await asyncio.sleep(wait)
+                    limited += wait
+                    if limited > _MAX_RATE_LIMIT_WAIT:
+                        logger.error(f"Discord {who}: rate limit dłużej niż {_MAX_RATE_LIMIT_WAIT:.0f}s — rezygnuję")
+                        return None
+                    logger.warning(f"Discord rate limit (429) — ponawiam za {wait:.1f}s")
+                    continue
+                if resp.status_code == 401 and bot_token:
+                    logger.error("Discord Bot: nieprawidłowy token!")
+                    return None
+                if resp.status_code in (400, 401, 403, 404):
+                    logger.error(f"Discord {who} błąd {resp.status_code}: {resp.text[:300]}")
+                    return None
+                attempt += 1
+                logger.warning(f"Discord {who}: HTTP {resp.status_code} (próba {attempt}/{retries})")
+            except Exception as e:
+                if _is_timeout(e):
+                    attempt += 1
+                    logger.warning(f"Discord {who}: timeout (próba {attempt}/{retries})")
+                else:
+                    logger.error(f"Discord {who} wyjątek: {e}")
+                    return None
+            if attempt >= retries:
+                break
+            await asyncio.sleep(1.5 ** attempt)
+        logger.error(f"Discord {who}: wszystkie próby nieudane")
+        return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        else:
+            self._session.close()
+
+
+def _is_timeout(exc) -> bool:
+    if httpx is not None and isinstance(exc, httpx.TimeoutException):
+        return True
+    import requests
+    return isinstance(exc, requests.exceptions.Timeout)
+
+
+_client = None
+
+
+def get_client() -> DiscordHTTP:
+    """Klient bieżącej pętli zdarzeń (tworzony przy pierwszym użyciu)."""
+    global _client
+    if _client is None or _client.loop is not asyncio.get_running_loop():
+        _client = DiscordHTTP()
+        logger.info(f"🌐 Klient Discord HTTP: {_client.backend}")
+    return _client
+
+
+async def request(method: str, url: str, payload=None, bot_token: str = None, retries: int = 3):
+    return await get_client().request(method, url, payload, bot_token, retries)
+
+
+async def _oneshot(method, url, payload, bot_token, retries):
+    client = DiscordHTTP()
+    try:
+        return await client.request(method, url, payload, bot_token, retries)
+    finally:
+        await client.aclose()
+
+
+def request_sync(method: str, url: str, payload=None, bot_token: str = None, retries: int = 3):
+    """Wersja blokująca `request()` dla kodu poza pętlą zdarzeń."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("request_sync() wywołane w pętli zdarzeń — użyj await request()")
+    client = _client
+    if client is not None and client.loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(
+            client.request(method, url, payload, bot_token, retries), client.loop)
+        return future.result()
+    return asyncio.run(_oneshot(method, url, payload, bot_token, retries))
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
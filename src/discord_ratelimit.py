@@ -0,0 +1,93 @@
+"""
+discord_ratelimit.py - Wyprzedzające tempo wysyłki z nagłówków rate-limit Discorda.
+WERSJA: 4.2 - Buckety X-RateLimit-Bucket, Remaining / Reset-After, globalny 429
+
+Trasa (route) to adres POST: URL webhooka albo /channels/{id}/messages bota.
+Po pierwszej odpowiedzi trasa jest mapowana na bucket z `X-RateLimit-Bucket`
+(kilka tras może dzielić jeden bucket). Gdy `Remaining` spada do zera, kolejne
+wysyłki czekają do `Reset-After` zamiast trafiać w 429.
+"""
+import asyncio
+import threading
+import time
+from src.logger import get_logger
+logger = get_logger("ratelimit")
+
+# zapas na opóźnienie sieci / zegar Discorda
+_RESET_MARGIN = 0.05
+
+
+class DiscordRateLimits:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bucket_of = {}     # route -> bucket id
+        self._buckets = {}       # bucket id (lub route przed 1. odpowiedzią) -> [remaining, reset_at]
+        self._global_until = 0.0
+        self.stats = {
+            "discord_ratelimit_waits_total": 0,
+            "discord_ratelimit_wait_seconds_total": 0.0,
+            "discord_429_total": 0,
+        }
+
+    def _key(self, route):
+        return self._bucket_of.get(route, route)
+
+    def delay(self, route, reserve=False) -> float:
+        """Ile sekund trzeba odczekać przed wysyłką na trasę (0 = można). reserve zajmuje slot."""
+        now = time.monotonic()
+        with self._lock:
+            wait = max(0.0, self._global_until - now)
+            key = self._key(route)
+            state = self._buckets.get(key)
+            if state is not None and now >= state[1]:
+                del self._buckets[key]   # okno minęło — stan nieznany do następnej odpowiedzi
+                state = None
+            if state is not None and state[0] <= 0:
+                wait = max(wait, state[1] - now)
+            if reserve and wait == 0 and state is not None:
+                state[0] -= 1
+            return wait
+
+    async def wait_async(self, route):
+        """Czeka (asyncio.sleep) na wolny slot w buckecie trasy i go rezerwuje."""
+        while True:
+            delay = self.delay(route, reserve=True)
+            if delay <= 0:
+                return
+            self.stats["discord_ratelimit_waits_total"] += 1
+            self.stats["discord_ratelimit_wait_seconds_total"] += delay
+            await asyncio.sleep(delay)
+
+    def update(self, route, headers, status_code=None):
+        """Zapisuje stan bucketu z nagłówków odpowiedzi (także 429)."""
+        now = time.monotonic()
+        bucket = headers.get("X-RateLimit-Bucket")
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        with self._lock:
+            if bucket:
+                self._bucket_of[route] = bucket
+                self._buckets.pop(route, None)
+            key = self._key(route)
+            try:
+                if remaining is not None and reset_after is not None:
+                    self._buckets[key] = [int(remaining), now + float(reset_after) + _RESET_MARGIN]
+                if status_code == 429:
+                    self.stats["discord_429_total"] += 1
+                    retry_after = float(headers.get("Retry-After") or reset_after or 1)
+                    if headers.get("X-RateLimit-Global") or headers.get("X-RateLimit-Scope") == "global":
+                        self._global_until = now + retry_after + _RESET_MARGIN
+                        logger.warning(f"Discord globalny rate limit — wstrzymuję wysyłkę na {retry_after:.1f}s")
+                    else:
+                        self._buckets[key] = [0, now + retry_after + _RESET_MARGIN]
+            except (TypeError, ValueError):
+                pass
+
+    def get_metrics(self) -> dict:
+        metrics = dict(self.stats)
+        metrics["discord_ratelimit_wait_seconds_total"] = round(metrics["discord_ratelimit_wait_seconds_total"], 2)
+        return metrics
+
+
+discord_limits = DiscordRateLimits()
@@ -1,16 +1,16 @@
 """
 discord_sender.py - Wysyłanie powiadomień na Discord.
-WERSJA: 4.1 - Connection pooling (requests.Session)
+WERSJA: 4.2 - Wspólny klient src/discord_http (async, keep-alive) + tempo z X-RateLimit-*
+              + pakowanie serii ofert w jedną wiadomość (do 10 embedów)
+
+build_*_payload() tylko budują treść — sender (src/sender.py) wysyła je
+asynchronicznie; send_*() to blokujące skróty dla pozostałego kodu.
 """
-import time
-import requests
 from datetime import datetime, timezone
+from src import discord_http
 from src.logger import get_logger
 logger = get_logger("discord")
 
-_http_session = requests.Session()
-_http_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10))
-
 COLOR_PRESETS = {
     "zielony": 0x57F287,
     "niebieski": 0x3498DB,
@@ -37,7 +37,7 @@ def _parse_color(color_str: str) -> int:
         except ValueError:
             return COLOR_PRESETS["zielony"]
 
-def send_item_to_discord(item, webhook_url: str, query_name: str = "", embed_color: str = "5763719") -> bool:
+def build_item_payload(item, query_name: str = "", embed_color: str = "5763719") -> dict:
     color = _parse_color(embed_color)
     if item.feedback_count > 0:
         score = min(item.feedback_score, 5.0)
@@ -73,9 +73,47 @@ def send_item_to_discord(item, webhook_url: str, query_name: str = "", embed_col
     embeds = [main_embed]
     for photo_url in item.photos[1:3]:
         embeds.append({"url": item.url, "color": color, "image": {"url": photo_url}})
-    return _send_webhook(webhook_url, {"embeds": embeds})
+    return {"embeds": embeds}
 
-def send_price_drop_alert(item, webhook_url: str, drop_amount: float, old_price: float) -> bool:
+def send_item_to_discord(item, webhook_url: str, query_name: str = "", embed_color: str = "5763719") -> bool:
+    return _send_webhook(webhook_url, build_item_payload(item, query_name, embed_color))
+
+# limit Discorda: embedy w jednej wiadomości
+MAX_EMBEDS_PER_MESSAGE = 10
+
+def compact_item_embed(item, embed_color="5763719", seller: bool = False, index: int = 0) -> dict:
+    """Zwarty embed do wiadomości zbiorczej — jedno zdjęcie jako miniatura."""
+    color = 0xFFD700 if seller else _parse_color(embed_color)
+    prefix = f"{index}. " if index else ""
+    if seller:
+        prefix += "🆕 "
+    lines = [f"**{item.price} {item.currency}** ({item.total_price})"]
+    details = " · ".join(v for v in (item.size_title, item.brand_title, item.status) if v)
+    if details:
+        lines.append(details)
+    if seller:
+        seller_name = f"👤 {item.user_login}"
+    else:
+        seller_name = f"{item.country_flag} {item.user_login}" if item.user_login else "🌍 —"
+    lines.append(f"{seller_name} · <t:{item.raw_timestamp}:R>")
+    embed = {
+        "title": (prefix + item.title)[:256],
+        "url": item.url,
+        "color": color,
+        "description": "\n".join(lines),
+    }
+    if item.is_hidden:
+        embed["footer"] = {"text": "⚠️ Ukryty na Vinted - wymaga weryfikacji!"}
+        embed["color"] = 0xFFA500
+    if item.photos:
+        embed["thumbnail"] = {"url": item.photos[0]}
+    return embed
+
+def build_packed_payload(embeds: list) -> dict:
+    """Jedna wiadomość z kilkoma ofertami (max MAX_EMBEDS_PER_MESSAGE)."""
+    return {"embeds": embeds[:MAX_EMBEDS_PER_MESSAGE]}
+
+def build_price_drop_payload(item, drop_amount: float, old_price: float) -> dict:
     try:
         price_float = float(item.price.replace(',', '.').replace(' ', ''))
         drop_percent = (drop_amount / old_price) * 100 if old_price > 0 else 0
@@ -97,9 +135,12 @@ def send_price_drop_alert(item, webhook_url: str, drop_amount: float, old_price:
     if item.photos:
         embed["image"] = {"url": item.photos[0]}
     embed["footer"] = {"text": "🔥 Szybko kupuj zanim ktoś inny!"}
-    return _send_webhook(webhook_url, {"embeds": [embed]})
+    return {"embeds": [embed]}
 
-def send_seller_alert(item, webhook_url: str) -> bool:
+def send_price_drop_alert(item, webhook_url: str, drop_amount: float, old_price: float) -> bool:
+    return _send_webhook(webhook_url, build_price_drop_payload(item, drop_amount, old_price))
+
+def build_seller_payload(item) -> dict:
     embed = {
         "author": {"name": f"👤 {item.user_login}", "url": item.user_url or item.url},
         "title": f"🆕 NOWY PRZEDMIOT! {item.title}",
@@ -116,7 +157,10 @@ def send_seller_alert(item, webhook_url: str) -> bool:
     if item.photos:
         embed["image"] = {"url": item.photos[0]}
     embed["footer"] = {"text": "👤 Śledzony sprzedawca"}
-    return _send_webhook(webhook_url, {"embeds": [embed]})
+    return {"embeds": [embed]}
+
+def send_seller_alert(item, webhook_url: str) -> bool:
+    return _send_webhook(webhook_url, build_seller_payload(item))
 
 def send_system_message(webhook_url: str, message: str, level: str = "INFO") -> bool:
     colors = {"INFO": 0x3498DB, "SUCCESS": 0x57F287, "WARNING": 0xF1C40F, "ERROR": 0xE74C3C}
@@ -127,26 +171,4 @@ def send_system_message(webhook_url: str, message: str, level: str = "INFO") ->
     return _send_webhook(webhook_url, payload)
 
 def _send_webhook(webhook_url: str, payload: dict, retries: int = 3) -> bool:
-    for attempt in range(1, retries + 1):
-        try:
-            resp = _http_session.post(webhook_url, json=payload, timeout=10)
-            if resp.status_code == 204:
-                return True
-            if resp.status_code == 429:
-                retry_after = float(resp.headers.get("Retry-After", 5))
-                logger.warning(f"Discord rate limit — czekam {retry_after:.1f}s")
-                time.sleep(retry_after + 1)
-                continue
-            if resp.status_code in (400, 401, 403, 404):
-                logger.error(f"Discord webhook błąd {resp.status_code}: {resp.text[:300]}")
-                return False
-            logger.warning(f"Discord HTTP {resp.status_code} (próba {attempt}/{retries})")
-        except requests.exceptions.Timeout:
-            logger.warning(f"Discord timeout (próba {attempt}/{retries})")
-        except Exception as e:
-            logger.error(f"Discord wyjątek: {e}")
-            return False
-        if attempt < retries:
-            time.sleep(1.5 ** attempt)
-    logger.error("Discord: wszystkie próby nieudane")
-    return False
+    return discord_http.request_sync("POST", webhook_url, payload, retries=retries) is not None
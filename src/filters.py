@@ -0,0 +1,191 @@
+"""
+filters.py - Lokalne reguły filtrów zapytania (to, czego nie wyrazi URL Vinted).
+WERSJA: 4.2 - Reguły z queries.filter_rules kompilowane raz do jednego predykatu + liczniki odrzuceń
+
+Reguły (JSON w queries.filter_rules, edycja w formularzu zapytania):
+  exclude_keywords   lista słów — tytuł nie może zawierać żadnego (bez wielkości liter)
+  title_regex        tytuł musi pasować do wyrażenia (re.search, bez wielkości liter)
+  exclude_sellers    loginy albo id sprzedawców do pominięcia
+  max_total_price    maks. cena z ochroną kupującego (Item.total_amount)
+  min_seller_rating  min. ocena sprzedawcy 0..5
+  hidden_only        tylko oferty ukryte
+
+Predykat działa w scraperze na sparsowanych ofertach — przed enrichmentem
+(pobieraniem ocen sprzedawców) i przed outboxem. Reguły sprawdzane są od
+najtańszych; pierwsza niespełniona odrzuca ofertę i podbija swój licznik.
+Ocena sprzedawcy z katalogu bywa pusta — wtedy oferta przechodzi pierwszy
+etap, a po enrichmencie (`predicate(item, enriched=True)`) brak ocen też
+odrzuca.
+"""
+import json
+import re
+from collections import OrderedDict
+from src.logger import get_logger
+logger = get_logger("filters")
+
+# kolejność = kolejność sprawdzania (od najtańszych)
+RULES = ("hidden_only", "exclude_sellers", "max_total_price", "exclude_keywords", "title_regex",
+         "min_seller_rating")
+# ile odrzuceń (oferta, cena) pamiętają liczniki — kolejne skany nie liczą ich drugi raz
+_REJECTED_MAX = 2000
+
+_compiled = {}   # query_id -> (tekst reguł, predykat)
+_drops = {}      # query_id -> {reguła: liczba odrzuconych}
+
+
+def _lines(value) -> list:
+    if isinstance(value, str):
+        value = value.replace(",", "\n").split("\n")
+    return [str(v).strip() for v in value or [] if str(v).strip()]
+
+
+def normalize_rules(raw: dict) -> dict:
+    """Sprawdza i porządkuje reguły (ValueError z komunikatem dla panelu). Puste reguły są pomijane."""
+    if not isinstance(raw, dict):
+        raise ValueError("reguły filtrów muszą być obiektem JSON")
+    unknown = set(raw) - set(RULES)
+    if unknown:
+        raise ValueError(f"nieznane reguły: {', '.join(sorted(unknown))}")
+    rules = {}
+    keywords = _lines(raw.get("exclude_keywords"))
+    if keywords:
+        rules["exclude_keywords"] = keywords
+    pattern = str(raw.get("title_regex") or "").strip()
+    if pattern:
+        try:
+            re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"niepoprawne wyrażenie regularne: {e}")
+        rules["title_regex"] = pattern
+    sellers = _lines(raw.get("exclude_sellers"))
+    if sellers:
+        rules["exclude_sellers"] = sellers
+    for key, low, high in (("max_total_price", 0, None), ("min_seller_rating", 0, 5)):
+        value = raw.get(key)
+        if value in (None, ""):
+            continue
+        try:
+            value = float(str(value).replace(",", "."))
+        except ValueError:
+            raise ValueError(f"{key}: oczekiwano liczby")
+        if value < low or (high is not None and value > high):
+            raise ValueError(f"{key}: poza zakresem")
+        rules[key] = value
+    if raw.get("hidden_only"):
+        rules["hidden_only"] = True
+    return rules
+
+
+def parse_rules(text) -> dict:
+    if not text or not str(text).strip():
+        return {}
+    try:
+        raw = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"reguły filtrów: niepoprawny JSON ({e})")
+    return normalize_rules(raw)
+
+
+def dump_rules(rules: dict) -> str:
+    """Postać zapisywana w bazie ("" = bez reguł)."""
+    return json.dumps(rules, ensure_ascii=False, sort_keys=True) if rules else ""
+
+
+def _price_cents(price):
+    try:
+        return int(round(float(price) * 100))
+    except (TypeError, ValueError):
+        return None
+
+
+def compile_rules(rules: dict, drops=None):
+    """Reguły → predykat `predicate(item, enriched=False) -> bool` z licznikami w `drops`."""
+    drops = drops if drops is not None else {}
+    checks = []
+    if rules.get("hidden_only"):
+        checks.append(("hidden_only", lambda item, enriched: item.is_hidden))
+    if rules.get("exclude_sellers"):
+        sellers = {s.lower() for s in rules["exclude_sellers"]}
+        checks.append(("exclude_sellers", lambda item, enriched:
+                       str(item.user_login or "").lower() not in sellers and str(item.user_id) not in sellers))
+    if "max_total_price" in rules:
+        limit = rules["max_total_price"]
+
+        def total_ok(item, enriched):
+            total = item.total_amount()
+            return total is not None and total <= limit
+        checks.append(("max_total_price", total_ok))
+    if rules.get("exclude_keywords"):
+        # jedno wyrażenie zamiast pętli po słowach
+        excluded = re.compile("|".join(re.escape(k) for k in rules["exclude_keywords"]), re.IGNORECASE)
+        checks.append(("exclude_keywords", lambda item, enriched: not excluded.search(item.title or "")))
+    if rules.get("title_regex"):
+        wanted = re.compile(rules["title_regex"], re.IGNORECASE)
+        checks.append(("title_regex", lambda item, enriched: wanted.search(item.title or "") is not None))
+    if "min_seller_rating" in rules:
+        minimum = rules["min_seller_rating"]
+
+        def rating_ok(item, enriched):
+            if not item.feedback_count:
+                return not enriched   # nieznana przed enrichmentem — rozstrzyga drugi etap
+            return item.feedback_score >= minimum
+        checks.append(("min_seller_rating", rating_ok))
+
+    for name, _ in checks:
+        drops.setdefault(name, 0)
+    # tylko do liczników — decyzja zawsze z reguł (po obniżce ta sama oferta może już przejść)
+    counted = OrderedDict()
+
+    def drop(item_id, name, price_cents=None):
+        """Odrzucenie (także spoza predykatu, np. maska ceny ItemBatch) — liczone raz na ofertę i cenę."""
+        key = (item_id, price_cents)
+        if key in counted:
+            return
+        drops[name] += 1
+        counted[key] = None
+        if len(counted) > _REJECTED_MAX:
+            counted.popitem(last=False)
+
+    def predicate(item, enriched=False) -> bool:
+        for name, ok in checks:
+            if not ok(item, enriched):
+                drop(item.id, name, _price_cents(item.price))
+                return False
+        return True
+
+    predicate.rules = rules
+    predicate.uses_rating = "min_seller_rating" in rules
+    predicate.drops = drops
+    predicate.drop = drop
+    return predicate
+
+
+def for_query(query):
+    """Predykat zapytania ze snapshotu (kompilowany ponownie tylko po zmianie reguł); None = bez reguł."""
+    text = query.get("filter_rules") or ""
+    cached = _compiled.get(query["id"])
+    if cached and cached[0] == text:
+        return cached[1]
+    predicate = None
+    if text:
+        try:
+            rules = parse_rules(text)
+            if rules:
+                predicate = compile_rules(rules, _drops.setdefault(query["id"], {}))
+        except ValueError as e:
+            logger.error(f"[{query.get('name')}] {e} — filtry zapytania pominięte")
+    _compiled[query["id"]] = (text, predicate)
+    return predicate
+
+
+def get_drops(query_id) -> dict:
+    """Odrzucone oferty zapytania per reguła (od startu procesu)."""
+    return {k: v for k, v in _drops.get(query_id, {}).items() if v}
+
+
+def get_metrics() -> dict:
+    metrics = {f"filter_{name}_dropped_total": 0 for name in RULES}
+    for drops in _drops.values():
+        for name, count in drops.items():
+            metrics[f"filter_{name}_dropped_total"] += count
+    return metrics
@@ -0,0 +1,236 @@
+"""
+firehose.py - Tryb „firehose”: jeden strumień najnowszych ofert domeny dopasowywany lokalnie do wszystkich zapytań.
+WERSJA: 4.2 - Jedno żądanie newest_first na domenę na skan (koszt niezależny od liczby zapytań) + metryki pokrycia
+
+Włączany kluczem configu `firehose_domains` (np. "pl,de"; puste = wyłączone).
+Dla każdej takiej domeny skan pobiera niefiltrowany katalog
+`order=newest_first` (`firehose_per_page` ofert, domyślnie 96), a każda
+nieznana wcześniej oferta trafia do `Matcher` (src/matcher.py) z URL-ami
+wszystkich aktywnych zapytań tej domeny. Dalej działa zwykła ścieżka
+scrapera: okno nowości, watermark URL-a, deduplikacja, filtry lokalne.
+
+URL-e, których matcher nie odwzoruje (kolor, materiał, miasto…), a bez
+drzewa kategorii także te z `catalog[]`, zostają przy zwykłym odpytywaniu —
+`plan()` zwraca, które (zapytanie, URL) obsługuje strumień. Odpytywanie
+URL-a wyłączane jest dopiero, gdy strumień faktycznie dopasował do niego
+ofertę, i tylko dopóki oferty strumienia niosą pola, których URL wymaga
+(brand_id, catalog_id, size_id, status_id) — bez nich matcher nic by nie
+dopasował, a zapytanie ucichłoby bez śladu. Brak pola = URL-e wracają do
+odpytywania (z ostrzeżeniem w logu). URL-e z `search_text` są dopasowywane
+ze strumienia (szybszy alert), ale zawsze też odpytywane: matcher szuka słów
+w tytule i marce, a wyszukiwarka Vinted także w opisie — bez odpytywania
+oferty trafione tylko opisem zniknęłyby po cichu.
+
+Pokrycie: kolejne strony strumienia powinny na siebie zachodzić. Strona
+złożona wyłącznie z nowych ofert, z których najstarsza jest młodsza od
+najnowszej z poprzedniej strony, oznacza lukę — oferty wystawione w tym
+czasie przepadły. `coverage_ratio` = 1 − sekundy luk / sekundy obserwacji.
+"""
+import time
+from collections import OrderedDict
+import src.database as db
+from src.config import extract_domain_from_url
+from src.matcher import Matcher, Subscription
+from src.logger import get_logger
+logger = get_logger("firehose")
+
+DEFAULT_PER_PAGE = 96
+# ile id ofert pamięta strumień domeny (kilka pełnych stron)
+_SEEN_MAX = 5000
+# wygładzanie tempa wystawiania (EWMA)
+_RATE_ALPHA = 0.2
+# warunek URL-a → pole oferty, bez którego matcher go nie sprawdzi
+_REQUIRED_FIELDS = (("brands", "brand_id"), ("catalogs", "catalog_id"), ("sizes", "size_id"),
+                    ("statuses", "status_id"))
+
+
+class _Feed:
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.key = None
+        self.matcher = Matcher()
+        self.covered = set()       # w matcherze
+        self.required = {}         # (zapytanie, URL) -> pola oferty potrzebne do dopasowania
+        self.confirmed = set()     # dopasowane przez strumień co najmniej raz
+        self.text = set()          # z search_text — zawsze także odpytywane (opis oferty poza matcherem)
+        self.fields = set()        # pola obecne w ostatniej niepustej stronie strumienia
+        self.missing = set()       # pola wymagane przez URL-e, których strumień nie niesie (ostrzeżenie raz)
+        self.catalog_parents = None
+        self.seen = OrderedDict()
+        self.newest_ts = 0
+        self.last_poll = None
+        self.listings_per_min = 0.0
+        self.page_fill = 0.0
+        self.stats = {"polls_total": 0, "items_total": 0, "matched_total": 0,
+                      "gaps_total": 0, "gap_seconds_total": 0, "observed_seconds_total": 0}
+
+
+_feeds = {}   # domena -> _Feed
+
+
+def enabled_domains() -> list:
+    raw = db.get_config("firehose_domains", "") or ""
+    return [d.strip().lower().lstrip(".") for d in raw.replace(";", ",").split(",") if d.strip()]
+
+
+def per_page() -> int:
+    try:
+        return max(10, int(db.get_config("firehose_per_page", str(DEFAULT_PER_PAGE))))
+    except ValueError:
+        return DEFAULT_PER_PAGE
+
+
+def feed_url(domain) -> str:
+    return f"https://www.vinted.{domain}/catalog?order=newest_first"
+
+
+def _feed(domain) -> _Feed:
+    if domain not in _feeds:
+        _feeds[domain] = _Feed(domain)
+    return _feeds[domain]
+
+
+def parse_catalog_tree(data) -> dict:
+    """Drzewo kategorii (zagnieżdżone `catalogs`) → {id kategorii: id rodzica}."""
+    parents = {}
+
+    def walk(node, parent):
+        if isinstance(node, dict):
+            node_id = node.get("id")
+            if node_id is not None and parent is not None:
+                parents[node_id] = parent
+            for value in node.values():
+                if isinstance(value, (list, dict)):
+                    walk(value, node_id if node_id is not None else parent)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child, parent)
+
+    walk(data, None)
+    return parents
+
+
+def set_catalog_parents(domain, parents):
+    """Mapa kategorii domeny — włącza obsługę URL-i z `catalog[]` (przebudowa przy następnym plan())."""
+    feed = _feed(domain)
+    feed.catalog_parents = parents
+    feed.key = None
+
+
+def needs_catalog_tree(domain) -> bool:
+    return _feed(domain).catalog_parents is None
+
+
+def plan(queries, domains) -> set:
+    """Przebudowuje matchery domen po zmianie zapytań; zwraca {(query_id, url)} obsługiwane przez strumień."""
+    covered = set()
+    for domain in domains:
+        feed = _feed(domain)
+        urls = [(q["id"], u["url"] if isinstance(u, dict) else u) for q in queries for u in q.get("urls", [])]
+        urls = [(qid, url) for qid, url in urls if extract_domain_from_url(url) == domain]
+        key = tuple(urls)
+        if key != feed.key:
+            matcher = Matcher(feed.catalog_parents)
+            feed.covered, feed.required, feed.text = set(), {}, set()
+            for qid, url in urls:
+                sub = Subscription(qid, url)
+                if sub.catalogs and feed.catalog_parents is None:
+                    continue
+                if matcher.add(qid, url):
+                    feed.covered.add((qid, url))
+                    feed.required[(qid, url)] = {f for attr, f in _REQUIRED_FIELDS if getattr(sub, attr)}
+                    if sub.words:
+                        feed.text.add((qid, url))
+            feed.matcher, feed.key = matcher, key
+            feed.confirmed &= feed.covered
+            logger.info(f"🚿 Firehose vinted.{domain}: {len(feed.covered)}/{len(urls)} URL-i dopasowywanych lokalnie "
+                        f"(odpytywanie wyłączane po pierwszym dopasowaniu ze strumienia, "
+                        f"poza {len(feed.text)} z search_text)")
+        covered |= _streamed(feed)
+    return covered
+
+
+def _streamed(feed) -> set:
+    """URL-e obsługiwane wyłącznie przez strumień: potwierdzone, bez search_text i z kompletem pól w ofertach."""
+    return {k for k in feed.confirmed
+            if k in feed.covered and k not in feed.text and feed.required[k] <= feed.fields}
+
+
+def observe(domain, items) -> list:
+    """Rejestruje stronę strumienia (pokrycie, tempo) i zwraca oferty jeszcze niewidziane."""
+    feed = _feed(domain)
+    now = time.monotonic()
+    stats = feed.stats
+    stats["polls_total"] += 1
+    fresh = [it for it in items if it.id not in feed.seen]
+    timestamps = [it.raw_timestamp for it in items if it.raw_timestamp]
+    if timestamps and feed.newest_ts:
+        oldest, newest = min(timestamps), max(timestamps)
+        if fresh and len(fresh) == len(items) and oldest > feed.newest_ts:
+            gap = oldest - feed.newest_ts
+            stats["gaps_total"] += 1
+            stats["gap_seconds_total"] += gap
+            logger.warning(f"⚠️ Firehose vinted.{domain} nie nadąża: luka ~{gap}s (cała strona nowych ofert) — "
+                           f"zwiększ firehose_per_page albo skróć scan_interval")
+        stats["observed_seconds_total"] += max(0, newest - feed.newest_ts)
+    if timestamps:
+        feed.newest_ts = max(feed.newest_ts, max(timestamps))
+    if items:
+        fields = {f for _, f in _REQUIRED_FIELDS if any(getattr(it, f, None) is not None for it in items)}
+        needed = set().union(*feed.required.values())
+        missing = needed - fields
+        if missing and missing != feed.missing:
+            logger.warning(f"⚠️ Firehose vinted.{domain}: oferty strumienia bez pól {', '.join(sorted(missing))} — "
+                           f"URL-e z tymi filtrami zostają przy zwykłym odpytywaniu")
+        feed.fields, feed.missing = fields, missing
+    if feed.last_poll is not None and now > feed.last_poll:
+        rate = len(fresh) * 60 / (now - feed.last_poll)
+        feed.listings_per_min += _RATE_ALPHA * (rate - feed.listings_per_min)
+    feed.last_poll = now
+    feed.page_fill = len(fresh) / len(items) if items else 0.0
+    for it in fresh:
+        feed.seen[it.id] = None
+    while len(feed.seen) > _SEEN_MAX:
+        feed.seen.popitem(last=False)
+    stats["items_total"] += len(fresh)
+    return fresh
+
+
+def match(domain, item, count=True) -> list:
+    """Subskrypcje (zapytanie, URL) domeny pasujące do oferty; count=False — bez metryki (np. obniżki)."""
+    feed = _feed(domain)
+    matched = feed.matcher.match(item)
+    if count:
+        feed.stats["matched_total"] += len(matched)
+    for sub in matched:
+        key = (sub.query_id, sub.url)
+        if key not in feed.confirmed and key in feed.covered:
+            feed.confirmed.add(key)
+            if key not in feed.text and feed.required[key] <= feed.fields:
+                logger.info(f"🚿 Firehose vinted.{domain}: pierwsze dopasowanie dla {sub.url[:80]} — "
+                            f"URL obsługiwany już tylko przez strumień")
+    return matched
+
+
+def coverage(domain) -> float:
+    stats = _feed(domain).stats
+    observed = stats["observed_seconds_total"]
+    return round(1 - min(observed, stats["gap_seconds_total"]) / observed, 4) if observed else 1.0
+
+
+def get_metrics() -> dict:
+    metrics = {}
+    for domain, feed in _feeds.items():
+        prefix = f"firehose_{domain.replace('.', '_')}"
+        for name, value in feed.stats.items():
+            metrics[f"{prefix}_{name}"] = value
+        metrics[f"{prefix}_coverage_ratio"] = coverage(domain)
+        metrics[f"{prefix}_listings_per_min"] = round(feed.listings_per_min, 1)
+        metrics[f"{prefix}_page_fill"] = round(feed.page_fill, 3)
+        metrics[f"{prefix}_subscriptions"] = len(feed.matcher.subscriptions)
+        streamed = len(_streamed(feed))
+        metrics[f"{prefix}_streamed_urls"] = streamed
+        metrics[f"{prefix}_pending_urls"] = len(feed.covered) - streamed
+        metrics[f"{prefix}_polled_urls"] = len(feed.key or ()) - streamed
+    return metrics
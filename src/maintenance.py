@@ -0,0 +1,151 @@
+"""
+maintenance.py - Konserwacja baz w oknach bezczynności.
+WERSJA: 4.2 - Checkpoint / optimize / incremental vacuum / pruning z limitem czasu
+
+Scraper i sender zgłaszają aktywność (note_activity / scan_started / scan_finished).
+Kroki są uruchamiane tylko gdy żaden skan nie trwa i od ostatniego alertu minęło
+`maintenance_idle_seconds` (config, domyślnie 15 s). Każdy krok ma własny interwał
+i budżet czasu — zapytania SQLite przekraczające budżet są przerywane
+(db.time_budget), a wynik trafia do metryk (/metrics).
+"""
+import threading
+import time
+import src.database as db
+from src.logger import get_logger
+logger = get_logger("maintenance")
+
+_activity_lock = threading.Lock()
+_last_activity = 0.0
+_scans_running = 0
+
+def note_activity():
+    """Alert w toku (kolejkowanie / wysyłka) — odsuwa okno konserwacji."""
+    global _last_activity
+    _last_activity = time.monotonic()
+
+def scan_started():
+    global _scans_running
+    with _activity_lock:
+        _scans_running += 1
+
+def scan_finished():
+    global _scans_running
+    with _activity_lock:
+        _scans_running = max(0, _scans_running - 1)
+
+def scan_running() -> bool:
+    return _scans_running > 0
+
+def is_idle(idle_seconds: float) -> bool:
+    return _scans_running == 0 and time.monotonic() - _last_activity >= idle_seconds
+
+# ── KROKI ──────────────────────────────────────────────────────────
+
+def _step_checkpoint(budget):
+    for name, (connect, _) in db._DATABASES.items():
+        conn = connect()
+        try:
+            busy, log_pages, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if busy:
+                logger.debug(f"Checkpoint [{name}] zablokowany przez czytelnika ({log_pages} stron WAL)")
+        finally:
+            conn.close()
+
+def _step_prune_logs(budget):
+    deleted = db.prune_logs(keep=1000)
+    if deleted:
+        logger.debug(f"Przycięto {deleted} logów")
+
+def _step_optimize(budget):
+    for connect, _ in db._DATABASES.values():
+        conn = connect()
+        try:
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+
+def _step_incremental_vacuum(budget):
+    # bazy bez INCREMENTAL (za duże do konwersji przy starcie — db._ensure_incremental_vacuum) są pomijane
+    for name, (connect, lock) in db._DATABASES.items():
+        with lock:
+            conn = connect()
+            try:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                    conn.execute("PRAGMA incremental_vacuum(2000)").fetchall()
+            finally:
+                conn.close()
+
+def _step_downsample_prices(budget):
+    db.downsample_price_history()
+
+def _step_outbox_prune(budget):
+    from src.outbox import prune
+    deleted = prune()
+    if deleted:
+        logger.debug(f"Outbox: usunięto {deleted} zakończonych wpisów")
+
+def _step_retention(budget):
+    from src.retention import run_retention
+    run_retention(budget=budget)
+
+# nazwa → (funkcja(budżet), interwał [s], budżet [s])
+_STEPS = [
+    ("checkpoint", _step_checkpoint, 60, 2.0),
+    ("prune_logs", _step_prune_logs, 60, 1.0),
+    ("outbox_prune", _step_outbox_prune, 3600, 1.0),
+    ("optimize", _step_optimize, 3600, 3.0),
+    ("incremental_vacuum", _step_incremental_vacuum, 3600, 3.0),
+    ("downsample_prices", _step_downsample_prices, 3600, 5.0),
+    ("retention", _step_retention, 3600, 10.0),
+]
+
+_last_run = {name: float("-inf") for name, *_ in _STEPS}
+_stats = {
+    "maintenance_runs_total": 0,
+    "maintenance_steps_total": 0,
+    "maintenance_step_errors_total": 0,
+    "maintenance_budget_exceeded_total": 0,
+    "maintenance_deferred_total": 0,
+}
+_step_ms = {name: 0.0 for name, *_ in _STEPS}
+
+def get_metrics() -> dict:
+    metrics = dict(_stats)
+    for name, ms in _step_ms.items():
+        metrics[f"maintenance_{name}_last_ms"] = round(ms, 1)
+    return metrics
+
+def run_if_idle(force: bool = False) -> list:
+    """Uruchamia kroki, którym minął interwał, o ile system jest bezczynny. Zwraca nazwy kroków."""
+    try:
+        idle_seconds = float(db.get_config("maintenance_idle_seconds", "15"))
+    except ValueError:
+        idle_seconds = 15.0
+    now = time.monotonic()
+    due = [s for s in _STEPS if force or now - _last_run[s[0]] >= s[2]]
+    if not due:
+        return []
+    if not force and not is_idle(idle_seconds):
+        _stats["maintenance_deferred_total"] += 1
+        return []
+    _stats["maintenance_runs_total"] += 1
+    done = []
+    for name, step, _, budget in due:
+        if not force and not is_idle(idle_seconds):
+            _stats["maintenance_deferred_total"] += 1
+            break
+        started = time.monotonic()
+        try:
+            with db.time_budget(budget):
+                step(budget)
+        except db.BudgetExceeded:
+            _stats["maintenance_budget_exceeded_total"] += 1
+            logger.info(f"⏱️ Maintenance [{name}] przekroczył budżet {budget:.0f}s — dokończy później")
+        except Exception as e:
+            _stats["maintenance_step_errors_total"] += 1
+            logger.warning(f"Maintenance [{name}] nieudany: {e}")
+        _step_ms[name] = (time.monotonic() - started) * 1000
+        _last_run[name] = time.monotonic()
+        _stats["maintenance_steps_total"] += 1
+        done.append(name)
+    return done
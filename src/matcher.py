@@ -0,0 +1,221 @@
+"""
+matcher.py - Lokalne dopasowanie ofert do tysięcy subskrypcji (URL-i zapytań) przez indeks odwrócony.
+WERSJA: 4.2 - Indeks po marce / kategorii / rozmiarze / słowach tytułu / przedziale ceny + dokładne sprawdzenie
+
+Przy szerokim pobieraniu (np. najnowsze oferty domeny) każdą ofertę trzeba
+porównać z filtrami wszystkich zapytań — liniowo to O(oferty × subskrypcje).
+Tutaj każda subskrypcja (jeden URL zapytania) trafia do indeksu pod jednym
+„kotwiczącym” warunkiem, który oferta MUSI spełnić: id marek, potem id
+kategorii, rozmiarów, najdłuższe słowo z search_text, a w ostateczności
+kubełki ceny (logarytmiczne). Oferta sprawdza w indeksie tylko swoje klucze,
+więc dokładne sprawdzenie obejmuje garstkę kandydatów zamiast wszystkich.
+
+Dopasowanie lokalne odwzorowuje filtry URL-a Vinted w przybliżeniu:
+  brand_ids[] / catalog[] / size_ids[] / status[] po id z oferty (brak id = brak dopasowania),
+  price_from / price_to (i currency), search_text — wszystkie słowa w tytule lub marce.
+Kategorie nadrzędne wymagają mapy `catalog_parents` (id → id rodzica).
+URL-e z filtrami, których oferta nie niesie (kolor, materiał, miasto…),
+nie są indeksowane (`Matcher.skipped`) — zostają przy odpytywaniu API.
+"""
+import math
+import re
+import unicodedata
+from urllib.parse import urlparse, parse_qsl
+
+# parametry URL → pole subskrypcji
+_LIST_PARAMS = {
+    "brand_ids[]": "brands", "brand_ids": "brands",
+    "catalog[]": "catalogs", "catalog_ids[]": "catalogs", "catalog_ids": "catalogs",
+    "size_ids[]": "sizes", "size_ids": "sizes",
+    "status[]": "statuses", "status_ids[]": "statuses", "status_ids": "statuses",
+}
+# nie zmieniają zbioru wyników
+_IGNORED_PARAMS = {"order", "time", "search_id", "page", "per_page", "disabled_personalization",
+                   "ref", "utm_source", "utm_medium", "utm_campaign", "with_disabled_items"}
+_TOKEN = re.compile(r"\w+")
+# 4 kubełki na podwojenie ceny; powyżej _MAX_BUCKET wszystko w jednym
+_BUCKETS_PER_OCTAVE = 4
+_MAX_BUCKET = int(math.log2(1_000_000) * _BUCKETS_PER_OCTAVE)
+
+
+def tokens(text) -> set:
+    """Słowa bez wielkości liter i znaków diakrytycznych (≥ 2 znaki)."""
+    if not text:
+        return set()
+    folded = unicodedata.normalize("NFKD", str(text).lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch)).replace("ł", "l")
+    return {t for t in _TOKEN.findall(folded) if len(t) >= 2}
+
+
+def price_bucket(price: float) -> int:
+    return min(_MAX_BUCKET, int(math.log2(max(price, 1.0)) * _BUCKETS_PER_OCTAVE))
+
+
+def _float(value):
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+class Subscription:
+    __slots__ = ("query_id", "url", "brands", "catalogs", "sizes", "statuses",
+                 "price_from", "price_to", "currency", "words", "unsupported")
+
+    def __init__(self, query_id, url):
+        self.query_id = query_id
+        self.url = url
+        self.brands = self.catalogs = self.sizes = self.statuses = None
+        self.price_from = self.price_to = None
+        self.currency = None
+        self.words = set()
+        self.unsupported = []
+        path = urlparse(url).path.strip("/").split("/")
+        if len(path) >= 2 and path[0] == "brand":
+            self._add("brands", path[1].split("-")[0])
+        for key, value in parse_qsl(urlparse(url).query, keep_blank_values=False):
+            if key in _LIST_PARAMS:
+                self._add(_LIST_PARAMS[key], value)
+            elif key == "price_from":
+                self.price_from = _float(value)
+            elif key == "price_to":
+                self.price_to = _float(value)
+            elif key == "currency":
+                self.currency = value.upper()
+            elif key == "search_text":
+                self.words |= tokens(value)
+            elif key not in _IGNORED_PARAMS:
+                self.unsupported.append(key)
+
+    def _add(self, field, value):
+        try:
+            value = int(value)
+        except ValueError:
+            self.unsupported.append(field)
+            return
+        current = getattr(self, field)
+        setattr(self, field, (current or frozenset()) | {value})
+
+    def anchor(self) -> list:
+        """Klucze indeksu — warunek, który każda pasująca oferta musi spełnić."""
+        if self.brands:
+            return [("b", v) for v in self.brands]
+        if self.catalogs:
+            return [("c", v) for v in self.catalogs]
+        if self.sizes:
+            return [("s", v) for v in self.sizes]
+        if self.words:
+            return [("t", max(self.words, key=len))]
+        if self.price_from is not None or self.price_to is not None:
+            low = price_bucket(self.price_from) if self.price_from is not None else 0
+            high = price_bucket(self.price_to) if self.price_to is not None else _MAX_BUCKET
+            return [("p", b) for b in range(low, high + 1)]
+        return []
+
+    def matches(self, features) -> bool:
+        """Dokładne sprawdzenie na cechach oferty z `Matcher.features()`."""
+        brand_id, catalogs, size_id, status_id, price, currency, words = features
+        if self.brands is not None and brand_id not in self.brands:
+            return False
+        if self.catalogs is not None and self.catalogs.isdisjoint(catalogs):
+            return False
+        if self.sizes is not None and size_id not in self.sizes:
+            return False
+        if self.statuses is not None and status_id not in self.statuses:
+            return False
+        if self.price_from is not None or self.price_to is not None:
+            if price is None or (self.currency and currency != self.currency):
+                return False
+            if self.price_from is not None and price < self.price_from:
+                return False
+            if self.price_to is not None and price > self.price_to:
+                return False
+        return self.words <= words
+
+    def __repr__(self):
+        return f"<Subscription q{self.query_id} {self.url[:60]}>"
+
+
+class Matcher:
+
+    def __init__(self, catalog_parents=None):
+        self.catalog_parents = catalog_parents or {}
+        self.subscriptions = []
+        self.skipped = []
+        self._index = {}       # klucz → lista numerów subskrypcji
+        self._wildcard = []    # subskrypcje bez żadnego warunku (każda oferta pasuje)
+        self.stats = {"matcher_items_total": 0, "matcher_candidates_total": 0, "matcher_matches_total": 0}
+
+    @classmethod
+    def from_queries(cls, queries, catalog_parents=None) -> "Matcher":
+        """Subskrypcje z zapytań w formacie db.get_queries_snapshot()."""
+        matcher = cls(catalog_parents)
+        for query in queries:
+            for entry in query.get("urls", []):
+                matcher.add(query["id"], entry["url"] if isinstance(entry, dict) else entry)
+        return matcher
+
+    def add(self, query_id, url) -> bool:
+        sub = Subscription(query_id, url)
+        if sub.unsupported:
+            self.skipped.append(sub)
+            return False
+        n = len(self.subscriptions)
+        self.subscriptions.append(sub)
+        keys = sub.anchor()
+        if not keys:
+            self._wildcard.append(n)
+        for key in keys:
+            self._index.setdefault(key, []).append(n)
+        return True
+
+    def _catalogs(self, catalog_id) -> set:
+        chain = set()
+        while catalog_id is not None and catalog_id not in chain:
+            chain.add(catalog_id)
+            catalog_id = self.catalog_parents.get(catalog_id)
+        return chain
+
+    def features(self, item) -> tuple:
+        words = tokens(item.title) | tokens(item.brand_title)
+        return (item.brand_id, self._catalogs(item.catalog_id), item.size_id, item.status_id,
+                _float(item.price), (item.currency or "").upper(), words)
+
+    def candidates(self, item, features=None) -> set:
+        features = features or self.features(item)
+        brand_id, catalogs, size_id, _, price, _, words = features
+        keys = [("b", brand_id), ("s", size_id)]
+        keys += [("c", c) for c in catalogs]
+        keys += [("t", w) for w in words]
+        if price is not None:
+            keys.append(("p", price_bucket(price)))
+        found = set(self._wildcard)
+        index = self._index
+        for key in keys:
+            hits = index.get(key)
+            if hits:
+                found.update(hits)
+        return found
+
+    def match(self, item) -> list:
+        """Subskrypcje (kolejność dodania), do których pasuje oferta."""
+        features = self.features(item)
+        found = self.candidates(item, features)
+        subs = self.subscriptions
+        matched = [subs[n] for n in sorted(found) if subs[n].matches(features)]
+        self.stats["matcher_items_total"] += 1
+        self.stats["matcher_candidates_total"] += len(found)
+        self.stats["matcher_matches_total"] += len(matched)
+        return matched
+
+    def match_linear(self, item) -> list:
+        """Pełny przegląd bez indeksu — punkt odniesienia (benchmark, testy)."""
+        features = self.features(item)
+        return [sub for sub in self.subscriptions if sub.matches(features)]
+
+    def get_metrics(self) -> dict:
+        metrics = dict(self.stats)
+        metrics["matcher_subscriptions"] = len(self.subscriptions)
+        metrics["matcher_skipped_subscriptions"] = len(self.skipped)
+        metrics["matcher_index_keys"] = len(self._index)
+        return metrics
@@ -0,0 +1,249 @@
+"""
+outbox.py - Trwała kolejka alertów w SQLite (zamiast queue.Queue w pamięci).
+WERSJA: 4.2 - Stany pending / sending / sent / failed, ponowienia z backoffem, replay po restarcie
+              + kolejność wg priorytetu (świeżość, okazja cenowa, priorytet zapytania, sprzedawca)
+
+Scraper dopisuje wpisy (enqueue) i skanuje dalej niezależnie od tempa wysyłki.
+Sender (src/sender.py) pobiera paczki `claim()` → stan sending, a po wysyłce
+oznacza je `complete()`: sent albo ponowna próba po backoffie; po
+`outbox_max_attempts` (config, domyślnie 5) wpis zostaje jako failed.
+Wpisy sending z przerwanego procesu wracają do pending przy starcie
+(`recover()`) — dostarczenie jest „co najmniej raz”.
+Stare sent / failed usuwa krok konserwacji (prune).
+
+Priorytet: każdy wpis dostaje wynik 0..1 (score) i wirtualny termin
+`due_at = created_at + alert_max_delay_seconds * (1 - score)` (config,
+domyślnie 60 s); claim() wydaje wpisy od najwcześniejszego terminu (EDF).
+Świeża okazja wyprzedza starszą ofertę po cenie rynkowej, ale wpis o
+najniższym wyniku czeka najwyżej alert_max_delay_seconds — później każdy
+nowy wpis ma termin późniejszy od niego (ochrona przed zagłodzeniem). Tabela żyje w bazie hot,
+więc w trybie tmpfs trwałość outboxa wyznacza interwał snapshotów (ramdisk.py).
+"""
+import json
+import threading
+import time
+import src.database as db
+from src.pyVinted.items.item import Item
+from src.logger import get_logger
+logger = get_logger("outbox")
+
+_BACKOFF_BASE = 5
+_BACKOFF_MAX = 300
+# ile godzin trzymać zakończone wpisy (podgląd / diagnostyka)
+_KEEP_SENT_HOURS = 24
+_KEEP_FAILED_HOURS = 7 * 24
+
+# wagi składników wyniku (suma = 1)
+_WEIGHTS = {"fresh": 0.35, "deal": 0.35, "query": 0.15, "seller": 0.15}
+# oferta starsza niż tyle sekund nie dostaje punktów za świeżość
+_FRESH_WINDOW = 600
+_MEDIANS_TTL = 600
+_medians = {"at": float("-inf"), "values": {}}
+
+# ustawiane przez enqueue — sender nie musi odpytywać bazy co chwilę
+wakeup = threading.Event()
+
+_stats = {
+    "outbox_enqueued_total": 0,
+    "outbox_duplicates_total": 0,
+    "outbox_sent_total": 0,
+    "outbox_retries_total": 0,
+    "outbox_failed_total": 0,
+    "outbox_overdue_total": 0,
+}
+
+
+def _encode(entry) -> str:
+    data = {k: v for k, v in entry.items() if not k.startswith("_")}
+    data["item"] = entry["item"].to_payload()
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(row_id, text) -> dict:
+    entry = json.loads(text)
+    entry["item"] = Item.from_payload(entry["item"])
+    entry["_outbox_id"] = row_id
+    return entry
+
+
+def _max_attempts() -> int:
+    try:
+        return max(1, int(db.get_config("outbox_max_attempts", "5")))
+    except ValueError:
+        return 5
+
+
+def _max_delay() -> float:
+    try:
+        return max(1.0, float(db.get_config("alert_max_delay_seconds", "60")))
+    except ValueError:
+        return 60.0
+
+
+def _typical_price(query_id):
+    now = time.monotonic()
+    if now - _medians["at"] >= _MEDIANS_TTL:
+        _medians["at"] = now
+        try:
+            _medians["values"] = db.get_query_price_medians()
+        except Exception as e:
+            logger.warning(f"Mediany cen niedostępne: {e}")
+    return _medians["values"].get(query_id)
+
+
+def score(entry, now=None) -> float:
+    """Priorytet wpisu 0..1 — wyższy wychodzi wcześniej."""
+    now = now or time.time()
+    item = entry["item"]
+    fresh = max(0.0, 1 - max(0, now - (item.raw_timestamp or now)) / _FRESH_WINDOW)
+    deal = 0.0
+    typical = _typical_price(entry.get("query_id"))
+    price = db._price_cents(item.price)
+    if typical and price > 0:
+        # połowa typowej ceny = pełne punkty
+        deal = min(1.0, max(0.0, (typical - price) / typical * 2))
+    try:
+        query = (min(5, max(1, int(entry.get("priority") or 3))) - 1) / 4
+    except (TypeError, ValueError):
+        query = 0.5
+    seller = 1.0 if entry.get("is_seller_item") else 0.0
+    return round(_WEIGHTS["fresh"] * fresh + _WEIGHTS["deal"] * deal
+                 + _WEIGHTS["query"] * query + _WEIGHTS["seller"] * seller, 4)
+
+
+def enqueue(entries) -> int:
+    """Zapisuje wpisy (jedna transakcja). Zwraca liczbę nowych."""
+    now = time.time()
+    max_delay = _max_delay()
+    rows = []
+    for e in entries:
+        priority = score(e, now)
+        rows.append((int(e["item"].id), int(e.get("query_id") or 0), _encode(e), now, now, now,
+                     now + max_delay * (1 - priority), priority))
+    if not rows:
+        return 0
+    with db._lock:
+        conn = db.get_connection()
+        try:
+            before = conn.total_changes
+            conn.executemany("""INSERT OR IGNORE INTO outbox
+                (vinted_id, query_id, entry, created_at, next_attempt_at, updated_at, due_at, priority)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+            added = conn.total_changes - before
+            conn.commit()
+        finally:
+            conn.close()
+    _stats["outbox_enqueued_total"] += added
+    _stats["outbox_duplicates_total"] += len(rows) - added
+    if added:
+        wakeup.set()
+    return added
+
+
+def claim(limit=100) -> list:
+    """Gotowe wpisy od najwcześniejszego terminu → stan sending. Zwraca wpisy (klucze `_outbox_id`, `_due_at`)."""
+    if limit <= 0:
+        return []
+    wakeup.clear()
+    now = time.time()
+    with db._lock:
+        conn = db.get_connection()
+        try:
+            rows = conn.execute("""SELECT id, entry, due_at FROM outbox
+                WHERE state = 'pending' AND next_attempt_at <= ? ORDER BY due_at LIMIT ?""",
+                (now, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET state = 'sending', updated_at = ? WHERE id = ?",
+                             [(now, r[0]) for r in rows])
+            conn.commit()
+        finally:
+            conn.close()
+    if len(rows) == limit:
+        wakeup.set()   # może być więcej gotowych
+    entries = []
+    for row_id, text, due_at in rows:
+        if due_at < now:
+            _stats["outbox_overdue_total"] += 1
+        try:
+            entry = _decode(row_id, text)
+            entry["_due_at"] = due_at
+            entries.append(entry)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Outbox #{row_id}: uszkodzony wpis ({e}) — oznaczam jako failed")
+            complete([], [(row_id, f"decode: {e}")], final=True)
+    return entries
+
+
+def complete(sent_ids, failed, final=False):
+    """sent_ids → sent; failed = [(id, błąd)] → ponowienie z backoffem albo failed po limicie prób."""
+    now = time.time()
+    max_attempts = _max_attempts()
+    with db._lock:
+        conn = db.get_connection()
+        try:
+            if sent_ids:
+                conn.executemany("UPDATE outbox SET state = 'sent', updated_at = ? WHERE id = ?",
+                                 [(now, i) for i in sent_ids])
+            for row_id, error in failed:
+                row = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (row_id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                if final or attempts >= max_attempts:
+                    conn.execute("""UPDATE outbox SET state = 'failed', attempts = ?, updated_at = ?,
+                        last_error = ? WHERE id = ?""", (attempts, now, error, row_id))
+                    _stats["outbox_failed_total"] += 1
+                else:
+                    delay = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** (attempts - 1))
+                    conn.execute("""UPDATE outbox SET state = 'pending', attempts = ?, updated_at = ?,
+                        next_attempt_at = ?, last_error = ? WHERE id = ?""",
+                        (attempts, now, now + delay, error, row_id))
+                    _stats["outbox_retries_total"] += 1
+            conn.commit()
+        finally:
+            conn.close()
+    _stats["outbox_sent_total"] += len(sent_ids)
+
+
+def recover() -> int:
+    """Wpisy sending z przerwanego procesu wracają do kolejki. Wołane raz przy starcie sendera."""
+    with db._lock:
+        conn = db.get_connection()
+        try:
+            moved = conn.execute("UPDATE outbox SET state = 'pending', updated_at = ? WHERE state = 'sending'",
+                                 (time.time(),)).rowcount
+            pending = conn.execute("SELECT COUNT(*) FROM outbox WHERE state = 'pending'").fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+    if pending:
+        logger.info(f"📮 Outbox: {pending} wpisów do wysłania po starcie ({moved} przerwanych w trakcie)")
+        wakeup.set()
+    return moved
+
+
+def prune() -> int:
+    now = time.time()
+    with db._lock:
+        conn = db.get_connection()
+        try:
+            deleted = conn.execute("""DELETE FROM outbox WHERE (state = 'sent' AND updated_at < ?)
+                OR (state = 'failed' AND updated_at < ?)""",
+                (now - _KEEP_SENT_HOURS * 3600, now - _KEEP_FAILED_HOURS * 3600)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+    return deleted
+
+
+def get_metrics() -> dict:
+    metrics = dict(_stats)
+    conn = db.get_connection()
+    try:
+        counts = dict(conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE state IN ('pending', 'sending')").fetchone()[0]
+    finally:
+        conn.close()
+    for state in ("pending", "sending", "failed"):
+        metrics[f"outbox_{state}"] = counts.get(state, 0)
+    metrics["outbox_oldest_age_seconds"] = round(time.time() - oldest, 1) if oldest else 0
+    return metrics
@@ -0,0 +1,185 @@
+"""
+price_watch.py - Obniżki cen na już widzianych ofertach, wykrywane z każdej odpowiedzi katalogu.
+WERSJA: 4.2 - Mapa id → ostatnia cena (grosze) w RAM + strumień alertów o obniżkach obok outboxa
+
+Dotąd check_price_drop działał tylko w core._prepare_entry, a tam trafiały
+wyłącznie nowe oferty — znane odpadały wcześniej na db.item_exists, więc
+alert o obniżce praktycznie nigdy nie wychodził. Teraz każda strona
+katalogu (ItemBatch w core._fetch_single_query_multi_url) aktualizuje mapę
+ostatnich cen ofert widzianych ostatnio (LRU, `_MAX_TRACKED`). Niższa cena
+znanej oferty to zdarzenie w strumieniu obniżek — bez dodatkowych żądań do
+Vinted i bez zapytań do bazy per oferta. Pierwsze zobaczenie oferty niczego
+nie wysyła (mapa startuje pusta, więc restart nie zalewa kanałów).
+
+W trybie firehose (src/firehose.py) strona strumienia domeny idzie przez
+observe_feed(): obniżka trafia do zapytania o najwyższym priorytecie,
+którego URL pasuje do oferty i którego reguły ją przepuszczają.
+
+Strumień to ograniczona kolejka w pamięci (przy przepełnieniu odpada
+najstarsze zdarzenie, po restarcie kolejka jest pusta); zadanie w pętli
+sendera wysyła embed obniżki na webhook / kanał zapytania przez
+discord_http — te same limity Discorda co tory outboxa. Obniżka trafia też
+do indeksu cen (db.check_price_drop → historia cen w panelu) — tylko stąd;
+outbox (core._prepare_entry) zapisuje wyłącznie pierwszą cenę nowej oferty.
+
+Config:
+  price_drop_min_percent   minimalna obniżka w % (domyślnie 0 = każda)
+"""
+import asyncio
+import threading
+from collections import OrderedDict, deque
+import src.database as db
+from src import discord_http
+from src.discord_bot import get_bot
+from src.discord_sender import build_price_drop_payload
+from src.pyVinted.items.item import Item
+from src.logger import get_logger
+logger = get_logger("price_watch")
+
+# ile ofert pamięta mapa cen (~100 B na wpis)
+_MAX_TRACKED = 50_000
+_QUEUE_MAX = 500
+
+_lock = threading.Lock()
+_last_price = OrderedDict()   # vinted_id (int) -> cena w groszach
+_queue = deque()
+_task = None
+_loop = None
+_wakeup = None   # asyncio.Event zadania wysyłki — budzone z wątków skanu przez call_soon_threadsafe
+_stats = {
+    "price_watch_observed_total": 0,
+    "price_watch_drops_total": 0,
+    "price_watch_sent_total": 0,
+    "price_watch_failed_total": 0,
+    "price_watch_overflow_total": 0,
+}
+
+
+def _min_percent() -> float:
+    try:
+        return max(0.0, float(db.get_config("price_drop_min_percent", "0")))
+    except ValueError:
+        return 0.0
+
+
+def observe(batch, query, predicate=None, known=None) -> int:
+    """Aktualizuje mapę cen stroną katalogu; obniżki idą do strumienia. Zwraca liczbę obniżek.
+
+    `known` — {id: grosze} z innego źródła (np. item_data przy ponownym
+    sprawdzeniu), używane gdy oferty nie ma już w mapie.
+    """
+    target = [(query, predicate)]
+    return observe_feed(batch, lambda item: target, known)
+
+
+def observe_feed(batch, route, known=None) -> int:
+    """Jak observe(), ale kandydatów daje `route(item) -> [(query, predicate)]` wg priorytetu (firehose)."""
+    min_percent = _min_percent()
+    drops = []
+    with _lock:
+        for n, (item_id, cents) in enumerate(zip(batch.ids, batch.prices)):
+            if cents <= 0:
+                continue
+            old = _last_price.get(item_id)
+            if old is None and known:
+                old = known.get(item_id)
+            _last_price[item_id] = cents
+            if old is None:
+                continue
+            _last_price.move_to_end(item_id)
+            if cents < old and (old - cents) * 100 >= old * min_percent:
+                drops.append((n, old, cents))
+        while len(_last_price) > _MAX_TRACKED:
+            _last_price.popitem(last=False)
+        _stats["price_watch_observed_total"] += len(batch.ids)
+    sent = 0
+    for n, old, cents in drops:
+        item = Item(batch.raw[n], domain=batch.domain)
+        # reguły liczone od nowa dla nowej ceny — obniżka może właśnie zmieścić ofertę w max_total_price
+        # (ocena sprzedawcy — jak przed enrichmentem); jedna obniżka = jeden alert
+        for query, predicate in route(item):
+            if predicate and not predicate(item):
+                continue
+            _emit(item, old, cents, query)
+            sent += 1
+            break
+    return sent
+
+
+def _emit(item, old_cents, cents, query):
+    old_price, drop_amount = old_cents / 100, (old_cents - cents) / 100
+    try:
+        db.check_price_drop(str(item.id), item.title, item.brand_title, item.price, item.currency,
+                            item.size_title, item.url, item.photo, item.user_id, item.user_login)
+    except Exception as e:
+        logger.debug(f"Indeks cen ({item.id}): {e}")
+    if len(_queue) >= _QUEUE_MAX:
+        _queue.popleft()
+        _stats["price_watch_overflow_total"] += 1
+    _queue.append({
+        "item": item, "old_price": old_price, "drop_amount": drop_amount,
+        "query_name": query.get("name", ""), "webhook_url": query.get("discord_webhook_url", ""),
+        "channel_id": query.get("discord_channel_id", ""),
+    })
+    _stats["price_watch_drops_total"] += 1
+    if _loop is not None:
+        try:
+            _loop.call_soon_threadsafe(_wakeup.set)
+        except RuntimeError:
+            pass   # pętla sendera już zamknięta — zdarzenie poczeka w kolejce
+    logger.info(f"💰 PRICE DROP: {item.title} {old_price:.2f} → {item.price} {item.currency} [{query.get('name')}]")
+    db.add_log("SUCCESS", "price_drop", f"💰 {item.title} -{drop_amount:.2f}{item.currency}")
+
+
+def _route(event) -> tuple:
+    bot = get_bot()
+    if bot.enabled and event["channel_id"]:
+        return bot.messages_url(event["channel_id"]), bot.token
+    return event["webhook_url"], None
+
+
+async def _worker():
+    while True:
+        _wakeup.clear()
+        if not _queue:
+            await _wakeup.wait()
+            continue
+        event = _queue.popleft()
+        try:
+            url, bot_token = _route(event)
+            if not url:
+                raise ValueError("zapytanie bez webhooka i kanału")
+            payload = build_price_drop_payload(event["item"], event["drop_amount"], event["old_price"])
+            result = await discord_http.request("POST", url, payload, bot_token=bot_token)
+            _stats["price_watch_sent_total" if result is not None else "price_watch_failed_total"] += 1
+        except Exception as e:
+            _stats["price_watch_failed_total"] += 1
+            logger.error(f"Alert obniżki {event['item'].id}: {e}")
+
+
+def start():
+    """Zadanie wysyłki strumienia obniżek (w pętli sendera)."""
+    global _task, _loop, _wakeup
+    if _task is None or _task.done():
+        _wakeup = asyncio.Event()
+        _loop = asyncio.get_running_loop()
+        _task = asyncio.create_task(_worker(), name="price-watch")
+
+
+async def stop():
+    global _task, _loop
+    _loop = None
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    if _queue:
+        logger.warning(f"Strumień obniżek zatrzymany — {len(_queue)} alertów pominiętych")
+        _queue.clear()
+
+
+def get_metrics() -> dict:
+    metrics = dict(_stats)
+    metrics["price_watch_tracked"] = len(_last_price)
+    metrics["price_watch_queue_depth"] = len(_queue)
+    return metrics
@@ -1,4 +1,5 @@
 from .items import Items
 from .item import Item
+from .batch import ItemBatch
 
-__all__ = ["Items", "Item"]
+__all__ = ["Items", "Item", "ItemBatch"]
@@ -0,0 +1,104 @@
+"""
+batch.py - Kolumnowa reprezentacja strony ofert (struct-of-arrays) dla tanich filtrów scrapera.
+WERSJA: 4.2 - Okno nowości / watermark / cena / widziane id jako maski list, Item tylko dla ocalałych
+
+Strona katalogu to zwykle 10–96 ofert, z których nowych jest kilka. Zamiast
+budować pełny `Item` (zdjęcia, linki, sprzedawca, datetime) dla każdej,
+`ItemBatch.from_json()` wyciąga z surowego JSON-a tylko kolumny potrzebne
+filtrom: id, timestamp i cenę w groszach/centach. Maski łączy się `both()`,
+a `items()` tworzy obiekty `Item` wyłącznie dla ofert, które przeszły
+wszystkie maski.
+
+Kolumny i maski to zwykłe listy. Wariant NumPy był mierzony
+(benchmarks/batch_bench.py): przy ≤ 96 ofertach na stronę koszt konwersji
+zjadał zysk z wektoryzacji, a cały zysk daje późne tworzenie `Item`.
+"""
+import time
+from .item import Item
+
+_NO_PRICE = -1
+
+
+def _cents(price) -> int:
+    amount = price.get("amount") if isinstance(price, dict) else price
+    try:
+        return int(round(float(amount) * 100))
+    except (TypeError, ValueError):
+        return _NO_PRICE
+
+
+class ItemBatch:
+    __slots__ = ("raw", "domain", "ids", "timestamps", "prices")
+
+    def __init__(self, raw, domain, ids, timestamps, prices):
+        self.raw = raw
+        self.domain = domain
+        self.ids = ids
+        self.timestamps = timestamps
+        self.prices = prices
+
+    @classmethod
+    def from_json(cls, raw_items, domain: str = "pl") -> "ItemBatch":
+        """Kolumny z listy `items` odpowiedzi API (bez tworzenia obiektów Item)."""
+        raw = list(raw_items or [])
+        extract = Item._extract_timestamp
+        return cls(raw, domain, [int(data["id"]) for data in raw], [extract(data) for data in raw],
+                   [_cents(data.get("price")) for data in raw])
+
+    def __len__(self):
+        return len(self.raw)
+
+    # --- maski ---
+
+    def fresh(self, minutes: int, now=None):
+        """Jak Item.is_new_item(): wystawione mniej niż `minutes` minut temu."""
+        cutoff = (time.time() if now is None else now) - minutes * 60
+        return [ts > cutoff for ts in self.timestamps]
+
+    def after(self, watermark: int):
+        """Nowsze niż watermark (0 = bez watermarku)."""
+        if not watermark:
+            return self.everything()
+        return [ts > watermark for ts in self.timestamps]
+
+    def price_between(self, low_cents=None, high_cents=None):
+        """Cena w zakresie [low, high] (w groszach/centach); nieczytelna cena odpada, gdy podano zakres."""
+        if low_cents is None and high_cents is None:
+            return self.everything()
+        low = 0 if low_cents is None else low_cents
+        return [p >= low and (high_cents is None or p <= high_cents) for p in self.prices]
+
+    def unseen(self, seen_ids):
+        """Id spoza zbioru (np. już zakolejkowane); elementy zbioru mogą być str albo int."""
+        seen_ids = tuple(seen_ids)   # kopia — zbiór może rosnąć w innych wątkach scrapera
+        if not seen_ids:
+            return self.everything()
+        seen = {int(i) for i in seen_ids}
+        return [i not in seen for i in self.ids]
+
+    def everything(self):
+        return [True] * len(self.raw)
+
+    @staticmethod
+    def both(*masks):
+        return [all(flags) for flags in zip(*masks)]
+
+    @staticmethod
+    def inverse(mask):
+        return [not keep for keep in mask]
+
+    @staticmethod
+    def count(mask) -> int:
+        return sum(mask)
+
+    # --- ocalałe oferty ---
+
+    @staticmethod
+    def indices(mask) -> list:
+        return [n for n, keep in enumerate(mask) if keep]
+
+    def items(self, mask=None) -> list:
+        """Obiekty Item tylko dla ofert z maski (kolejność jak w odpowiedzi API)."""
+        if mask is None:
+            return [Item(data, domain=self.domain) for data in self.raw]
+        return [Item(self.raw[n], domain=self.domain) for n in self.indices(mask)]
@@ -10,6 +10,7 @@ class Item:
         'user_id', 'user_login', 'user_country', 'user_url',
         'feedback_count', 'feedback_score', 'country_flag',
         'total_price', 'domain', 'is_hidden',
+        'brand_id', 'catalog_id', 'size_id',
     )
 
     STATUS_MAP = {
@@ -49,6 +50,12 @@ class Item:
             size_raw.get("title", "—") if isinstance(size_raw, dict) else (size_raw or "—")
         )
 
+        # Id marki / kategorii / rozmiaru (lokalne dopasowanie — src/matcher.py); None gdy API ich nie podało
+        brand_raw = data.get("brand")
+        self.brand_id   = self._int_or_none(data.get("brand_id") or (brand_raw.get("id") if isinstance(brand_raw, dict) else None))
+        self.catalog_id = self._int_or_none(data.get("catalog_id"))
+        self.size_id    = self._int_or_none(data.get("size_id") or (size_raw.get("id") if isinstance(size_raw, dict) else None))
+
         # Cena
         price_data = data.get("price", {})
         if isinstance(price_data, dict):
@@ -145,6 +152,29 @@ class Item:
         # Cena łączna (z ochroną kupującego: ~6% + 0.30)
         self.total_price = self._calculate_total()
 
+    def to_payload(self) -> dict:
+        """Słownik JSON-owalny (outbox) — from_payload() odtwarza obiekt bez ponownego parsowania API."""
+        payload = {name: getattr(self, name) for name in self.__slots__ if name != "created_at_ts"}
+        payload["photos"] = list(self.photos)
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "Item":
+        item = cls.__new__(cls)
+        for name in cls.__slots__:
+            if name != "created_at_ts":
+                setattr(item, name, payload.get(name))
+        item.photos = list(item.photos or [])
+        item.created_at_ts = datetime.fromtimestamp(item.raw_timestamp, tz=timezone.utc)
+        return item
+
+    @staticmethod
+    def _int_or_none(value):
+        try:
+            return int(value) if value not in (None, "") else None
+        except (ValueError, TypeError):
+            return None
+
     def _extract_photos(self, data: dict) -> List[str]:
         photos = []
         for p in data.get("photos", [])[:3]:
@@ -158,7 +188,8 @@ class Item:
                 photos.append(main["url"])
         return photos[:3]
 
-    def _extract_timestamp(self, data: dict) -> int:
+    @staticmethod
+    def _extract_timestamp(data: dict) -> int:
         if data.get("created_at_ts"):
             return int(data["created_at_ts"])
         photo = data.get("photo", {})
@@ -168,13 +199,22 @@ class Item:
                 return int(hr["timestamp"])
         return int(datetime.now(tz=timezone.utc).timestamp())
 
-    def _calculate_total(self) -> str:
+    def total_amount(self):
+        """Cena z ochroną kupującego (~6% + 0.30) jako liczba; None gdy cena nieczytelna."""
         try:
-            p     = float(self.price)
-            total = p + p * 0.06 + 0.30
-            return f"≈ {total:.2f} {self.currency}"
+            p = float(self.price)
         except (ValueError, TypeError):
-            return "—"
+            return None
+        return p + p * 0.06 + 0.30
+
+    @staticmethod
+    def price_for_total(total: float) -> float:
+        """Odwrotność total_amount(): najwyższa cena, której cena łączna nie przekracza `total`."""
+        return (total - 0.30) / 1.06
+
+    def _calculate_total(self) -> str:
+        total = self.total_amount()
+        return f"≈ {total:.2f} {self.currency}" if total is not None else "—"
 
     def get_stars(self) -> str:
         """
@@ -0,0 +1,135 @@
+"""
+ramdisk.py - Bazy robocze w RAM (tmpfs) + snapshoty na kartę SD.
+WERSJA: 4.2 - Online backup API, zapis atomowy (tmp + fsync + os.replace)
+
+Włączane zmienną środowiskową VINTED_DB_MODE=tmpfs (patrz database.py):
+  VINTED_DB_RAM_DIR    katalog w RAM, domyślnie /dev/shm/vinted-db
+  VINTED_DB_RAM_FILES  które bazy trzymać w RAM, domyślnie "hot,logs"
+
+Zapisy idą wyłącznie do plików w RAM. Co `snapshot_interval_seconds`
+(config, domyślnie 300 s — to jest maksymalne okno utraty danych po
+awarii zasilania) oraz przy zatrzymaniu procesu kopia trafia do data/
+pod tą samą nazwą co w trybie disk, więc przełączanie trybów nie wymaga
+migracji. Po restarcie systemu (pusty tmpfs) bazy są odtwarzane z data/;
+po samym restarcie procesu plik w RAM jest nowszy i zostaje.
+"""
+import os
+import sqlite3
+import time
+import src.database as db
+from src.logger import get_logger
+logger = get_logger("ramdisk")
+
+_stats = {
+    "snapshots_total": 0,
+    "snapshot_errors_total": 0,
+    "snapshot_last_ms": 0.0,
+}
+_last_snapshot = None
+
+def _snapshot_path(name):
+    return os.path.join(db.DATA_DIR, db.DB_FILES[name])
+
+def _remove_sidecars(path):
+    """Stary -wal/-shm obok nowego pliku zostałby odtworzony na nim przy otwarciu."""
+    for ext in ("-wal", "-shm", "-journal"):
+        try:
+            os.remove(path + ext)
+        except FileNotFoundError:
+            pass
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _copy(src_path, dst_path):
+    """Spójna kopia przez backup API (czytelnik WAL — nie blokuje writerów)."""
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst)
+        # snapshot jako samodzielny plik bez WAL
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+def restore_all() -> list:
+    """Odtwarza z data/ bazy, których nie ma w RAM. Zwraca nazwy odtworzonych."""
+    os.makedirs(db.RAM_DIR, exist_ok=True)
+    restored = []
+    for name in db.RAM_RESIDENT:
+        work = db._work_path(name)
+        if os.path.exists(work):
+            logger.info(f"💾 [{name}] baza w RAM już istnieje ({work}) — bez odtwarzania")
+            continue
+        _remove_sidecars(work)
+        snap = _snapshot_path(name)
+        if not os.path.exists(snap):
+            logger.info(f"💾 [{name}] brak snapshotu — nowa baza w RAM")
+            continue
+        started = time.monotonic()
+        _copy(snap, work)
+        restored.append(name)
+        logger.info(f"💾 [{name}] odtworzono z {snap} "
+                    f"({os.path.getsize(work) // 1024} KB, {(time.monotonic() - started) * 1000:.0f} ms)")
+    return restored
+
+def snapshot_all(reason="interval") -> list:
+    """Kopiuje bazy z RAM do data/ atomowo. Zwraca nazwy zapisanych."""
+    global _last_snapshot
+    if not db.RAM_RESIDENT:
+        return []
+    if "analytics" in db.RAM_RESIDENT:
+        db.flush_price_tracking()
+    started = time.monotonic()
+    saved = []
+    for name in db.RAM_RESIDENT:
+        work = db._work_path(name)
+        if not os.path.exists(work):
+            continue
+        final = _snapshot_path(name)
+        tmp = final + ".snapshot-tmp"
+        try:
+            _remove_sidecars(tmp)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            _copy(work, tmp)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            _remove_sidecars(final)
+            os.replace(tmp, final)
+            saved.append(name)
+        except (sqlite3.Error, OSError) as e:
+            _stats["snapshot_errors_total"] += 1
+            logger.error(f"Snapshot [{name}] nieudany: {e}")
+    _fsync_dir(db.DATA_DIR)
+    if saved:
+        _stats["snapshots_total"] += 1
+        _stats["snapshot_last_ms"] = round((time.monotonic() - started) * 1000, 1)
+        _last_snapshot = time.monotonic()
+        logger.debug(f"Snapshot ({reason}): {', '.join(saved)} w {_stats['snapshot_last_ms']} ms")
+    return saved
+
+def snapshot_interval() -> float:
+    try:
+        return max(10.0, float(db.get_config("snapshot_interval_seconds", "300")))
+    except ValueError:
+        return 300.0
+
+def get_metrics() -> dict:
+    if not db.RAM_RESIDENT:
+        return {}
+    metrics = dict(_stats)
+    metrics["snapshot_age_seconds"] = (
+        round(time.monotonic() - _last_snapshot, 1) if _last_snapshot is not None else -1
+    )
+    return metrics
@@ -0,0 +1,244 @@
+"""
+recheck.py - Ponowne sprawdzanie wysłanych ofert w tle: obniżki cen, sprzedaż, ukrycie, usunięcie.
+WERSJA: 4.2 - Harmonogram wg szansy zmiany (świeżość, sprzedawca obniżający ceny, cena przy limicie) + osobny budżet żądań
+
+Skan katalogu widzi ofertę tylko, dopóki mieści się na pierwszej stronie
+wyników — później obniżka, sprzedaż czy ukrycie przechodzą bez echa, a
+indeks cen trzyma martwe tracki. Ten moduł odpytuje endpoint szczegółów
+(/api/v2/items/<id>, core._fetch_item_detail) dla ofert z item_data
+wysłanych w ostatnich `recheck_max_age_hours` godzinach.
+
+Kolejność: kopiec wg terminu następnego sprawdzenia. Bazowy odstęp
+(`recheck_base_minutes`) dzielą czynniki szansy zmiany:
+  - świeżość — do 4× częściej w pierwszych godzinach po wystawieniu,
+  - sprzedawca, który już obniżał ceny (price_tracking.price_drops > 0) — 2×,
+  - cena ≥ 80% limitu zapytania (price_to z URL-a, max_total_price) — do 2×,
+  - ukryte oferty — 4× rzadziej.
+
+Budżet jest osobny od skanera: kubełek żetonów `recheck_requests_per_minute`
+(0 = wyłączone). Sprawdzenia czekają, gdy trwa skan, a po HTTP 429 stoją
+`_PAUSE_ON_429` sekund. Gdy budżet nie nadąża, najpierw idą najbardziej
+zaległe oferty (metryka recheck_overdue).
+
+Wynik: 404/410 → deleted, zamknięta → sold (track ceny dezaktywowany,
+oferta wypada z harmonogramu), is_hidden → hidden, inaczej active — niższa
+cena aktywnej oferty trafia do strumienia obniżek (src/price_watch.py).
+
+Config:
+  recheck_requests_per_minute  żądań szczegółów na minutę (domyślnie 4, 0 = wyłączone)
+  recheck_base_minutes         bazowy odstęp sprawdzeń jednej oferty (domyślnie 60)
+  recheck_max_age_hours        jak długo po wystawieniu oferta jest sprawdzana (domyślnie 72)
+"""
+import heapq
+import random
+import threading
+import time
+import src.database as db
+from src import core, filters, maintenance, price_watch
+from src.config import extract_domain_from_url
+from src.matcher import Subscription
+from src.pyVinted.items import Item, ItemBatch
+from src.logger import get_logger
+logger = get_logger("recheck")
+
+_RELOAD_INTERVAL = 300
+_MIN_INTERVAL = 5 * 60
+_MAX_INTERVAL = 24 * 3600
+_RECENCY_HALF_LIFE = 6 * 3600
+_BURST = 3
+_PAUSE_ON_429 = 300
+
+
+class _Entry:
+    __slots__ = ("vinted_id", "query_id", "listed_ts", "cents", "user_id", "domain", "state", "seq")
+
+    def __init__(self, row):
+        self.vinted_id = row["vinted_id"]
+        self.query_id = row["query_id"]
+        self.listed_ts = row["timestamp"] or 0
+        self.cents = row["price_cents"] or 0
+        self.user_id = row["user_id"]
+        self.domain = extract_domain_from_url(row["item_url"] or "")
+        self.state = row["listing_state"]
+        self.seq = 0
+
+
+_lock = threading.Lock()
+_entries = {}       # vinted_id -> _Entry
+_heap = []          # (termin, seq, vinted_id) — wpisy z nieaktualnym seq są pomijane
+_seq = 0
+_discounting = set()
+_caps = {}          # query_id -> limit ceny w groszach
+_last_reload = float("-inf")
+_tokens = 0.0
+_last_refill = None
+_paused_until = 0.0
+_stats = {
+    "recheck_requests_total": 0,
+    "recheck_errors_total": 0,
+    "recheck_rate_limited_total": 0,
+    "recheck_sold_total": 0,
+    "recheck_deleted_total": 0,
+    "recheck_hidden_total": 0,
+    "recheck_price_drops_total": 0,
+}
+
+
+def _int_config(key, default) -> int:
+    try:
+        return max(0, int(db.get_config(key, str(default))))
+    except ValueError:
+        return default
+
+
+def requests_per_minute() -> int:
+    return _int_config("recheck_requests_per_minute", 4)
+
+
+def classify(data) -> str:
+    """Stan oferty z odpowiedzi endpointu szczegółów."""
+    if data.get("is_closed") or data.get("item_closing_action") == "sold":
+        return "deleted" if data.get("item_closing_action") not in (None, "", "sold") else "sold"
+    if data.get("is_hidden"):
+        return "hidden"
+    return "active"
+
+
+def _price_cap(query) -> int:
+    """Najniższy limit ceny zapytania w groszach (price_to z URL-i, max_total_price); 0 = brak."""
+    caps = []
+    for u in query.get("urls", []):
+        sub = Subscription(query["id"], u["url"] if isinstance(u, dict) else u)
+        if sub.price_to:
+            caps.append(sub.price_to)
+    predicate = filters.for_query(query)
+    max_total = predicate.rules.get("max_total_price") if predicate else None
+    if max_total:
+        caps.append(Item.price_for_total(max_total))
+    return int(min(caps) * 100) if caps else 0
+
+
+def interval_for(entry, now) -> float:
+    """Odstęp do następnego sprawdzenia — krótszy, im większa szansa zmiany."""
+    factor = 1 + 3 * 0.5 ** (max(0, now - entry.listed_ts) / _RECENCY_HALF_LIFE)
+    if entry.user_id and entry.user_id in _discounting:
+        factor *= 2
+    cap = _caps.get(entry.query_id)
+    if cap and entry.cents > 0 and entry.cents >= cap * 0.8:
+        factor *= 1 + min(1.0, (entry.cents / cap - 0.8) * 5)
+    if entry.state == "hidden":
+        factor *= 0.25
+    base = _int_config("recheck_base_minutes", 60) * 60 or 3600
+    return min(_MAX_INTERVAL, max(_MIN_INTERVAL, base / factor))
+
+
+def _schedule(entry, due):
+    global _seq
+    _seq += 1
+    entry.seq = _seq
+    heapq.heappush(_heap, (due, _seq, entry.vinted_id))
+
+
+def _reload(now):
+    """Pula ofert z item_data + sprzedawcy obniżający ceny + limity cen zapytań."""
+    global _discounting, _caps, _last_reload
+    _last_reload = now
+    max_age = _int_config("recheck_max_age_hours", 72) * 3600
+    rows = db.get_recheck_candidates(now - max_age)
+    _discounting = db.get_discounting_sellers()
+    _caps = {q["id"]: _price_cap(q) for q in db.get_queries_snapshot(active_only=False)}
+    fresh = {}
+    for row in rows:
+        entry = _entries.get(row["vinted_id"])
+        if entry is None:
+            entry = _Entry(row)
+            # pierwsze sprawdzenie rozłożone w czasie — bez serii żądań po restarcie
+            _schedule(entry, now + interval_for(entry, now) * random.uniform(0.1, 1.0))
+        fresh[entry.vinted_id] = entry
+    _entries.clear()
+    _entries.update(fresh)
+    if len(_heap) > 2 * len(_entries) + 100:
+        _heap[:] = [(due, seq, vid) for due, seq, vid in _heap if vid in _entries and _entries[vid].seq == seq]
+        heapq.heapify(_heap)
+
+
+def _check(entry, now) -> bool:
+    """Jedno sprawdzenie; False = rate limit (przerwij serię)."""
+    global _paused_until
+    status, data = core._fetch_item_detail(entry.vinted_id, entry.domain)
+    _stats["recheck_requests_total"] += 1
+    if status == 429:
+        _stats["recheck_rate_limited_total"] += 1
+        _paused_until = now + _PAUSE_ON_429
+        _schedule(entry, now + _PAUSE_ON_429)
+        logger.warning(f"⏸️ Recheck: rate limit Vinted — przerwa {_PAUSE_ON_429}s")
+        return False
+    if status in (404, 410):
+        state = "deleted"
+    elif status != 200 or not data:
+        _stats["recheck_errors_total"] += 1
+        _schedule(entry, now + interval_for(entry, now))
+        return True
+    else:
+        state = classify(data)
+    db.set_listing_state(entry.vinted_id, state)
+    if state in ("sold", "deleted"):
+        _stats[f"recheck_{state}_total"] += 1
+        _entries.pop(entry.vinted_id, None)
+        logger.info(f"🏷️ Oferta {entry.vinted_id}: {state}")
+        return True
+    if state == "hidden" and entry.state != "hidden":
+        _stats["recheck_hidden_total"] += 1
+    entry.state = state
+    if state == "active":
+        _check_price(entry, data)
+    _schedule(entry, now + interval_for(entry, now))
+    return True
+
+
+def _check_price(entry, data):
+    query = next((q for q in db.get_queries_snapshot(active_only=False) if q["id"] == entry.query_id), None)
+    batch = ItemBatch.from_json([data], entry.domain)
+    cents = batch.prices[0]
+    if query is not None and cents > 0:
+        drops = price_watch.observe(batch, query, filters.for_query(query), known={entry.vinted_id: entry.cents})
+        _stats["recheck_price_drops_total"] += drops
+    if cents > 0:
+        entry.cents = int(cents)
+
+
+def run_once(now=None) -> int:
+    """Sprawdza oferty, których termin minął, w granicach budżetu. Zwraca liczbę sprawdzeń."""
+    global _tokens, _last_refill
+    rate = requests_per_minute()
+    if rate <= 0:
+        return 0
+    now = time.time() if now is None else now
+    with _lock:
+        if now - _last_reload >= _RELOAD_INTERVAL:
+            _reload(now)
+        if _last_refill is not None:
+            _tokens = min(_BURST, _tokens + max(0.0, now - _last_refill) * rate / 60)
+        _last_refill = now
+        if now < _paused_until or maintenance.scan_running():
+            return 0
+        done = 0
+        while _tokens >= 1 and _heap and _heap[0][0] <= now:
+            due, seq, vid = heapq.heappop(_heap)
+            entry = _entries.get(vid)
+            if entry is None or entry.seq != seq:
+                continue
+            _tokens -= 1
+            done += 1
+            if not _check(entry, now):
+                break
+        return done
+
+
+def get_metrics() -> dict:
+    metrics = dict(_stats)
+    now = time.time()
+    metrics["recheck_tracked"] = len(_entries)
+    metrics["recheck_overdue"] = sum(1 for due, seq, vid in list(_heap)
+                                     if due <= now and getattr(_entries.get(vid), "seq", None) == seq)
+    return metrics
@@ -0,0 +1,141 @@
+"""
+retention.py - Retencja i archiwizacja items / price_tracking / logs.
+WERSJA: 4.2 - Paczki do data/archive/*.jsonl.gz, dedup w seen_items
+
+Wiersze starsze niż polityka danej tabeli są przenoszone paczkami
+(najpierw zapis do archiwum + fsync, potem DELETE), więc tabele robocze
+pozostają małe. Archiwum to gzip JSONL — jeden plik na tabelę i miesiąc,
+dopisywany kolejnymi członami gzip (zgodne z `zcat`).
+
+Polityki (tabela config, w dniach; 0 = wyłączone):
+  retention_items_days           domyślnie 30
+  retention_price_tracking_days  domyślnie 30 (od ostatniej zmiany ceny)
+  retention_logs_days            domyślnie 7
+  retention_dedup_days           domyślnie 90 (jak długo seen_items blokuje duplikaty)
+"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timezone
+import src.database as db
+from src.logger import get_logger
+logger = get_logger("retention")
+
+ARCHIVE_DIR = os.path.join(db.DATA_DIR, "archive")
+CHUNK_SIZE = 500
+
+# tabela -> (klucz config, domyślne dni, warunek wieku, parametr progu, baza)
+_POLICIES = {
+    "items": ("retention_items_days", 30, "timestamp < ?", lambda cutoff: int(cutoff), "hot"),
+    "price_tracking": ("retention_price_tracking_days", 30, "updated_at < ?", lambda cutoff: _sql_ts(cutoff), "analytics"),
+    "logs": ("retention_logs_days", 7, "timestamp < ?", lambda cutoff: _sql_ts(cutoff), "logs"),
+}
+# `items` to widok (czytelny wiersz do archiwum) — kasujemy z tabeli pod spodem
+_DELETE_FROM = {"items": "item_data WHERE vinted_id = ?"}
+
+
+def _sql_ts(unix_ts):
+    return datetime.fromtimestamp(unix_ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def _archive_path(table):
+    return os.path.join(ARCHIVE_DIR, f"{table}-{datetime.now(timezone.utc):%Y-%m}.jsonl.gz")
+
+def _write_segment(table, rows):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = _archive_path(table)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for row in rows:
+                gz.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode() + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    return path
+
+def _attach_history(conn, rows):
+    """Dokleja historię cen do archiwizowanych tracków (znika razem z nimi)."""
+    for row in rows:
+        row["history"] = [tuple(r) for r in conn.execute(
+            "SELECT ts, price_cents FROM price_history WHERE track_id = ? ORDER BY ts", (row["id"],))]
+        row["history_daily"] = [tuple(r) for r in conn.execute(
+            "SELECT day, min_cents, max_cents FROM price_history_daily WHERE track_id = ? ORDER BY day",
+            (row["id"],))]
+
+def _archive_table(table, condition, threshold, database, deadline=None):
+    connect, lock = db._DATABASES[database]
+    moved = 0
+    while deadline is None or time.monotonic() < deadline:
+        conn = connect()
+        try:
+            rows = [dict(r) for r in conn.execute(
+                f"SELECT * FROM {table} WHERE {condition} LIMIT ?", (threshold, CHUNK_SIZE))]
+            if not rows:
+                return moved
+            if table == "price_tracking":
+                _attach_history(conn, rows)
+        finally:
+            conn.close()
+        _write_segment(table, rows)
+        ids = [(r["id"],) for r in rows]
+        with lock:
+            conn = connect()
+            try:
+                delete = _DELETE_FROM.get(table, f"{table} WHERE id = ?")
+                conn.executemany(f"DELETE FROM {delete}", ids)
+                if table == "price_tracking":
+                    conn.executemany("DELETE FROM price_history WHERE track_id = ?", ids)
+                    conn.executemany("DELETE FROM price_history_daily WHERE track_id = ?", ids)
+                conn.commit()
+            finally:
+                conn.close()
+        if table == "price_tracking":
+            db.forget_price_tracks(r["item_hash"] for r in rows)
+        moved += len(rows)
+        if len(rows) < CHUNK_SIZE:
+            return moved
+    return moved
+
+def _prune_dedup(days):
+    cutoff = int(time.time()) - days * 86400
+    with db._lock:
+        conn = db.get_connection()
+        try:
+            deleted = conn.execute("""DELETE FROM seen_items WHERE seen_at < ?
+                AND NOT EXISTS (SELECT 1 FROM item_data d WHERE d.vinted_id = seen_items.vinted_id)""",
+                (cutoff,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+    return deleted
+
+def run_retention(budget=None) -> dict:
+    """Przenosi przeterminowane wiersze do archiwum. Zwraca {tabela: liczba}.
+
+    Z `budget` (sekundy) kolejne paczki nie są zaczynane po upływie limitu —
+    reszta zostanie przeniesiona przy następnym przebiegu.
+    """
+    deadline = time.monotonic() + budget if budget else None
+    stats = {}
+    now = time.time()
+    db.flush_price_tracking()
+    for table, (key, default_days, condition, to_param, database) in _POLICIES.items():
+        try:
+            days = int(db.get_config(key, str(default_days)) or 0)
+        except ValueError:
+            days = default_days
+        if days <= 0:
+            continue
+        try:
+            stats[table] = _archive_table(table, condition, to_param(now - days * 86400), database, deadline)
+        except Exception as e:
+            logger.error(f"Archiwizacja {table} nieudana: {e}")
+    try:
+        dedup_days = int(db.get_config("retention_dedup_days", "90") or 0)
+    except ValueError:
+        dedup_days = 90
+    if dedup_days > 0:
+        stats["seen_items_pruned"] = _prune_dedup(dedup_days)
+    moved = {k: v for k, v in stats.items() if v}
+    if moved:
+        logger.info(f"🗄️ Retencja: {moved}")
+    return stats
@@ -0,0 +1,259 @@
+"""
+sender.py - Równoległa wysyłka alertów: osobny tor (lane) na webhook / kanał bota.
+WERSJA: 4.2 - Tory asyncio, tempo z nagłówków X-RateLimit-* (discord_ratelimit)
+              + pakowanie serii (okno burst) w jedną wiadomość do 10 embedów
+              + wysyłka przez async klienta discord_http (bez wątku na POST)
+              + źródło: trwały outbox w SQLite (src/outbox.py)
+              + fan-out nowych ofert do dodatkowych sinków (src/sinks.py)
+              + strumień obniżek cen znanych ofert (src/price_watch.py)
+
+Dispatcher pobiera gotowe wpisy z outboxa (outbox.claim — od najwyższego
+priorytetu, najwyżej `_MAX_HELD` naraz w torach) i przenosi je do toru
+trasy, na którą trafi wiadomość (URL webhooka albo /channels/{id}/messages
+bota). Każdy tor to osobne zadanie asyncio z własną kolejką priorytetową
+(due_at z outboxa), a kanał czekający na reset swojego bucketu nie wstrzymuje
+innych.
+Część bazodanowa (core.plan_batch / finish_batch) idzie do wątków, same
+POST-y są awaitowane na wspólnym kliencie discord_http.
+Przed wysyłką tor odczekuje (asyncio.sleep) tyle, ile wynika z ostatnich
+nagłówków bucketu, więc 429 zdarza się tylko przy nieznanym jeszcze stanie.
+
+Wpisy, które trafiły do toru w oknie `sender_burst_window_ms` od pierwszego
+(oraz te, które doszły w trakcie czekania na bucket), wychodzą jedną
+wiadomością zwartych embedów (core.process_batch) — seria 15 ofert to 2
+wywołania HTTP zamiast 15. Wynik serii wraca do outboxa (core.settle_outbox).
+Nowe oferty z serii trafiają też do sinków (ntfy, HTTP, plik JSONL, inne
+kanały Discorda) — każdy ma własną kolejkę i zadania, więc nie spowalnia torów.
+
+Config:
+  sender_max_parallel      ile torów jednocześnie pracuje na bazie (wątki), domyślnie 4
+  sender_burst_window_ms   okno zbierania serii, domyślnie 300 (0 = bez pakowania)
+"""
+import asyncio
+import itertools
+import time
+import src.database as db
+from src import discord_http, outbox, price_watch, sinks
+from src.discord_sender import MAX_EMBEDS_PER_MESSAGE
+from src.discord_bot import get_bot
+from src.discord_ratelimit import discord_limits
+from src.logger import get_logger
+logger = get_logger("sender")
+
+# tor bez wpisów dłużej niż tyle sekund jest zamykany
+_LANE_IDLE_SECONDS = 300
+_POLL_INTERVAL = 0.05
+# ponowienia z backoffem nie budzą dispatchera — outbox sprawdzany co tyle sekund
+_RETRY_POLL_SECONDS = 1.0
+# ile wpisów (stan sending) może naraz czekać w torach
+# (mało — reszta czeka w outboxie, gdzie priorytet decyduje o kolejności)
+_MAX_HELD = 50
+
+
+class _Lane:
+
+    def __init__(self, route, label):
+        self.route = route
+        self.label = label
+        # (due_at, kolejny nr, czas dodania, wpis) — w torze też najpierw najpilniejsze
+        self.queue = asyncio.PriorityQueue()
+        self.task = None
+        self.sent = 0
+
+
+_lanes = {}
+_seq = itertools.count()
+_held = 0
+_inflight = {}   # item.id -> asyncio.Event (ten sam przedmiot w dwóch torach naraz)
+_stats = {
+    "sender_entries_total": 0,
+    "sender_lanes_opened_total": 0,
+    "sender_lane_waits_total": 0,
+    "sender_messages_total": 0,
+    "sender_packed_batches_total": 0,
+    "sender_calls_saved_total": 0,
+}
+_burst_window = 0.3
+
+
+def route_for(entry) -> str:
+    """Adres POST, na który trafi wpis — ten sam klucz co w discord_limits."""
+    channel_id = entry.get("channel_id", "")
+    bot = get_bot()
+    if not entry.get("is_seller_item") and channel_id and bot.enabled:
+        return bot.messages_url(channel_id)
+    return entry["webhook_url"]
+
+
+def _label(route) -> str:
+    """Nazwa toru do logów — bez tokenu webhooka."""
+    if "/webhooks/" in route:
+        return "webhook:" + route.split("/webhooks/", 1)[1].split("/", 1)[0]
+    if "/channels/" in route:
+        return "channel:" + route.split("/channels/", 1)[1].split("/", 1)[0]
+    return route[:40]
+
+
+def _max_parallel() -> int:
+    try:
+        return max(1, int(db.get_config("sender_max_parallel", "4")))
+    except ValueError:
+        return 4
+
+
+def _burst_window_seconds() -> float:
+    try:
+        return max(0.0, float(db.get_config("sender_burst_window_ms", "300")) / 1000)
+    except ValueError:
+        return 0.3
+
+
+def _take_queued(lane, batch):
+    """Dokłada wpisy już czekające w torze (bez czekania)."""
+    while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+        try:
+            batch.append(lane.queue.get_nowait()[3])
+        except asyncio.QueueEmpty:
+            return
+
+
+async def _collect_burst(lane, queued_at, batch):
+    """Zbiera wpisy, które dotarły do `_burst_window` od pierwszego w serii."""
+    if _burst_window <= 0:
+        return
+    deadline = queued_at + _burst_window
+    while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append((await asyncio.wait_for(lane.queue.get(), timeout))[3])
+        except asyncio.TimeoutError:
+            break
+    _take_queued(lane, batch)
+
+
+def _undelivered(batch, messages, results) -> list:
+    """Wpisy do ponowienia po błędzie toru: bez planu cała seria, inaczej wiadomości niewysłane albo nieudane."""
+    if messages is None:
+        return batch
+    return [e for m, result in itertools.zip_longest(messages, results) for e in m["entries"] if result is None]
+
+
+async def _lane_worker(lane, slots):
+    global _held
+    from src.core import plan_batch, finish_batch, settle_outbox
+    while True:
+        try:
+            _, _, queued_at, entry = await asyncio.wait_for(lane.queue.get(), timeout=_LANE_IDLE_SECONDS)
+        except asyncio.TimeoutError:
+            if lane.queue.empty():
+                _lanes.pop(lane.route, None)
+                logger.debug(f"Tor {lane.label} zamknięty (bezczynny)")
+                return
+            continue
+        batch = [entry]
+        await _collect_burst(lane, queued_at, batch)
+        delay = discord_limits.delay(lane.route)
+        while delay > 0:
+            _stats["sender_lane_waits_total"] += 1
+            await asyncio.sleep(delay)
+            delay = discord_limits.delay(lane.route)
+        _take_queued(lane, batch)
+        ids = {e["item"].id for e in batch}
+        # wszystkie id naraz — po czekaniu na jedno inne mogło zostać zajęte przez kolejny tor
+        busy = next((_inflight[i] for i in ids if i in _inflight), None)
+        while busy is not None:
+            await busy.wait()
+            busy = next((_inflight[i] for i in ids if i in _inflight), None)
+        done = asyncio.Event()
+        for item_id in ids:
+            _inflight[item_id] = done
+        # poza try — po błędzie wiadomo, co Discord już przyjął
+        messages, results = None, []
+        try:
+            started = time.time()
+            async with slots:
+                messages = await asyncio.to_thread(plan_batch, batch)
+            sinks.dispatch(e for m in messages for e in m["entries"])
+            # wysyłka w pętli zdarzeń — po kolei w torze (kolejność kanału), równolegle między torami
+            for m in messages:
+                results.append(await discord_http.request("POST", m["url"], m["payload"], bot_token=m["bot_token"]))
+            async with slots:
+                alerted, calls, failed = await asyncio.to_thread(finish_batch, messages, results, started)
+                await asyncio.to_thread(settle_outbox, batch, failed)
+            lane.sent += alerted
+            _stats["sender_messages_total"] += calls
+            if alerted > calls:
+                _stats["sender_packed_batches_total"] += 1
+                _stats["sender_calls_saved_total"] += alerted - calls
+        except Exception as e:
+            logger.error(f"Tor {lane.label}: {e}", exc_info=True)
+            # ponowienie tylko tego, czego Discord nie przyjął — wysłane wpisy nie mogą wyjść drugi raz
+            await asyncio.to_thread(settle_outbox, batch, _undelivered(batch, messages, results))
+        finally:
+            _held -= len(batch)
+            for item_id in ids:
+                if _inflight.get(item_id) is done:
+                    del _inflight[item_id]
+            done.set()
+
+
+def _lane_for(route, slots) -> _Lane:
+    lane = _lanes.get(route)
+    if lane is None:
+        lane = _lanes[route] = _Lane(route, _label(route))
+        lane.task = asyncio.create_task(_lane_worker(lane, slots), name=f"lane-{lane.label}")
+        _stats["sender_lanes_opened_total"] += 1
+        logger.debug(f"Nowy tor wysyłki: {lane.label}")
+    return lane
+
+
+async def run(stop: asyncio.Event):
+    """Dispatcher: outbox → tory. Kończy się po ustawieniu `stop`."""
+    global _burst_window, _held
+    slots = asyncio.Semaphore(_max_parallel())
+    _burst_window = _burst_window_seconds()
+    await asyncio.to_thread(outbox.recover)
+    sinks.start()
+    price_watch.start()
+    last_claim = 0.0
+    try:
+        while not stop.is_set():
+            if outbox.wakeup.is_set() or time.monotonic() - last_claim >= _RETRY_POLL_SECONDS:
+                last_claim = time.monotonic()
+                entries = await asyncio.to_thread(outbox.claim, _MAX_HELD - _held)
+                for entry in entries:
+                    lane = _lane_for(route_for(entry), slots)
+                    lane.queue.put_nowait((entry.get("_due_at", 0), next(_seq), time.monotonic(), entry))
+                _held += len(entries)
+                _stats["sender_entries_total"] += len(entries)
+                if entries:
+                    await asyncio.sleep(0)
+                    continue
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        pending = sum(lane.queue.qsize() for lane in _lanes.values())
+        if pending:
+            logger.warning(f"Sender zatrzymany — {pending} wpisów w torach wróci z outboxa przy starcie")
+        for lane in list(_lanes.values()):
+            lane.task.cancel()
+        await asyncio.gather(*(lane.task for lane in _lanes.values()), return_exceptions=True)
+        _lanes.clear()
+        _held = 0
+        await sinks.stop()
+        await price_watch.stop()
+        await discord_http.aclose()
+
+
+def get_metrics() -> dict:
+    metrics = dict(_stats)
+    metrics["sender_lanes_active"] = len(_lanes)
+    metrics["sender_lane_queue_depth"] = sum(lane.queue.qsize() for lane in _lanes.values())
+    metrics["sender_held"] = _held
+    metrics.update(discord_limits.get_metrics())
+    metrics.update(sinks.get_metrics())
+    return metrics
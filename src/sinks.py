@@ -0,0 +1,350 @@
+"""
+sinks.py - Dodatkowe miejsca docelowe alertów (fan-out obok torów Discorda).
+WERSJA: 4.2 - Osobna ograniczona kolejka, współbieżność i ponowienia na każdy sink
+
+Każda nowa oferta, która przeszła fast-path (core.plan_batch), trafia poza
+swoim kanałem Discorda do wszystkich skonfigurowanych sinków. Sink ma własną
+kolejkę asyncio (`queue_size`), własne zadania robocze (`concurrency`) i
+własne ponowienia (`retries`, `backoff`) — wolny endpoint ntfy zapełnia tylko
+swoją kolejkę i nie opóźnia Discorda ani pozostałych sinków. Przy pełnej
+kolejce wypada najstarszy alert (licznik dropped) — stary alert jest mniej
+wart niż nowy.
+
+Dostarczenie do sinków jest „najwyżej raz” i nie wpływa na stan outboxa
+(ten śledzi kanał Discorda zapytania).
+
+Config `alert_sinks` — lista JSON, np.:
+  [{"type": "ntfy", "url": "https://ntfy.sh/moje-okazje", "priority": 4},
+   {"type": "jsonl", "path": "data/alerts.jsonl"},
+   {"type": "http", "url": "https://example.org/hook", "headers": {"X-Token": "…"}},
+   {"type": "discord_webhook", "url": "https://discord.com/api/webhooks/…"},
+   {"type": "discord_bot", "channel_id": "1234567890"}]
+Wspólne klucze: name, queries (lista id zapytań; brak = wszystkie),
+queue_size (domyślnie 500), concurrency (2), retries (3), backoff (2.0 s).
+Zmiana konfiguracji działa po restarcie sendera.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import src.database as db
+from src import discord_http
+from src.logger import get_logger
+logger = get_logger("sinks")
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+_TIMEOUT = 10
+# ile ostatnich (przedmiot, zapytanie) pamiętać, żeby ponowienie w outboxie nie dublowało alertu
+_DISPATCHED_MAX = 10000
+
+
+class SinkError(Exception):
+    """Błąd trwały — bez ponawiania."""
+
+
+class _HTTP:
+    """Klient HTTP sinków (poza discord_http — bez rate-limitów Discorda)."""
+
+    def __init__(self):
+        if httpx is not None:
+            self._client = httpx.AsyncClient(timeout=_TIMEOUT)
+            self._session = None
+        else:
+            import requests
+            self._client = None
+            self._session = requests.Session()
+
+    async def post(self, url, body: bytes, headers: dict):
+        if self._client is not None:
+            resp = await self._client.post(url, content=body, headers=headers)
+        else:
+            resp = await asyncio.to_thread(self._session.post, url, data=body, headers=headers,
+                                           timeout=_TIMEOUT)
+        if 400 <= resp.status_code < 500 and resp.status_code != 429:
+            raise SinkError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        if resp.status_code >= 300:
+            raise RuntimeError(f"HTTP {resp.status_code}")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        else:
+            self._session.close()
+
+
+_http = None
+
+
+def _get_http() -> _HTTP:
+    global _http
+    if _http is None:
+        _http = _HTTP()
+    return _http
+
+
+class Sink:
+    kind = "?"
+
+    def __init__(self, conf: dict):
+        self.name = re.sub(r"[^a-z0-9_]", "_", str(conf.get("name") or self.kind).lower())
+        self.queries = {int(q) for q in conf.get("queries") or []}
+        self.queue_size = max(1, int(conf.get("queue_size", 500)))
+        self.concurrency = max(1, int(conf.get("concurrency", 2)))
+        self.retries = max(1, int(conf.get("retries", 3)))
+        self.backoff = max(0.0, float(conf.get("backoff", 2.0)))
+        self.queue = None
+        self.tasks = []
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "retries": 0}
+
+    def accepts(self, event) -> bool:
+        return not self.queries or event["query_id"] in self.queries
+
+    def offer(self, event):
+        """Bez czekania: pełna kolejka → wypada najstarszy alert."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats["dropped"] += 1
+        self.queue.put_nowait(event)
+        self.stats["queued"] += 1
+
+    async def deliver(self, event):
+        raise NotImplementedError
+
+    async def _worker(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                for attempt in range(1, self.retries + 1):
+                    try:
+                        await self.deliver(event)
+                        self.stats["sent"] += 1
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        if isinstance(e, SinkError) or attempt == self.retries:
+                            self.stats["failed"] += 1
+                            logger.warning(f"Sink {self.name}: {event['item']['title']} nieudany ({e})")
+                            break
+                        self.stats["retries"] += 1
+                        await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self.tasks = [asyncio.create_task(self._worker(), name=f"sink-{self.name}-{n}")
+                      for n in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+class HttpSink(Sink):
+    """POST całego zdarzenia jako JSON."""
+    kind = "http"
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.url = conf["url"]
+        self.headers = {"Content-Type": "application/json", **(conf.get("headers") or {})}
+
+    async def deliver(self, event):
+        await _get_http().post(self.url, discord_http.encode_payload(event), self.headers)
+
+
+class NtfySink(Sink):
+    """Powiadomienie push w stylu ntfy: treść tekstem, reszta w nagłówkach."""
+    kind = "ntfy"
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.url = conf["url"]
+        self.priority = str(conf.get("priority", 3))
+        self.token = conf.get("token", "")
+
+    async def deliver(self, event):
+        item = event["item"]
+        body = f"{item['price']} {item['currency']}"
+        details = " · ".join(v for v in (item["size_title"], item["brand_title"], item["status"]) if v and v != "—")
+        if details:
+            body += f"\n{details}"
+        # nagłówki HTTP są latin-1 — tytuł z emoji / znakami spoza zakresu idzie przez RFC 2047
+        title = item["title"]
+        try:
+            title.encode("latin-1")
+        except UnicodeEncodeError:
+            from email.header import Header
+            title = Header(title, "utf-8").encode()
+        headers = {"Title": title, "Click": item["url"], "Priority": self.priority,
+                   "Tags": "shopping_cart" if event["event"] == "new_item" else "bust_in_silhouette"}
+        if item.get("photo"):
+            headers["Attach"] = item["photo"]
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        await _get_http().post(self.url, body.encode("utf-8"), headers)
+
+
+class JsonlSink(Sink):
+    """Plik lokalny — jedno zdarzenie JSON w linii (dopisywanie w wątku)."""
+    kind = "jsonl"
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.path = conf["path"]
+        self._lock = threading.Lock()
+
+    def _append(self, line):
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    async def deliver(self, event):
+        await asyncio.to_thread(self._append, json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+
+
+class DiscordWebhookSink(Sink):
+    """Dodatkowy webhook (np. kanał zbiorczy) — pełny embed jak w torze zapytania."""
+    kind = "discord_webhook"
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.url = conf["url"]
+
+    async def deliver(self, event):
+        from src.discord_sender import build_item_payload, build_seller_payload
+        item = event["_item"]
+        payload = (build_seller_payload(item) if event["event"] == "seller_item"
+                   else build_item_payload(item, event["query_name"], event["embed_color"]))
+        # ponowienia (także po 429) robi discord_http
+        if await discord_http.request("POST", self.url, payload, retries=self.retries) is None:
+            raise SinkError("Discord webhook nie przyjął wiadomości")
+
+
+class DiscordBotSink(Sink):
+    """Dodatkowy kanał bota (wymaga discord_bot_token)."""
+    kind = "discord_bot"
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.channel_id = str(conf["channel_id"])
+
+    async def deliver(self, event):
+        from src.discord_bot import get_bot
+        bot = get_bot()
+        if not bot.enabled:
+            raise SinkError("Discord Bot API wyłączony (brak tokena)")
+        payload = bot.build_item_payload(event["_item"], int(event["embed_color"] or 0x57F287))
+        if await discord_http.request("POST", bot.messages_url(self.channel_id), payload,
+                                      bot_token=bot.token, retries=self.retries) is None:
+            raise SinkError("Discord Bot nie przyjął wiadomości")
+
+
+SINK_TYPES = {cls.kind: cls for cls in (HttpSink, NtfySink, JsonlSink, DiscordWebhookSink, DiscordBotSink)}
+
+_sinks = []
+_dispatched = OrderedDict()
+
+
+def parse_config(text) -> list:
+    """Tekst `alert_sinks` → lista sinków. ValueError przy błędnej konfiguracji (panel pokazuje komunikat)."""
+    if not text or not text.strip():
+        return []
+    try:
+        confs = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"alert_sinks: niepoprawny JSON ({e})")
+    if not isinstance(confs, list):
+        raise ValueError("alert_sinks: oczekiwano listy obiektów")
+    sinks, names = [], set()
+    for n, conf in enumerate(confs, 1):
+        if not isinstance(conf, dict) or conf.get("type") not in SINK_TYPES:
+            raise ValueError(f"alert_sinks #{n}: nieznany typ (dostępne: {', '.join(SINK_TYPES)})")
+        try:
+            sink = SINK_TYPES[conf["type"]](conf)
+        except KeyError as e:
+            raise ValueError(f"alert_sinks #{n} ({conf['type']}): brak klucza {e}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"alert_sinks #{n} ({conf['type']}): {e}")
+        if sink.name in names:
+            sink.name = f"{sink.name}_{n}"
+        names.add(sink.name)
+        sinks.append(sink)
+    return sinks
+
+
+def start():
+    """Wczytuje `alert_sinks` i uruchamia zadania robocze (w pętli sendera)."""
+    global _sinks
+    try:
+        _sinks = parse_config(db.get_config("alert_sinks", ""))
+    except ValueError as e:
+        logger.error(f"❌ {e} — dodatkowe sinki wyłączone")
+        _sinks = []
+    for sink in _sinks:
+        sink.start()
+    if _sinks:
+        logger.info(f"📤 Sinki alertów: {', '.join(f'{s.name} ({s.kind})' for s in _sinks)}")
+
+
+async def stop():
+    global _http, _sinks
+    pending = sum(s.queue.qsize() for s in _sinks)
+    if pending:
+        logger.warning(f"Sinki zatrzymane — {pending} alertów w kolejkach pominiętych")
+    await asyncio.gather(*(s.stop() for s in _sinks))
+    _sinks = []
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+def _event(entry) -> dict:
+    item = entry["item"]
+    return {
+        "event": "seller_item" if entry.get("is_seller_item") else "new_item",
+        "query_id": int(entry.get("query_id") or 0),
+        "query_name": entry.get("query_name", ""),
+        "embed_color": entry.get("embed_color", ""),
+        "ts": int(time.time()),
+        "item": item.to_payload(),
+    }
+
+
+def dispatch(entries):
+    """Fan-out nowych ofert do sinków (bez czekania — każdy sink ma swoją kolejkę)."""
+    if not _sinks:
+        return
+    for entry in entries:
+        key = (entry["item"].id, entry.get("query_id"))
+        if key in _dispatched:
+            continue
+        _dispatched[key] = None
+        if len(_dispatched) > _DISPATCHED_MAX:
+            _dispatched.popitem(last=False)
+        event = _event(entry)
+        for sink in _sinks:
+            if sink.accepts(event):
+                # obiekt Item dla sinków Discorda — klucze z „_” nie trafiają do JSON
+                sink.offer(dict(event, _item=entry["item"]) if sink.kind.startswith("discord") else event)
+
+
+def get_metrics() -> dict:
+    metrics = {"sinks_configured": len(_sinks)}
+    for sink in _sinks:
+        for key, val in sink.stats.items():
+            metrics[f"sink_{sink.name}_{key}_total"] = val
+        metrics[f"sink_{sink.name}_queue_depth"] = sink.queue.qsize() if sink.queue else 0
+    return metrics
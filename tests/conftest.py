@@ -0,0 +1,21 @@
+"""
+conftest.py - Wspólne fixture testów: świeże bazy SQLite w katalogu tymczasowym.
+"""
+import pytest
+import src.database as db
+
+
+@pytest.fixture
+def hot_db(tmp_path, monkeypatch):
+    """Bazy hot / logs / analytics w tmp_path, po migracjach, ze świeżym snapshotem konfiguracji."""
+    monkeypatch.setattr(db, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(db, "RAM_RESIDENT", [])
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / db.DB_FILES["hot"]))
+    monkeypatch.setattr(db, "LOG_DB_PATH", str(tmp_path / db.DB_FILES["logs"]))
+    monkeypatch.setattr(db, "ANALYTICS_DB_PATH", str(tmp_path / db.DB_FILES["analytics"]))
+    if db._watch_conn is not None:   # obserwator snapshotu wciąż patrzy na bazę poprzedniego testu
+        db._watch_conn.close()
+        db._watch_conn = None
+    db.init_db()
+    db._invalidate_config_cache()
+    return db
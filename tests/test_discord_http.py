@@ -0,0 +1,59 @@
+"""
+test_discord_http.py - Ponowienia klienta Discorda: 429 nie zużywa prób, łączny czas czekania ma limit.
+
+Uruchom: python -m pytest -q
+"""
+import asyncio
+from src import discord_http
+
+
+class _Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+        self.text = ""
+
+
+def _run(url, statuses, **kwargs):
+    responses = iter(statuses)
+    calls = []
+
+    async def main():
+        client = discord_http.DiscordHTTP()
+
+        async def send(method, target, body, headers):
+            calls.append(target)
+            return next(responses)
+
+        client._send = send
+        try:
+            return await client.request("POST", url, {"content": "x"}, **kwargs)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main()), calls
+
+
+def test_rate_limits_do_not_use_up_retries():
+    statuses = [_Response(429, 0.01)] * 5 + [_Response(200)]
+    result, calls = _run("https://discord.com/api/webhooks/429/a", statuses, retries=3)
+    assert result is not None and result.status_code == 200
+    assert len(calls) == 6
+
+
+def test_rate_limit_wait_is_capped(monkeypatch):
+    monkeypatch.setattr(discord_http, "_MAX_RATE_LIMIT_WAIT", 0.05)
+    statuses = [_Response(429, 0.02)] * 10
+    result, calls = _run("https://discord.com/api/webhooks/429/b", statuses, retries=3)
+    assert result is None
+    assert len(calls) < 10
+
+
+def test_server_errors_use_retries(monkeypatch):
+    async def no_sleep(seconds):
+        return None
+
+    statuses = [_Response(500)] * 5
+    monkeypatch.setattr(discord_http.asyncio, "sleep", no_sleep)
+    result, calls = _run("https://discord.com/api/webhooks/500/c", statuses, retries=3)
+    assert result is None and len(calls) == 3
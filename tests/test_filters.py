@@ -0,0 +1,67 @@
+"""
+test_filters.py - Reguły filtrów zapytania: walidacja, kompilacja do predykatu i liczniki odrzuceń.
+
+Uruchom: python -m pytest -q
+"""
+import pytest
+from src import filters
+from src.pyVinted.items.item import Item
+
+
+def _item(title="Kurtka zimowa", price="100", login="anna", user_id=7, feedback_count=0, reputation=None,
+          hidden=False, item_id=1):
+    user = {"id": user_id, "login": login, "feedback_count": feedback_count}
+    if reputation is not None:
+        user["feedback_reputation"] = reputation
+    return Item({"id": item_id, "title": title, "price": {"amount": price, "currency_code": "PLN"},
+                 "user": user, "is_hidden": hidden, "created_at_ts": 1}, domain="pl")
+
+
+def test_normalize_rejects_unknown_and_bad_values():
+    with pytest.raises(ValueError):
+        filters.normalize_rules({"colour": "red"})
+    with pytest.raises(ValueError):
+        filters.normalize_rules({"title_regex": "("})
+    with pytest.raises(ValueError):
+        filters.normalize_rules({"min_seller_rating": "7"})
+    assert filters.normalize_rules({"exclude_keywords": "damska, dziecięca", "max_total_price": "99,5"}) == {
+        "exclude_keywords": ["damska", "dziecięca"], "max_total_price": 99.5}
+
+
+def test_each_rule_rejects_and_counts():
+    predicate = filters.compile_rules(filters.normalize_rules({
+        "exclude_keywords": ["damska"], "title_regex": "kurtka", "exclude_sellers": ["bob", "42"],
+        "max_total_price": 110,
+    }))
+    assert predicate(_item())
+    assert not predicate(_item(title="Kurtka damska", item_id=2))
+    assert not predicate(_item(title="Spodnie", item_id=3))
+    assert not predicate(_item(login="BOB", item_id=4))
+    assert not predicate(_item(user_id=42, item_id=5))
+    assert not predicate(_item(price="104", item_id=6))   # 104 + 6% + 0.30 > 110
+    assert predicate.drops == {"exclude_sellers": 2, "max_total_price": 1, "exclude_keywords": 1, "title_regex": 1}
+
+
+def test_rating_is_decided_after_enrichment():
+    predicate = filters.compile_rules({"min_seller_rating": 4.0})
+    unknown = _item()
+    assert predicate(unknown)
+    assert not predicate(unknown, enriched=True)
+    assert predicate(_item(feedback_count=10, reputation=0.9), enriched=True)
+    assert not predicate(_item(feedback_count=10, reputation=0.5, item_id=2), enriched=True)
+
+
+def test_rejection_is_not_sticky_after_price_drop():
+    predicate = filters.compile_rules({"max_total_price": 110})
+    assert not predicate(_item(price="120"))
+    assert not predicate(_item(price="120"))
+    assert predicate(_item(price="90"))
+    assert predicate.drops["max_total_price"] == 1   # ta sama oferta i cena liczona raz
+
+
+def test_for_query_recompiles_only_on_change():
+    query = {"id": 9001, "name": "t", "filter_rules": filters.dump_rules({"hidden_only": True})}
+    first = filters.for_query(query)
+    assert filters.for_query(dict(query)) is first
+    assert not first(_item()) and first(_item(hidden=True, item_id=2))
+    assert filters.for_query({**query, "filter_rules": ""}) is None
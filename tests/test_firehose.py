@@ -0,0 +1,48 @@
+"""
+test_firehose.py - Które URL-e strumień domeny przejmuje od zwykłego odpytywania.
+
+Uruchom: python -m pytest -q
+"""
+import time
+import pytest
+from src import firehose
+from src.pyVinted.items.item import Item
+
+BRAND_URL = "https://www.vinted.pl/catalog?brand_ids[]=53"
+TEXT_URL = "https://www.vinted.pl/catalog?search_text=kurtka"
+QUERIES = [{"id": 1, "urls": [{"url": BRAND_URL}]}, {"id": 2, "urls": [{"url": TEXT_URL}]}]
+
+
+@pytest.fixture
+def feeds(monkeypatch):
+    monkeypatch.setattr(firehose, "_feeds", {})
+    return firehose
+
+
+def _item(item_id, title, brand_id=None):
+    return Item({"id": item_id, "title": title, "brand_id": brand_id, "catalog_id": 5, "size_id": 1, "status_id": 2,
+                 "price": {"amount": "50", "currency_code": "PLN"}, "created_at_ts": int(time.time())}, domain="pl")
+
+
+def test_url_is_streamed_only_after_a_confirmed_match(feeds):
+    assert feeds.plan(QUERIES, ["pl"]) == set()
+    page = [_item(1, "kurtka nike", brand_id=53)]
+    for item in feeds.observe("pl", page):
+        feeds.match("pl", item)
+    assert feeds.plan(QUERIES, ["pl"]) == {(1, BRAND_URL)}
+
+
+def test_search_text_urls_stay_polled(feeds):
+    feeds.plan(QUERIES, ["pl"])
+    for item in feeds.observe("pl", [_item(1, "kurtka zimowa", brand_id=7)]):
+        assert [s.url for s in feeds.match("pl", item)] == [TEXT_URL]
+    assert feeds.plan(QUERIES, ["pl"]) == set()
+
+
+def test_missing_field_returns_url_to_polling(feeds):
+    feeds.plan(QUERIES, ["pl"])
+    for item in feeds.observe("pl", [_item(1, "buty", brand_id=53)]):
+        feeds.match("pl", item)
+    assert feeds.plan(QUERIES, ["pl"]) == {(1, BRAND_URL)}
+    feeds.observe("pl", [_item(2, "buty")])
+    assert feeds.plan(QUERIES, ["pl"]) == set()
@@ -0,0 +1,46 @@
+"""
+test_maintenance.py - Budżet czasu kroków konserwacji i konwersja auto_vacuum przy starcie.
+
+Uruchom: python -m pytest -q
+"""
+import pytest
+from src import maintenance
+
+
+def test_init_converts_small_databases_to_incremental_vacuum(hot_db):
+    for connect, _ in hot_db._DATABASES.values():
+        conn = connect()
+        try:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        finally:
+            conn.close()
+
+
+def test_time_budget_raises_dedicated_exception(hot_db):
+    with pytest.raises(hot_db.BudgetExceeded):
+        with hot_db.time_budget(0.01):
+            conn = hot_db.get_connection()
+            try:
+                conn.execute("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) "
+                             "SELECT COUNT(*) FROM n").fetchone()
+            finally:
+                conn.close()
+
+
+def test_budget_overrun_is_counted_not_an_error(hot_db, monkeypatch):
+    def slow(budget):
+        conn = hot_db.get_connection()
+        try:
+            conn.execute("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) "
+                         "SELECT COUNT(*) FROM n").fetchone()
+        finally:
+            conn.close()
+
+    monkeypatch.setattr(maintenance, "_STEPS", [("slow", slow, 60, 0.01)])
+    monkeypatch.setattr(maintenance, "_last_run", {"slow": float("-inf")})
+    monkeypatch.setattr(maintenance, "_step_ms", {"slow": 0.0})
+    before = maintenance.get_metrics()
+    assert maintenance.run_if_idle(force=True) == ["slow"]
+    after = maintenance.get_metrics()
+    assert after["maintenance_budget_exceeded_total"] == before["maintenance_budget_exceeded_total"] + 1
+    assert after["maintenance_step_errors_total"] == before["maintenance_step_errors_total"]
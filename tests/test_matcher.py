@@ -0,0 +1,45 @@
+"""
+test_matcher.py - Indeks odwrócony daje te same dopasowania co przegląd liniowy (dane z matcher_bench).
+
+Uruchom: python -m pytest -q
+"""
+import os
+import random
+import sys
+from src.matcher import Matcher, Subscription
+from src.pyVinted.items.item import Item
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from matcher_bench import make_items, make_subscriptions  # noqa: E402
+
+
+def test_index_matches_linear_scan():
+    rng = random.Random(7)
+    matcher = Matcher()
+    for n, url in enumerate(make_subscriptions(2000, rng)):
+        matcher.add(1 + n // 3, url)
+    items = make_items(500, rng)
+    matched = 0
+    for item in items:
+        indexed = matcher.match(item)
+        assert indexed == matcher.match_linear(item)
+        matched += bool(indexed)
+    assert matched   # próbka faktycznie coś dopasowuje
+
+
+def test_subscription_conditions():
+    item = Item({"id": 1, "title": "Kurtka Zimowa Łódź", "brand_id": 53, "catalog_id": 5, "size_id": 2,
+                 "status_id": 3, "price": {"amount": "80", "currency_code": "PLN"}, "created_at_ts": 1})
+    matcher = Matcher()
+    urls = {
+        "brand": "https://www.vinted.pl/catalog?brand_ids[]=53",
+        "words": "https://www.vinted.pl/catalog?search_text=kurtka+lodz",
+        "price": "https://www.vinted.pl/catalog?price_from=50&price_to=100",
+        "too_cheap": "https://www.vinted.pl/catalog?brand_ids[]=53&price_to=60",
+        "other_size": "https://www.vinted.pl/catalog?size_ids[]=9",
+    }
+    for url in urls.values():
+        matcher.add(1, url)
+    assert {s.url for s in matcher.match(item)} == {urls["brand"], urls["words"], urls["price"]}
+    assert not matcher.add(2, "https://www.vinted.pl/catalog?color_ids[]=1")   # filtr spoza oferty
+    assert Subscription(2, "https://www.vinted.pl/catalog?color_ids[]=1").unsupported == ["color_ids[]"]
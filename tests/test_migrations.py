@@ -0,0 +1,25 @@
+"""
+test_migrations.py - Nowa baza przechodzi wszystkie migracje; tabele sprzed podziału nie zostają w hot.
+
+Uruchom: python -m pytest -q
+"""
+
+
+def test_fresh_database_applies_every_migration(hot_db):
+    conn = hot_db.get_connection()
+    try:
+        versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert versions == [version for version, _, _ in hot_db._MIGRATIONS]
+    assert not tables & {"logs", "price_tracking", "price_history", "price_history_daily"}
+
+
+def test_restart_does_not_recreate_legacy_tables(hot_db):
+    hot_db.init_db()
+    conn = hot_db.get_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('logs', 'price_tracking')").fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,91 @@
+"""
+test_outbox.py - Trwała kolejka alertów: przejścia stanów (claim / complete / recover) i kolejność EDF.
+
+Uruchom: python -m pytest -q
+"""
+import time
+import pytest
+from src import outbox
+from src.pyVinted.items.item import Item
+
+
+def _entry(item_id, query_id=1, priority=3, age=0, seller=False):
+    item = Item({"id": item_id, "title": f"oferta {item_id}", "price": {"amount": "50", "currency_code": "PLN"},
+                 "created_at_ts": int(time.time()) - age}, domain="pl")
+    return {"item": item, "query_id": query_id, "query_name": "test", "webhook_url": "https://x/webhooks/1/t",
+            "embed_color": "", "priority": priority, "is_seller_item": seller}
+
+
+def _rows(hot_db):
+    conn = hot_db.get_connection()
+    try:
+        return {row["vinted_id"]: dict(row) for row in conn.execute(
+            "SELECT vinted_id, state, attempts, next_attempt_at FROM outbox")}
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def box(hot_db, monkeypatch):
+    monkeypatch.setattr(outbox, "_medians", {"at": float("-inf"), "values": {}})
+    return outbox
+
+
+def test_enqueue_is_idempotent_per_item_and_query(box):
+    assert box.enqueue([_entry(1), _entry(1), _entry(1, query_id=2)]) == 2
+
+
+def test_claim_complete_and_retry(box, hot_db):
+    box.enqueue([_entry(1), _entry(2)])
+    claimed = box.claim(10)
+    assert {e["item"].id for e in claimed} == {1, 2}
+    assert {r["state"] for r in _rows(hot_db).values()} == {"sending"}
+    assert box.claim(10) == []
+    first, second = claimed
+    box.complete([first["_outbox_id"]], [(second["_outbox_id"], "HTTP 500")])
+    rows = _rows(hot_db)
+    assert rows[first["item"].id]["state"] == "sent"
+    retried = rows[second["item"].id]
+    assert retried["state"] == "pending" and retried["attempts"] == 1
+    assert retried["next_attempt_at"] > time.time()   # backoff — jeszcze niegotowy
+    assert box.claim(10) == []
+
+
+def test_failed_after_max_attempts(box, hot_db):
+    hot_db.set_config("outbox_max_attempts", "2")
+    hot_db._invalidate_config_cache()
+    box.enqueue([_entry(1)])
+    (entry,) = box.claim(10)
+    box.complete([], [(entry["_outbox_id"], "błąd")])
+    box.complete([], [(entry["_outbox_id"], "błąd")])
+    assert _rows(hot_db)[1]["state"] == "failed"
+
+
+def test_recover_returns_interrupted_entries(box, hot_db):
+    box.enqueue([_entry(1), _entry(2)])
+    box.claim(1)
+    assert box.recover() == 1
+    assert {r["state"] for r in _rows(hot_db).values()} == {"pending"}
+    assert len(box.claim(10)) == 2
+
+
+def test_claim_orders_by_deadline(box):
+    entries = [_entry(1, priority=1, age=3600), _entry(2, priority=5), _entry(3, priority=3, seller=True)]
+    # świeża + sprzedawca (0.575) > świeża + priorytet 5 (0.5) > stara o priorytecie 1 (0)
+    assert [box.score(e) for e in entries] == pytest.approx([0.0, 0.5, 0.575], abs=0.01)
+    box.enqueue(entries)
+    assert [e["item"].id for e in box.claim(10)] == [3, 2, 1]
+
+
+def test_low_priority_is_not_starved(box, hot_db):
+    hot_db.set_config("alert_max_delay_seconds", "60")
+    hot_db._invalidate_config_cache()
+    box.enqueue([_entry(1, priority=1, age=3600)])
+    conn = hot_db.get_connection()
+    try:   # wpis czeka już dłużej niż alert_max_delay_seconds
+        conn.execute("UPDATE outbox SET created_at = created_at - 120, due_at = due_at - 120")
+        conn.commit()
+    finally:
+        conn.close()
+    box.enqueue([_entry(2, priority=5)])
+    assert [e["item"].id for e in box.claim(10)] == [1, 2]
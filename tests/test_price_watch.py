@@ -0,0 +1,87 @@
+"""
+test_price_watch.py - Strumień obniżek: wykrywanie z kolejnych stron katalogu i wysyłka bez odpytywania.
+
+Uruchom: python -m pytest -q
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from src import discord_http, price_watch
+from src.pyVinted.items import ItemBatch
+
+QUERY = {"id": 1, "name": "test", "discord_webhook_url": "https://discord.com/api/webhooks/1/token",
+         "discord_channel_id": ""}
+
+
+def _page(*prices, first_id=500):
+    now = int(time.time())
+    return ItemBatch.from_json([{"id": first_id + n, "title": f"oferta {n}", "created_at_ts": now,
+                                 "price": {"amount": str(price), "currency_code": "PLN"}}
+                                for n, price in enumerate(prices)])
+
+
+def test_drop_from_scan_thread_wakes_sender(hot_db, monkeypatch):
+    sent = []
+
+    async def request(method, url, payload, bot_token=None):
+        sent.append(time.monotonic())
+        return {"id": "1"}
+
+    monkeypatch.setattr(discord_http, "request", request)
+
+    async def main():
+        price_watch.start()
+        price_watch.observe(_page(100, first_id=900), QUERY)
+        await asyncio.sleep(0.01)
+        emitted = time.monotonic()
+        scan = threading.Thread(target=price_watch.observe, args=(_page(80, first_id=900), QUERY))
+        scan.start()
+        scan.join()
+        for _ in range(100):
+            if sent:
+                break
+            await asyncio.sleep(0.001)
+        await price_watch.stop()
+        return emitted
+
+    emitted = asyncio.run(main())
+    assert len(sent) == 1 and sent[0] - emitted < 0.1
+
+
+def test_first_sight_is_silent_and_lower_price_drops(hot_db, monkeypatch):
+    monkeypatch.setattr(price_watch, "_last_price", OrderedDict())
+    monkeypatch.setattr(price_watch, "_queue", deque())
+    assert price_watch.observe(_page(100, 50), QUERY) == 0
+    assert price_watch.observe(_page(100, 50), QUERY) == 0
+    assert price_watch.observe(_page(120, 40), QUERY) == 1   # podwyżka nie jest obniżką
+    assert [e["old_price"] for e in price_watch._queue] == [50.0]
+
+
+def test_min_percent_threshold(hot_db, monkeypatch):
+    monkeypatch.setattr(price_watch, "_last_price", OrderedDict())
+    monkeypatch.setattr(price_watch, "_queue", deque())
+    hot_db.set_config("price_drop_min_percent", "10")
+    hot_db._invalidate_config_cache()
+    price_watch.observe(_page(100, 100), QUERY)
+    assert price_watch.observe(_page(95, 90), QUERY) == 1   # −5% za mało, −10% wystarcza
+    assert price_watch._queue[-1]["item"].id == 501
+
+
+def test_known_prices_and_rules_gate_drops(hot_db, monkeypatch):
+    from src import filters
+    monkeypatch.setattr(price_watch, "_last_price", OrderedDict())
+    monkeypatch.setattr(price_watch, "_queue", deque())
+    capped = filters.compile_rules({"max_total_price": 60})
+    assert price_watch.observe(_page(80), QUERY, capped, known={500: 100 * 100}) == 0   # 80 zł nadal ponad limit
+    assert price_watch.observe(_page(50), QUERY, capped) == 1   # obniżka zmieściła ofertę w limicie
+
+
+def test_feed_drop_goes_to_first_passing_query(hot_db, monkeypatch):
+    monkeypatch.setattr(price_watch, "_last_price", OrderedDict())
+    monkeypatch.setattr(price_watch, "_queue", deque())
+    other = {**QUERY, "id": 2, "name": "drugie"}
+    route = lambda item: [(QUERY, lambda it: False), (other, None)]
+    price_watch.observe_feed(_page(100), route)
+    assert price_watch.observe_feed(_page(70), route) == 1
+    assert [e["query_name"] for e in price_watch._queue] == ["drugie"]
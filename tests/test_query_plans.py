@@ -0,0 +1,9 @@
+"""
+test_query_plans.py - Zapytania hot-path muszą używać swoich indeksów (EXPLAIN QUERY PLAN).
+
+Uruchom: python -m pytest -q
+"""
+
+
+def test_hot_queries_use_expected_indexes(hot_db):
+    assert hot_db.check_query_plans() == []
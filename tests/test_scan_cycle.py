@@ -0,0 +1,68 @@
+"""
+test_scan_cycle.py - Termin cyklu skanu: przeniesienie wolnych zadań, sprzedawcy w tym samym terminie.
+
+Uruchom: python -m pytest -q
+"""
+import threading
+import time
+import pytest
+from concurrent.futures import wait
+from src import core, maintenance
+from src.pyVinted.items import Item
+
+WEBHOOK = "https://discord.com/api/webhooks/1/token"
+
+
+@pytest.fixture
+def cycle(hot_db, monkeypatch):
+    monkeypatch.setattr(core, "_carried", {})
+    monkeypatch.setattr(core, "_overruns", {})
+    monkeypatch.setattr(core, "_scan_stats", {k: 0 for k in core._scan_stats})
+    monkeypatch.setattr(core, "_scan_pool", None)
+    monkeypatch.setattr(core, "_cleanup_stale_sessions", lambda: None)
+    hot_db.set_config("scan_deadline_seconds", "1")
+    hot_db._invalidate_config_cache()
+    yield core
+    if core._scan_pool is not None:   # wątki skanu nie mogą przeżyć testu (baza tymczasowa)
+        core._scan_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _result(name):
+    return name, 0, 0, []
+
+
+def test_job_finishing_right_after_wait_is_not_carried(cycle, monkeypatch):
+    def late_wait(futures, timeout=None):
+        wait(futures)   # wszystko skończone, ale zgłoszone jako pending — jak tuż po terminie
+        return set(), set(futures)
+
+    monkeypatch.setattr(core, "wait", late_wait)
+    core._run_cycle([(("query", 1), "q", _result, ("q",))], 1.0)
+    metrics = core.get_metrics()
+    assert core._carried == {}
+    assert metrics["scan_overruns_total"] == 0 and metrics["scan_backlog_total"] == 0
+    assert core.get_overruns(1) == 0
+
+
+def test_slow_seller_is_bounded_by_the_cycle_deadline(cycle, hot_db, monkeypatch):
+    hot_db.add_tracked_seller("42", "wolny", WEBHOOK)
+    release = threading.Event()
+
+    def fetch(user_id, domain="pl", per_page=10):
+        release.wait(10)
+        return [Item({"id": 7000, "title": "od sprzedawcy", "price": "10", "created_at_ts": int(time.time())})]
+
+    monkeypatch.setattr(core, "_fetch_seller_items", fetch)
+    started = time.monotonic()
+    core.scrape_all_queries()
+    elapsed = time.monotonic() - started
+    metrics = core.get_metrics()
+    release.set()
+    assert elapsed < 3
+    assert not maintenance.scan_running()
+    assert metrics["scan_seller_42_overruns_total"] == 1
+    for _ in range(100):
+        if core.get_metrics()["scan_carried_completed_total"]:
+            break
+        time.sleep(0.01)
+    assert core.get_metrics()["scan_carried_completed_total"] == 1
@@ -0,0 +1,141 @@
+"""
+test_sender.py - Tor wysyłki: wynik serii wraca do outboxa bez duplikatów po błędzie.
+
+Uruchom: python -m pytest -q
+"""
+import asyncio
+import time
+from src import core, discord_http, outbox, sender, sinks
+from src.pyVinted.items.item import Item
+
+WEBHOOK = "https://discord.com/api/webhooks/1/token"
+
+
+def _entries(count):
+    now = int(time.time())
+    return [{"item": Item({"id": 100 + n, "title": f"oferta {n}", "price": {"amount": "50", "currency_code": "PLN"},
+                           "created_at_ts": now}, domain="pl"),
+             "query_id": 1, "query_name": "test", "webhook_url": WEBHOOK, "embed_color": "", "priority": 3}
+            for n in range(count)]
+
+
+def _states(hot_db):
+    conn = hot_db.get_connection()
+    try:
+        return dict(conn.execute("SELECT vinted_id, state FROM outbox").fetchall())
+    finally:
+        conn.close()
+
+
+def _run_lane(batch, settled):
+    async def main():
+        lane = sender._Lane(WEBHOOK, "test")
+        for entry in batch:
+            lane.queue.put_nowait((0, next(sender._seq), time.monotonic(), entry))
+        task = asyncio.create_task(sender._lane_worker(lane, asyncio.Semaphore(1)))
+        for _ in range(200):
+            if settled:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(main())
+
+
+def _patch_lane(monkeypatch, per_message, results):
+    settled = []
+    settle_outbox = core.settle_outbox
+    responses = iter(results)
+
+    async def request(*args, **kwargs):
+        return next(responses)
+
+    def plan(batch):
+        return [core._message(WEBHOOK, {}, entries=batch[i:i + per_message])
+                for i in range(0, len(batch), per_message)]
+
+    def settle(entries, failed):
+        settle_outbox(entries, failed)
+        settled.append([e["item"].id for e in failed])
+
+    def finish(messages, results, started):
+        raise RuntimeError("zapis po wysyłce")
+
+    monkeypatch.setattr(sender, "_burst_window", 0)
+    monkeypatch.setattr(sinks, "dispatch", lambda entries: None)
+    monkeypatch.setattr(discord_http, "request", request)
+    monkeypatch.setattr(core, "plan_batch", plan)
+    monkeypatch.setattr(core, "finish_batch", finish)
+    monkeypatch.setattr(core, "settle_outbox", settle)
+    return settled
+
+
+def test_error_after_post_does_not_requeue_delivered(hot_db, monkeypatch):
+    outbox.enqueue(_entries(3))
+    batch = outbox.claim(10)
+    settled = _patch_lane(monkeypatch, per_message=10, results=[{"id": "1"}])
+    _run_lane(batch, settled)
+    assert settled == [[]]
+    assert set(_states(hot_db).values()) == {"sent"}
+
+
+def test_error_requeues_only_undelivered_messages(hot_db, monkeypatch):
+    outbox.enqueue(_entries(4))
+    batch = outbox.claim(10)
+    settled = _patch_lane(monkeypatch, per_message=2, results=[{"id": "1"}, None])
+    _run_lane(batch, settled)
+    states = _states(hot_db)
+    assert [states[int(e["item"].id)] for e in batch] == ["sent", "sent", "pending", "pending"]
+
+
+
+def test_lanes_sharing_items_never_overlap(hot_db, monkeypatch):
+    outbox.enqueue(_entries(2))
+    a, b = outbox.claim(10)
+    active, overlaps, done = set(), [], []
+    delays = {"slow": 0.1, "fast": 0.02, "both": 0.05, "late": 0.1}
+
+    async def request(method, url, payload, bot_token=None):
+        ids = {e["item"].id for e in payload["entries"]}
+        overlaps.extend(ids & active)
+        active.update(ids)
+        await asyncio.sleep(delays[asyncio.current_task().get_name()])
+        active.difference_update(ids)
+        done.append(asyncio.current_task().get_name())
+        return {"id": "1"}
+
+    monkeypatch.setattr(sender, "_burst_window", 0)
+    monkeypatch.setattr(sinks, "dispatch", lambda entries: None)
+    monkeypatch.setattr(discord_http, "request", request)
+    monkeypatch.setattr(core, "plan_batch", lambda batch: [core._message(WEBHOOK, {"entries": batch}, entries=batch)])
+    monkeypatch.setattr(core, "finish_batch", lambda messages, results, started: (1, 1, []))
+
+    async def main():
+        slots = asyncio.Semaphore(4)
+        lanes, tasks = {}, []
+
+        def put(name, entries):
+            lane = lanes[name] = sender._Lane(f"{WEBHOOK}/{name}", name)
+            for entry in entries:
+                lane.queue.put_nowait((0, next(sender._seq), time.monotonic(), entry))
+            tasks.append(asyncio.create_task(sender._lane_worker(lane, slots), name=name))
+
+        put("slow", [b])
+        put("fast", [a])
+        await asyncio.sleep(0.005)
+        put("both", [a, b])
+        await asyncio.sleep(0.04)   # a wolne, "both" czeka jeszcze na b
+        put("late", [a])
+        for _ in range(100):
+            if len(done) == 4:
+                break
+            await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    assert overlaps == []
+    assert len(done) == 4
+    assert all(isinstance(o, asyncio.CancelledError) for o in outcomes)
+    assert not sender._inflight
@@ -0,0 +1,42 @@
+"""
+test_snapshot.py - Snapshot zapytań: watermark aktualizowany w miejscu, zmiana ustawień przeładowuje.
+
+Uruchom: python -m pytest -q
+"""
+import threading
+
+URL = "https://www.vinted.pl/catalog?search_text=kurtka"
+
+
+def test_watermark_updates_snapshot_without_reload(hot_db):
+    query_id = hot_db.add_query("kurtki", "https://discord.com/api/webhooks/1/t", "", "1", [URL], 1, 3, "")
+    hot_db._invalidate_config_cache()
+    version = hot_db._snapshot["version"]
+    hot_db.update_query_last_ts(query_id, 1234)
+    hot_db._invalidate_config_cache()
+    query = next(q for q in hot_db.get_queries_snapshot() if q["id"] == query_id)
+    assert query["last_item_ts"] == 1234
+    assert [u["last_item_ts"] for u in query["urls"]] == [1234]
+    assert hot_db._snapshot["version"] == version
+
+
+def test_settings_change_bumps_version(hot_db):
+    hot_db._invalidate_config_cache()
+    version = hot_db._snapshot["version"]
+    hot_db.set_config("scan_interval", "12")
+    hot_db._invalidate_config_cache()
+    assert hot_db.get_config("scan_interval") == "12"
+    assert hot_db._snapshot["version"] != version
+
+
+def test_watermark_waits_for_snapshot_reload(hot_db):
+    query_id = hot_db.add_query("kurtki", "https://discord.com/api/webhooks/1/t", "", "1", [URL], 1, 3, "")
+    hot_db._invalidate_config_cache()
+    writer = threading.Thread(target=hot_db.update_query_last_ts, args=(query_id, 99))
+    with hot_db._snapshot_lock:   # przeładowanie w toku
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive()
+        assert hot_db._snapshot["queries"][0]["last_item_ts"] != 99
+    writer.join(5)
+    assert hot_db._snapshot["queries"][0]["last_item_ts"] == 99
@@ -1,6 +1,6 @@
 """
 web_panel/app.py - Flask panel webowy.
-WERSJA: 4.1 - Naprawione błędy + Seller/Price tracking endpoints
+WERSJA: 4.2 - Naprawione błędy + Seller/Price tracking endpoints + wyszukiwanie i stronicowanie kursorem
 """
 from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
 import sqlite3
@@ -12,12 +12,9 @@ import json
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "vinted_notification.db")
-
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    import src.database as db
+    return db.get_panel_connection()
 
 def init_config_defaults():
     conn = get_db()
@@ -42,7 +39,7 @@ def dashboard():
     conn = get_db()
     stats = {
         "queries": conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0],
-        "items": conn.execute("SELECT COUNT(*) FROM items").fetchone()[0],
+        "items": conn.execute("SELECT COUNT(*) FROM item_data").fetchone()[0],
         "logs": conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0],
     }
     recent_items = conn.execute("SELECT * FROM items ORDER BY timestamp DESC LIMIT 10").fetchall()
@@ -63,6 +60,31 @@ def queries():
     conn.close()
     return render_template("queries.html", queries=queries_with_urls)
 
+def _form_priority():
+    try:
+        return min(5, max(1, int(request.form.get("priority", 3))))
+    except ValueError:
+        return 3
+
+def _form_filter_rules() -> str:
+    """Pola reguł filtrów z formularza → JSON do queries.filter_rules (ValueError przy błędzie)."""
+    from src.filters import normalize_rules, dump_rules
+    return dump_rules(normalize_rules({
+        "exclude_keywords": request.form.get("exclude_keywords", ""),
+        "title_regex": request.form.get("title_regex", ""),
+        "exclude_sellers": request.form.get("exclude_sellers", ""),
+        "max_total_price": request.form.get("max_total_price", ""),
+        "min_seller_rating": request.form.get("min_seller_rating", ""),
+        "hidden_only": bool(request.form.get("hidden_only")),
+    }))
+
+def _stored_filter_rules(text) -> dict:
+    from src.filters import parse_rules
+    try:
+        return parse_rules(text)
+    except ValueError:
+        return {}
+
 @app.route("/query/add", methods=["GET", "POST"])
 def add_query():
     discord_mode = check_discord_mode()
@@ -73,13 +95,19 @@ def add_query():
         channel_id = request.form.get("channel_id", "")
         color = request.form.get("embed_color", "5763719")
         active = 1 if request.form.get("active") else 0
+        priority = _form_priority()
         urls_raw = request.form.get("urls", "")
         urls = [u.strip() for u in urls_raw.replace(",", "\n").split("\n") if u.strip()]
         if not urls:
             flash("❌ Dodaj przynajmniej jeden URL!", "error")
             return redirect(url_for("add_query"))
+        try:
+            filter_rules = _form_filter_rules()
+        except ValueError as e:
+            flash(f"❌ Filtry: {e}", "error")
+            return redirect(url_for("add_query"))
         import src.database as db
-        query_id = db.add_query(name, webhook, channel_id, color, urls, active)
+        query_id = db.add_query(name, webhook, channel_id, color, urls, active, priority, filter_rules)
         if channel:
             conn = get_db()
             conn.execute("UPDATE queries SET discord_channel_name = ? WHERE id = ?", (channel, query_id))
@@ -89,7 +117,8 @@ def add_query():
         return redirect(url_for("queries"))
     form_data = {
         "name": "", "webhook_url": "", "channel_id": "",
-        "channel_name": "", "embed_color": "5763719", "active": 1, "urls": []
+        "channel_name": "", "embed_color": "5763719", "active": 1, "priority": 3, "urls": [],
+        "filters": {}, "filter_drops": {}
     }
     return render_template("query_form.html", action="add", form_data=form_data,
                          discord_mode=discord_mode, color_presets=COLOR_PRESETS)
@@ -105,18 +134,27 @@ def edit_query(id):
         channel_id = request.form.get("channel_id", "")
         color = request.form.get("embed_color", "5763719")
         active = 1 if request.form.get("active") else 0
+        priority = _form_priority()
         urls_raw = request.form.get("urls", "")
         urls = [u.strip() for u in urls_raw.replace(",", "\n").split("\n") if u.strip()]
         if not urls:
             flash("❌ Dodaj przynajmniej jeden URL!", "error")
             return redirect(url_for("edit_query", id=id))
+        try:
+            filter_rules = _form_filter_rules()
+        except ValueError as e:
+            conn.close()
+            flash(f"❌ Filtry: {e}", "error")
+            return redirect(url_for("edit_query", id=id))
         import src.database as db
-        db.update_query(id, name, webhook, channel_id, color, urls, active)
+        db.update_query(id, name, webhook, channel_id, color, urls, active, priority, filter_rules)
         conn.execute("UPDATE queries SET discord_channel_name = ? WHERE id = ?", (channel, id))
         conn.commit()
         conn.close()
         flash("✅ Zaktualizowano zapytanie!", "success")
         return redirect(url_for("queries"))
+    from src.filters import get_drops
+    from src.core import get_overruns
     query = conn.execute("SELECT * FROM queries WHERE id = ?", (id,)).fetchone()
     urls = conn.execute("SELECT url FROM query_urls WHERE query_id = ?", (id,)).fetchall()
     conn.close()
@@ -126,8 +164,10 @@ def edit_query(id):
     form_data = {
         "name": query["name"], "webhook_url": query["discord_webhook_url"],
         "channel_id": query["discord_channel_id"], "channel_name": query["discord_channel_name"],
-        "embed_color": query["embed_color"], "active": query["active"],
-        "urls": [u["url"] for u in urls]
+        "embed_color": query["embed_color"], "active": query["active"], "priority": query["priority"],
+        "urls": [u["url"] for u in urls],
+        "filters": _stored_filter_rules(query["filter_rules"]), "filter_drops": get_drops(id),
+        "scan_overruns": get_overruns(id)
     }
     return render_template("query_form.html", action="edit", form_data=form_data,
                          discord_mode=discord_mode, color_presets=COLOR_PRESETS)
@@ -172,33 +212,128 @@ def delete_seller(id):
     flash("🗑️ Usunięto sprzedawcę!", "success")
     return redirect(url_for("sellers"))
 
+def _sparkline(points, width=120, height=28):
+    """Punkty dla <polyline> SVG z historii cen [(ts, min, max)] — rysujemy minimum."""
+    if len(points) < 2:
+        return ""
+    ts0, ts1 = points[0][0], points[-1][0]
+    lo = min(p[1] for p in points)
+    hi = max(p[1] for p in points)
+    span_t = (ts1 - ts0) or 1
+    span_p = (hi - lo) or 1
+    return " ".join(
+        f"{(p[0] - ts0) / span_t * width:.1f},{height - (p[1] - lo) / span_p * height:.1f}"
+        for p in points
+    )
+
 @app.route("/price-tracking")
 def price_tracking():
+    import src.database as db
+    brand = request.args.get("brand", "").strip()
+    since = int(time.time()) - 90 * 86400
     conn = get_db()
-    tracks = conn.execute("SELECT * FROM price_tracking WHERE active = 1 ORDER BY updated_at DESC LIMIT 100").fetchall()
-    stats = db.get_price_tracking_stats()
+    tracks = [dict(t) for t in conn.execute("""SELECT *,
+            printf('%.2f', first_price_cents / 100.0) AS first_price,
+            printf('%.2f', last_price_cents / 100.0) AS last_price,
+            printf('%.2f', lowest_price_cents / 100.0) AS lowest_price
+        FROM price_tracking WHERE active = 1 ORDER BY updated_at DESC LIMIT 100""").fetchall()]
+    for t in tracks:
+        t["sparkline"] = _sparkline(db.get_price_history(t["id"], since, conn=conn))
+    brand_history = db.get_brand_price_history(brand, since, conn=conn) if brand else []
     conn.close()
-    return render_template("price_tracking.html", tracks=tracks, stats=stats)
+    stats = db.get_price_tracking_stats()
+    return render_template("price_tracking.html", tracks=tracks, stats=stats, brand=brand,
+                           brand_history=brand_history,
+                           brand_sparkline=_sparkline(brand_history, width=600, height=120))
+
+@app.route("/api/price-history/<int:track_id>")
+def api_price_history(track_id):
+    import src.database as db
+    since = request.args.get("since", 0, type=int)
+    return jsonify([{"ts": ts, "min": lo, "max": hi} for ts, lo, hi in db.get_price_history(track_id, since)])
 
 @app.route("/items")
 def items():
+    import src.database as db
+    search = request.args.get("q", "").strip()
+    query_id = request.args.get("query_id", type=int)
+    days = request.args.get("days", 0, type=int)
+    limit = request.args.get("limit", 100, type=int)
+    if limit not in (50, 100, 200, 500):
+        limit = 100
+    cursor = request.args.get("cursor")
+    since = int(time.time()) - days * 86400 if days > 0 else None
+    started = time.perf_counter()
     conn = get_db()
-    all_items = conn.execute("SELECT * FROM items ORDER BY timestamp DESC LIMIT 100").fetchall()
+    queries = [dict(q) for q in conn.execute(
+        "SELECT id, name, discord_channel_name AS channel_name FROM queries ORDER BY id").fetchall()]
+    found, next_cursor = db.search_items(search, query_id, since, cursor, limit, conn=conn)
     conn.close()
-    return render_template("items.html", items=all_items)
+    by_id = {q["id"]: q for q in queries}
+    for item in found:
+        query = by_id.get(item["query_id"], {})
+        item["query_name"] = query.get("name")
+        item["channel_name"] = query.get("channel_name")
+        item["sent_at"] = item["created_at"]
+    return render_template("items.html", items=found, queries=queries, selected_query=query_id,
+                           limit=limit, search=search, days=days, cursor=cursor, next_cursor=next_cursor,
+                           elapsed_ms=(time.perf_counter() - started) * 1000)
 
 @app.route("/logs")
 def logs():
+    import src.database as db
+    level = request.args.get("level", "ALL")
+    search = request.args.get("q", "").strip()
+    limit = request.args.get("limit", 100, type=int)
+    if limit not in (100, 200, 500, 1000):
+        limit = 100
+    before_id = request.args.get("before", type=int)
+    conn = get_db()
+    all_logs, next_before = db.get_logs_page(None if level == "ALL" else level, search, before_id, limit, conn=conn)
+    conn.close()
+    return render_template("logs.html", logs=all_logs, level_filter=level, limit=limit, search=search,
+                           before_id=before_id, next_before=next_before)
+
+@app.route("/api/logs")
+def api_logs():
+    import src.database as db
+    level = request.args.get("level", "ALL")
+    since_id = request.args.get("since_id", 0, type=int)
     conn = get_db()
-    all_logs = conn.execute("SELECT * FROM logs ORDER BY timestamp DESC LIMIT 100").fetchall()
+    new_logs = db.get_logs_since(since_id, None if level == "ALL" else level, conn=conn)
     conn.close()
-    return render_template("logs.html", logs=all_logs)
+    return jsonify(new_logs)
+
+@app.route("/logs/clear", methods=["POST"])
+def clear_logs():
+    conn = get_db()
+    conn.execute("DELETE FROM logs")
+    conn.commit()
+    conn.close()
+    flash("🗑️ Wyczyszczono logi", "success")
+    return redirect(url_for("logs"))
 
 @app.route("/settings", methods=["GET", "POST"])
 def settings():
     conn = get_db()
     if request.method == "POST":
-        for key in ["scan_interval", "items_per_query", "new_item_window", "query_delay", "discord_bot_token", "proxy_list"]:
+        from src.sinks import parse_config
+        from src.config import VINTED_DOMAINS
+        try:
+            parse_config(request.form.get("alert_sinks", ""))
+        except ValueError as e:
+            conn.close()
+            flash(f"❌ {e}", "error")
+            return redirect(url_for("settings"))
+        domains = [d.strip().lower() for d in request.form.get("firehose_domains", "").split(",") if d.strip()]
+        unknown = [d for d in domains if d not in VINTED_DOMAINS]
+        if unknown:
+            conn.close()
+            flash(f"❌ Firehose: nieznane domeny Vinted: {', '.join(unknown)}", "error")
+            return redirect(url_for("settings"))
+        for key in ["scan_interval", "scan_deadline_seconds", "items_per_query", "new_item_window", "query_delay", "discord_bot_token", "proxy_list",
+                    "alert_sinks", "firehose_domains", "firehose_per_page", "price_drop_min_percent",
+                    "recheck_requests_per_minute", "recheck_base_minutes"]:
             value = request.form.get(key, "")
             conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", (key, value))
         conn.commit()
@@ -209,11 +344,18 @@ def settings():
     conn.close()
     return render_template("settings.html", config={
         "scan_interval": config.get("scan_interval", "20"),
+        "scan_deadline_seconds": config.get("scan_deadline_seconds", "30"),
         "items_per_query": config.get("items_per_query", "10"),
         "new_item_window": config.get("new_item_window", "5"),
         "query_delay": config.get("query_delay", "2"),
         "discord_bot_token": config.get("discord_bot_token", ""),
         "proxy_list": config.get("proxy_list", ""),
+        "alert_sinks": config.get("alert_sinks", ""),
+        "firehose_domains": config.get("firehose_domains", ""),
+        "firehose_per_page": config.get("firehose_per_page", "96"),
+        "price_drop_min_percent": config.get("price_drop_min_percent", "0"),
+        "recheck_requests_per_minute": config.get("recheck_requests_per_minute", "4"),
+        "recheck_base_minutes": config.get("recheck_base_minutes", "60"),
     })
 
 @app.route("/api/stats")
@@ -222,7 +364,7 @@ def api_stats():
     stats = {
         "queries": conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0],
         "active_queries": conn.execute("SELECT COUNT(*) FROM queries WHERE active = 1").fetchone()[0],
-        "items": conn.execute("SELECT COUNT(*) FROM items").fetchone()[0],
+        "items": conn.execute("SELECT COUNT(*) FROM item_data").fetchone()[0],
         "logs": conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0],
     }
     conn.close()